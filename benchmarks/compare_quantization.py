@@ -0,0 +1,138 @@
+"""Compare float32 and int8-quantized Whisper models on the CPU
+
+Transcribes the given audio files with the model as loaded by the server,
+once without quantization and once per quantization mode, and reports load
+time, weight size, transcription time, real-time factor (seconds of
+processing per second of audio) and the word error
+rate of each mode against the float32 transcript (and against a reference
+transcript when a `.txt` file with the same name sits next to the audio).
+
+Usage:
+    python benchmarks/compare_quantization.py --model base samples/*.wav
+    python benchmarks/compare_quantization.py --model small --threads 4 --json results.json talk.mp3
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import torch
+import whisper
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src.server.quantization import QUANTIZATION_MODES, model_size_bytes, quantize_model  # noqa: E402
+from src.server.transcriber import ModelDecoder, TranscriptionOptions, transcribe  # noqa: E402
+from src.utils.audio_utils import AudioUtils  # noqa: E402
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Get the word-level edit distance between two transcripts, relative to the reference length"""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    if not ref:
+        return float(bool(hyp))
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def run_mode(model_name: str, mode: str, audios: Dict[str, object], repeat: int) -> Dict[str, object]:
+    """Load the model with one quantization mode and transcribe every file"""
+    started = time.perf_counter()
+    model = whisper.load_model(model_name, device="cpu").eval()
+    quantize_model(model, mode)
+    load_seconds = time.perf_counter() - started
+    decoder = ModelDecoder(model)
+    options = TranscriptionOptions(temperature=(0.0,), fp16=False)
+
+    # Warm-up, so kernel initialization isn't counted against the first file
+    transcribe(decoder, next(iter(audios.values()))[:AudioUtils.WHISPER_SAMPLE_RATE * 5], options)
+
+    files = {}
+    for path, audio in audios.items():
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = transcribe(decoder, audio, options)
+            times.append(time.perf_counter() - started)
+        seconds = min(times)
+        files[path] = {
+            "text": result["text"].strip(),
+            "seconds": round(seconds, 3),
+            "realtime_factor": round(seconds / (len(audio) / AudioUtils.WHISPER_SAMPLE_RATE), 4),
+        }
+    return {
+        "load_seconds": round(load_seconds, 3),
+        "size_mb": round(model_size_bytes(model) / 1024 ** 2, 1),
+        "files": files,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("audio", nargs="+", help="Audio files to transcribe")
+    parser.add_argument("--model", default="base", help="Whisper model name (default: base)")
+    parser.add_argument("--modes", default="int8", help="Comma-separated quantization modes to compare")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads; 0 keeps the default")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per file; the fastest one is reported")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    modes = ["none"] + [m.strip() for m in args.modes.split(",") if m.strip() and m.strip() != "none"]
+    for mode in modes:
+        if mode not in QUANTIZATION_MODES:
+            parser.error(f"unsupported mode '{mode}', choose from {QUANTIZATION_MODES}")
+
+    audios = {path: whisper.load_audio(path) for path in args.audio}
+    references = {
+        path: Path(path).with_suffix(".txt").read_text().strip()
+        for path in args.audio if Path(path).with_suffix(".txt").exists()
+    }
+
+    results = {mode: run_mode(args.model, mode, audios, args.repeat) for mode in modes}
+    baseline = results["none"]
+    total_audio = sum(len(audio) for audio in audios.values()) / AudioUtils.WHISPER_SAMPLE_RATE
+
+    print(f"Model {args.model}, {len(audios)} file(s), {total_audio:.1f}s of audio, "
+          f"{torch.get_num_threads()} thread(s)\n")
+    print(f"{'mode':<6} {'load s':>8} {'size MB':>9} {'total s':>9} {'RTF':>7} {'speedup':>8} "
+          f"{'WER vs fp32':>12} {'WER vs ref':>11}")
+    for mode, result in results.items():
+        total = sum(f["seconds"] for f in result["files"].values())
+        baseline_total = sum(f["seconds"] for f in baseline["files"].values())
+        agreement = sum(
+            word_error_rate(baseline["files"][path]["text"], f["text"]) for path, f in result["files"].items()
+        ) / len(audios)
+        reference_wer = (
+            sum(word_error_rate(references[path], result["files"][path]["text"]) for path in references)
+            / len(references)
+        ) if references else None
+        result.update(
+            total_seconds=round(total, 3),
+            realtime_factor=round(total / total_audio, 4),
+            speedup=round(baseline_total / total, 3),
+            wer_vs_fp32=round(agreement, 4),
+            wer_vs_reference=round(reference_wer, 4) if reference_wer is not None else None,
+        )
+        print(f"{mode:<6} {result['load_seconds']:>8.2f} {result['size_mb']:>9.1f} {total:>9.2f} "
+              f"{result['realtime_factor']:>7.3f} {result['speedup']:>7.2f}x {agreement:>12.3f} "
+              f"{reference_wer if reference_wer is not None else float('nan'):>11.3f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(
+            {"model": args.model, "threads": torch.get_num_threads(), "audio_seconds": total_audio,
+             "results": results},
+            indent=2, ensure_ascii=False
+        ))
+
+
+if __name__ == "__main__":
+    main()
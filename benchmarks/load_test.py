@@ -0,0 +1,420 @@
+"""Load-test the API in-process with synthetic audio
+
+Generates tones, noise and speech-like bursts of the given lengths, starts
+`src/app.py` inside this process and sends requests to it through an httpx
+ASGI client, so no server, network or recordings are needed. The model is
+either the real Whisper model or `StubWhisper`, a deterministic stand-in
+with tunable latency (`--stub`), which isolates the cost of the server
+itself.
+
+Reports throughput, latency percentiles, real-time factor (seconds of
+processing per second of audio, lower is faster; the server's
+`whisper_speed_factor` metric is its inverse) and peak RSS, and
+writes them as JSON together with the commit and settings, so runs can be
+compared across commits. With `--presets`, the same requests are sent once
+per decoding preset, and each preset's latency, temperature fallbacks and
+word error rate against the most accurate preset are reported side by side.
+
+Usage:
+    python benchmarks/load_test.py --stub --requests 200 --concurrency 8 --json results/stub.json
+    python benchmarks/load_test.py --model tiny --durations 5,30 --kinds speech --requests 20
+    python benchmarks/load_test.py --stub --rate 20 --env INFERENCE_WORKERS=8 --env BATCH_SIZE=1
+    python benchmarks/load_test.py --stub --stub-fallback-rate 0.2 --presets fast,balanced,accurate
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from benchmarks.compare_quantization import word_error_rate  # noqa: E402
+from benchmarks.stub_model import stub_loader  # noqa: E402
+from benchmarks.synthetic_audio import GENERATORS, generate, to_wav  # noqa: E402
+from src.server.transcriber import DECODING_PRESETS  # noqa: E402
+
+ENDPOINTS = {"transcribe": "/transcribe", "stream": "/transcribe/stream"}
+
+
+def peak_rss_mb() -> float:
+    """Get the peak resident memory of this process"""
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 1024 ** 2, 1)
+
+
+def process_peak_rss_mb(pid: int) -> Optional[float]:
+    """Get the peak resident memory of a running process, on Linux
+
+    RUSAGE_CHILDREN can't be used for worker processes: it also counts
+    helpers forked while torch is imported, which start with this process's memory.
+    """
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def git_revision() -> Dict[str, Any]:
+    """Get the commit being measured, and whether the tree has local changes"""
+    root = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        return {"commit": None, "dirty": None}
+    return {"commit": commit or None, "dirty": dirty}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Get mean, p50, p95, p99 and max of a list of values"""
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": round(float(np.mean(values)), 4),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "max": round(float(max(values)), 4),
+    }
+
+
+def response_text(response, endpoint: str) -> Optional[str]:
+    """Get the transcript from a `/transcribe` response or the events of a stream"""
+    if response.status_code != 200:
+        return None
+    if endpoint == ENDPOINTS["stream"]:
+        return "".join(
+            json.loads(line[len("data: "):])["text"] for line in response.text.splitlines() if line.startswith("data: ")
+        )
+    return response.json().get("text")
+
+
+def build_samples(kinds: List[str], durations: List[float], upload: str, seed: int) -> List[Dict[str, Any]]:
+    """Generate one request body per audio kind and length"""
+    samples = []
+    for duration in durations:
+        for i, kind in enumerate(kinds):
+            audio = generate(kind, duration, seed=seed + i)
+            samples.append({
+                "kind": kind,
+                "seconds": duration,
+                "body": to_wav(audio) if upload == "wav" else audio.tobytes(),
+            })
+    return samples
+
+
+async def send(client, endpoint: str, sample: Dict[str, Any], upload: str, params: Dict[str, str]) -> Dict[str, Any]:
+    """Send one request and time it until the whole response has been received, keeping its transcript"""
+    started = time.perf_counter()
+    if upload == "wav":
+        response = await client.post(endpoint, params=params,
+                                     files={"audio": ("audio.wav", sample["body"], "audio/wav")})
+    else:
+        response = await client.post(endpoint, params={**params, "dtype": "float32"}, content=sample["body"],
+                                     headers={"Content-Type": "application/octet-stream"})
+    latency = time.perf_counter() - started
+    ok = response.status_code == 200 and not response.text.startswith("error:") and "\nerror:" not in response.text
+    return {
+        "kind": sample["kind"],
+        "seconds": sample["seconds"],
+        "status": response.status_code if ok or response.status_code != 200 else "stream_error",
+        "latency": latency,
+        "text": response_text(response, endpoint) if ok else None,
+    }
+
+
+async def run_load(client, args, samples: List[Dict[str, Any]], preset: Optional[str] = None) -> Dict[str, Any]:
+    """Send the requests, closed-loop with `--concurrency` clients or open-loop at `--rate`"""
+    endpoint = ENDPOINTS[args.endpoint]
+    params = {"language": args.language} if args.language else {}
+    if preset:
+        params["preset"] = preset
+    order = np.random.default_rng(args.seed).integers(len(samples), size=args.requests)
+    results: List[Dict[str, Any]] = []
+
+    for i in range(args.warmup):
+        await send(client, endpoint, samples[i % len(samples)], args.upload, params)
+
+    started = time.perf_counter()
+    if args.rate > 0:
+        # Poisson arrivals, independent of how fast the server answers
+        gaps = np.random.default_rng(args.seed + 1).exponential(1 / args.rate, size=args.requests)
+        tasks = []
+        for index, gap in zip(order, gaps):
+            await asyncio.sleep(gap)
+            tasks.append(asyncio.create_task(send(client, endpoint, samples[index], args.upload, params)))
+        results = [{**result, "sample": int(index)} for index, result in zip(order, await asyncio.gather(*tasks))]
+    else:
+        queue = list(order)
+
+        async def user() -> None:
+            while queue:
+                index = queue.pop(0)
+                results.append({**await send(client, endpoint, samples[index], args.upload, params), "sample": int(index)})
+
+        await asyncio.gather(*(user() for _ in range(max(1, args.concurrency))))
+    return {"wall_seconds": time.perf_counter() - started, "requests": results}
+
+
+def summarize(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Aggregate request results into throughput, latency and real-time factor"""
+    ok = [r for r in results if r["status"] == 200]
+    audio_seconds = sum(r["seconds"] for r in ok)
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "statuses": {str(status): count for status, count in Counter(r["status"] for r in results).items()},
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(len(ok) / wall_seconds, 3) if wall_seconds else None,
+        "audio_seconds_per_second": round(audio_seconds / wall_seconds, 3) if wall_seconds else None,
+        "latency_seconds": percentiles([r["latency"] for r in ok]),
+        # Processing time per audio second, per request; below 1 is faster than real time
+        "realtime_factor": percentiles([r["latency"] / r["seconds"] for r in ok]),
+    }
+
+
+def summarize_by_length(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Summarize the requests of each audio length"""
+    return {
+        str(seconds): summarize([r for r in results if r["seconds"] == seconds], wall_seconds)
+        for seconds in sorted({r["seconds"] for r in results})
+    }
+
+
+def transcript_error_rate(results: List[Dict[str, Any]], references: Dict[int, str]) -> Optional[float]:
+    """Get the mean word error rate of the transcripts against reference transcripts of the same samples"""
+    rates = [
+        word_error_rate(references[r["sample"]], r["text"])
+        for r in results if r["text"] is not None and r["sample"] in references
+    ]
+    return round(float(np.mean(rates)), 4) if rates else None
+
+
+async def temperature_fallbacks(client) -> float:
+    """Read the server's count of temperature fallbacks from /metrics"""
+    for line in (await client.get("/metrics")).text.splitlines():
+        if line.startswith("whisper_temperature_fallbacks_total "):
+            return float(line.split()[1])
+    return 0.0
+
+
+def preset_report(runs: Dict[str, Dict[str, Any]], reference: str) -> Dict[str, Any]:
+    """Compare the runs of each decoding preset: latency, fallbacks, and transcripts against `reference`"""
+    references = {}
+    for result in runs[reference]["requests"]:
+        if result["text"] is not None:
+            references.setdefault(result["sample"], result["text"])
+    return {
+        preset: {
+            "summary": summarize(run["requests"], run["wall_seconds"]),
+            "by_audio_seconds": summarize_by_length(run["requests"], run["wall_seconds"]),
+            "temperature_fallbacks": run["fallbacks"],
+            "fallbacks_per_request": round(run["fallbacks"] / max(1, len(run["requests"])), 3),
+            f"wer_vs_{reference}": transcript_error_rate(run["requests"], references),
+        }
+        for preset, run in runs.items()
+    }
+
+
+async def benchmark(args, samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import httpx
+    import src.app as server
+
+    if args.stub:
+        loader = stub_loader(encoder_ms=args.stub_encoder_ms, decoder_ms=args.stub_decoder_ms,
+                             batch_overhead=args.stub_batch_overhead, fallback_rate=args.stub_fallback_rate)
+        server.model_registry.loader = loader
+        if server.worker_pool is not None:
+            server.worker_pool.registry_kwargs = {**server.worker_pool.registry_kwargs, "loader": loader}
+
+    await server.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            while (await client.get("/ready")).status_code != 200:
+                if server.readiness["status"] == "failed":
+                    raise RuntimeError(f"Model failed to load: {server.readiness['error']}")
+                await asyncio.sleep(0.1)
+            runs = {}
+            for preset in args.presets or [None]:
+                fallbacks = await temperature_fallbacks(client)
+                runs[preset] = await run_load(client, args, samples, preset)
+                runs[preset]["fallbacks"] = await temperature_fallbacks(client) - fallbacks
+            health = (await client.get("/health")).json()
+            workers_rss = [
+                process_peak_rss_mb(worker["pid"]) for worker in (health.get("processes") or {}).get("workers", [])
+            ]
+    finally:
+        await server.app.router.shutdown()
+
+    # The headline numbers are those of the first preset, so --baseline compares like with like
+    load = next(iter(runs.values()))
+    report = {
+        "summary": summarize(load["requests"], load["wall_seconds"]),
+        "by_audio_seconds": summarize_by_length(load["requests"], load["wall_seconds"]),
+        "inference": health.get("inference"),
+        "ready": health.get("ready"),
+        "workers_peak_rss_mb": workers_rss,
+    }
+    if args.presets:
+        reference = "accurate" if "accurate" in args.presets else args.presets[-1]
+        report["presets"] = preset_report(runs, reference)
+    return report
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print the change of the headline numbers against an earlier run"""
+    rows = [
+        ("throughput req/s", ("summary", "throughput_rps"), True),
+        ("latency p50 s", ("summary", "latency_seconds", "p50"), False),
+        ("latency p95 s", ("summary", "latency_seconds", "p95"), False),
+        ("latency p99 s", ("summary", "latency_seconds", "p99"), False),
+        ("RTF p50", ("summary", "realtime_factor", "p50"), False),
+        ("peak RSS MB", ("peak_rss_mb", "api"), False),
+    ]
+    print(f"\nagainst {(baseline.get('commit') or 'unknown')[:10]} ({baseline.get('created')}):")
+    for label, path, higher_is_better in rows:
+        new, old = report, baseline
+        for key in path:
+            new, old = (new or {}).get(key), (old or {}).get(key)
+        if not new or not old:
+            continue
+        change = (new - old) / old * 100
+        better = (change > 0) == higher_is_better
+        print(f"  {label:<17} {old:>10.4g} -> {new:<10.4g} {change:+6.1f}% {'better' if better else 'worse'}")
+
+
+def print_presets(presets: Dict[str, Any]) -> None:
+    """Print the speed and accuracy of each decoding preset"""
+    reference = next(key for key in next(iter(presets.values())) if key.startswith("wer_vs_"))
+    print(f"\n{'preset':<10} {'req/s':>8} {'p50 s':>8} {'p99 s':>8} {'RTF p50':>8} {'fallbacks/req':>14} "
+          f"{reference.replace('_', ' '):>16}")
+    for preset, result in presets.items():
+        summary, latency = result["summary"], result["summary"]["latency_seconds"]
+        if latency["p50"] is None:
+            print(f"{preset:<10} no successful requests: {summary['statuses']}")
+            continue
+        wer = result[reference]
+        print(f"{preset:<10} {summary['throughput_rps']:>8.3f} {latency['p50']:>8.3f} {latency['p99']:>8.3f} "
+              f"{summary['realtime_factor']['p50']:>8.4f} {result['fallbacks_per_request']:>14.3f} "
+              f"{wer if wer is not None else float('nan'):>16.4f}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoint", choices=list(ENDPOINTS), default="transcribe", help="Endpoint to load")
+    parser.add_argument("--upload", choices=["wav", "pcm"], default="wav",
+                        help="Send WAV files as multipart uploads or raw float32 PCM bodies")
+    parser.add_argument("--kinds", default="speech,noise,tone", help=f"Audio kinds, from {list(GENERATORS)}")
+    parser.add_argument("--durations", default="5,30", help="Comma-separated audio lengths in seconds")
+    parser.add_argument("--requests", type=int, default=50, help="Measured requests")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests sent first")
+    parser.add_argument("--concurrency", type=int, default=4, help="Clients sending requests back to back")
+    parser.add_argument("--rate", type=float, default=0, help="Open-loop arrival rate in requests per second "
+                                                              "instead of a fixed number of clients")
+    parser.add_argument("--language", default="en", help="Language sent with each request; empty detects it")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the audio and the request order")
+    parser.add_argument("--model", default=None, help="Whisper model to load (sets WHISPER_MODEL)")
+    parser.add_argument("--presets", default="", help="Comma-separated decoding presets to run the load with, "
+                                                       "one after the other; empty uses the server default")
+    parser.add_argument("--stub", action="store_true", help="Use the stub model instead of Whisper")
+    parser.add_argument("--stub-encoder-ms", type=float, default=50, help="Stub encoder latency per window")
+    parser.add_argument("--stub-decoder-ms", type=float, default=100, help="Stub decoder latency per window")
+    parser.add_argument("--stub-batch-overhead", type=float, default=0.25,
+                        help="Stub latency of each further window in a batch, relative to the first")
+    parser.add_argument("--stub-fallback-rate", type=float, default=0.0,
+                        help="Share of windows the stub decodes badly at temperature 0, forcing a fallback")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Server setting, e.g. INFERENCE_WORKERS=8; may be repeated")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare against")
+    parser.add_argument("--verbose", action="store_true", help="Show the server's info logs")
+    args = parser.parse_args(argv)
+
+    revision = git_revision()
+    rss_before = peak_rss_mb()
+
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    for kind in kinds:
+        if kind not in GENERATORS:
+            parser.error(f"unknown audio kind '{kind}', choose from {list(GENERATORS)}")
+    durations = [float(d) for d in args.durations.split(",") if d.strip()]
+    args.presets = [p.strip().lower() for p in args.presets.split(",") if p.strip()]
+    for preset in args.presets:
+        if preset not in DECODING_PRESETS:
+            parser.error(f"unknown decoding preset '{preset}', choose from {list(DECODING_PRESETS)}")
+
+    # Settings are read when src.app is imported. Repeated audio must not be served from the cache
+    settings = {"CACHE_ENABLED": "false", "JOBS_DIR": tempfile.mkdtemp(prefix="whisper-benchmark-jobs-")}
+    if args.model:
+        settings["WHISPER_MODEL"] = args.model
+    for entry in args.env:
+        key, _, value = entry.partition("=")
+        settings[key.strip()] = value
+    os.environ.update(settings)
+    if not args.verbose:
+        from loguru import logger
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
+    samples = build_samples(kinds, durations, args.upload, args.seed)
+    results = asyncio.run(benchmark(args, samples))
+
+    workers_rss = results.pop("workers_peak_rss_mb")
+
+    import torch
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        **revision,
+        "settings": {**{k: v for k, v in vars(args).items() if k not in ("json", "baseline", "verbose")}, "env": settings},
+        "environment": {
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        **results,
+        "peak_rss_mb": {"api": peak_rss_mb(), "before_start": rss_before, "workers": workers_rss},
+    }
+
+    summary = report["summary"]
+    print(f"{summary['ok']}/{summary['requests']} ok in {summary['wall_seconds']:.1f}s: "
+          f"{summary['throughput_rps']} req/s, {summary['audio_seconds_per_second']} audio s/s")
+    latency = summary["latency_seconds"]
+    if latency["p50"] is not None:
+        print(f"latency p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  p99 {latency['p99']:.3f}s  "
+              f"RTF p50 {summary['realtime_factor']['p50']:.4f}")
+    workers = report["peak_rss_mb"]["workers"]
+    print(f"peak RSS {report['peak_rss_mb']['api']} MB"
+          + (f", workers {', '.join(f'{rss} MB' for rss in workers)}" if workers else ""))
+    if summary["statuses"].keys() - {"200"}:
+        print(f"statuses: {summary['statuses']}")
+    if "presets" in report:
+        print_presets(report["presets"])
+
+    if args.baseline:
+        compare(report, json.loads(Path(args.baseline).read_text()))
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
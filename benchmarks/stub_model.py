@@ -0,0 +1,163 @@
+"""Deterministic stand-in for a Whisper model, with tunable latency
+
+`StubWhisper` implements the parts of `whisper.model.Whisper` that the
+server's transcriber and decode batcher use. It doesn't run a network:
+each call sleeps for a configured time, which releases the GIL like torch
+kernels do, and returns text derived from the mel window, so the same audio
+always yields the same transcript. Plug it in through the model registry's
+loader to measure the server itself (upload, decoding, scheduling,
+batching, serialization) without a model download or its compute cost.
+"""
+import time
+import zlib
+from functools import partial
+from typing import Callable, List, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+from whisper.decoding import DecodingOptions, DecodingResult
+from whisper.model import ModelDimensions
+from whisper.tokenizer import LANGUAGES, get_tokenizer
+
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel",
+         "india", "juliet", "kilo", "lima", "mike", "november", "oscar", "papa")
+
+# Seconds per mel frame and per timestamp token
+FRAME_SECONDS = 0.01
+TIMESTAMP_SECONDS = 0.02
+
+
+class StubWhisper(nn.Module):
+    """Whisper look-alike whose encoder and decoder only take time
+
+    A batch of n windows takes `1 + batch_overhead * (n - 1)` times the
+    latency of one window, so decode batching pays off as it does on real
+    hardware. Beam search and sampling several candidates cost the same as
+    a batch of that many windows, as in whisper. With `fallback_rate`, that
+    share of the windows comes out repetitive when decoded at temperature 0,
+    so the transcriber decodes them again at the next temperature.
+    """
+
+    def __init__(
+        self,
+        encoder_ms: float = 50.0,
+        decoder_ms: float = 100.0,
+        batch_overhead: float = 0.25,
+        words_per_window: int = 40,
+        language: str = "en",
+        fallback_rate: float = 0.0
+    ):
+        """Initialize the stub
+
+        Args:
+            encoder_ms: Encoder latency of one 30-second window
+            decoder_ms: Decoder latency of one window
+            batch_overhead: Extra latency of each further window in a batch, relative to the first
+            words_per_window: Words transcribed from a window full of audio
+            language: Language reported by language detection
+            fallback_rate: Share of windows whose greedy decoding looks degenerate
+        """
+        super().__init__()
+        self.dims = ModelDimensions(
+            n_mels=80, n_audio_ctx=1500, n_audio_state=0, n_audio_head=0, n_audio_layer=0,
+            n_vocab=51865, n_text_ctx=448, n_text_state=0, n_text_head=0, n_text_layer=0
+        )
+        self.encoder_ms = encoder_ms
+        self.decoder_ms = decoder_ms
+        self.batch_overhead = batch_overhead
+        self.words_per_window = words_per_window
+        self.language = language
+        self.fallback_rate = fallback_rate
+        self.tokenizer = get_tokenizer(True, num_languages=self.num_languages, task="transcribe")
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device("cpu")
+
+    @property
+    def is_multilingual(self) -> bool:
+        return True
+
+    @property
+    def num_languages(self) -> int:
+        return len(LANGUAGES)
+
+    def embed_audio(self, mel: torch.Tensor) -> torch.Tensor:
+        """Stand in for the encoder: wait, and keep what `decode` needs from each window
+
+        The features of a window are its content length in frames and a
+        checksum of its mel values.
+        """
+        self._wait(self.encoder_ms, len(mel))
+        features = []
+        for window in mel.float():
+            # The transcriber pads the last window with zeros on every mel bin
+            has_content = (window != 0).any(dim=0).nonzero()
+            frames = int(has_content[-1]) + 1 if len(has_content) else 0
+            checksum = zlib.crc32(window.numpy().tobytes())
+            features.append([frames, checksum])
+        return torch.tensor(features, dtype=torch.int64)
+
+    def decode(self, audio_features: torch.Tensor, options: DecodingOptions) -> List[DecodingResult]:
+        """Produce one timestamped segment per window, with words picked by its checksum"""
+        return self.decode_windows(audio_features, [options] * len(audio_features))
+
+    def decode_windows(self, audio_features: torch.Tensor, options: List[DecodingOptions]) -> List[DecodingResult]:
+        """Decode windows in one batch, each with its own prompt and language
+
+        Stands in for `transcriber.decode_windows` on a real model; the
+        prompts are ignored.
+        """
+        # Everything but the prompt and language is the same for all windows
+        shared = options[0]
+        candidates = (shared.beam_size if shared.temperature == 0 else shared.best_of) or 1
+        self._wait(self.decoder_ms, len(audio_features) * candidates)
+        results = []
+        for (frames, checksum), window_options in zip(audio_features.tolist(), options):
+            seconds = frames * FRAME_SECONDS
+            words = max(1, round(self.words_per_window * seconds / 30)) if frames else 0
+            rng = np.random.default_rng(checksum)
+            text = " " + " ".join(rng.choice(WORDS, size=words)) if words else ""
+            degenerate = words > 1 and shared.temperature == 0 and checksum % 1000 < self.fallback_rate * 1000
+            if degenerate:
+                # The first word over and over, like a decoder stuck in a loop
+                text = (" " + text.split()[0]) * words
+            end = self.tokenizer.timestamp_begin + min(1500, round(seconds / TIMESTAMP_SECONDS))
+            tokens = [self.tokenizer.timestamp_begin] + self.tokenizer.encode(text) + [end]
+            results.append(DecodingResult(
+                audio_features=torch.empty(0),
+                language=window_options.language or self.language,
+                tokens=tokens,
+                text=text,
+                avg_logprob=-1.5 if degenerate else -0.2,
+                no_speech_prob=0.0 if words else 1.0,
+                temperature=shared.temperature,
+                compression_ratio=3.0 if degenerate else 1.2
+            ))
+        return results
+
+    def detect_language(self, audio_features: torch.Tensor, tokenizer=None) -> Tuple[torch.Tensor, List[dict]]:
+        """Report `language` with probability 0.9 for every window"""
+        self._wait(self.decoder_ms / 10, len(audio_features))
+        others = 0.1 / (self.num_languages - 1)
+        probs = {code: (0.9 if code == self.language else others) for code in LANGUAGES}
+        token = self.tokenizer.to_language_token(self.language)
+        return torch.tensor([token] * len(audio_features)), [dict(probs) for _ in range(len(audio_features))]
+
+    def _wait(self, milliseconds: float, windows: int) -> None:
+        if milliseconds > 0:
+            time.sleep(milliseconds * (1 + self.batch_overhead * (windows - 1)) / 1000)
+
+
+def load_stub_model(name: str, **kwargs) -> StubWhisper:
+    """Registry loader returning a stub for any model name"""
+    return StubWhisper(**kwargs)
+
+
+def stub_loader(**kwargs) -> Callable[[str], StubWhisper]:
+    """Get a registry loader creating stubs with the given settings
+
+    The loader pickles, so it can be handed to worker processes too.
+    """
+    return partial(load_stub_model, **kwargs)
@@ -0,0 +1,83 @@
+"""Deterministic synthetic test audio for the benchmarks
+
+Every generator takes a length in seconds and a seed and returns float32
+mono audio at 16 kHz, so a benchmark run can be repeated exactly without
+shipping recordings.
+"""
+import io
+from typing import Callable, Dict
+import numpy as np
+import soundfile as sf
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds: float, seed: int = 0) -> np.ndarray:
+    """A chord of three sine waves with slowly drifting pitch"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = np.zeros_like(t)
+    for base in rng.uniform(150, 900, size=3):
+        drift = 1 + 0.02 * np.sin(2 * np.pi * rng.uniform(0.05, 0.3) * t)
+        audio += np.sin(2 * np.pi * base * drift * t)
+    return (0.2 * audio / 3).astype(np.float32)
+
+
+def noise(seconds: float, seed: int = 0) -> np.ndarray:
+    """Pink-ish noise: white noise with a 1/f spectrum slope"""
+    rng = np.random.default_rng(seed)
+    samples = int(seconds * SAMPLE_RATE)
+    spectrum = rng.standard_normal(samples // 2 + 1) + 1j * rng.standard_normal(samples // 2 + 1)
+    spectrum /= np.sqrt(np.maximum(np.arange(len(spectrum)), 1))
+    audio = np.fft.irfft(spectrum, n=samples)
+    return (0.1 * audio / (np.abs(audio).max() or 1)).astype(np.float32)
+
+
+def speech(seconds: float, seed: int = 0) -> np.ndarray:
+    """Speech-like bursts: voiced syllables with formants, separated by pauses
+
+    Syllables of 100-300 ms follow each other at a speech-like rate and are
+    grouped into phrases separated by silence, so voice activity detection
+    and the no-speech logic see realistic gaps.
+    """
+    rng = np.random.default_rng(seed)
+    samples = int(seconds * SAMPLE_RATE)
+    audio = np.zeros(samples)
+    position = int(rng.uniform(0.1, 0.5) * SAMPLE_RATE)
+    while position < samples:
+        for _ in range(rng.integers(3, 12)):
+            length = int(rng.uniform(0.1, 0.3) * SAMPLE_RATE)
+            t = np.arange(min(length, samples - position)) / SAMPLE_RATE
+            if not len(t):
+                break
+            pitch = rng.uniform(90, 250)
+            # Harmonics of the pitch, shaped by two formant peaks
+            formants = rng.uniform([300, 900], [900, 2500])
+            syllable = np.zeros_like(t)
+            for harmonic in range(1, 20):
+                frequency = pitch * harmonic
+                gain = sum(np.exp(-((frequency - f) / 150) ** 2) for f in formants) + 0.05 / harmonic
+                syllable += gain * np.sin(2 * np.pi * frequency * t)
+            syllable *= np.hanning(len(t))
+            audio[position:position + len(t)] += syllable
+            position += len(t) + int(rng.uniform(0.02, 0.12) * SAMPLE_RATE)
+        position += int(rng.uniform(0.3, 1.5) * SAMPLE_RATE)
+    audio += 0.003 * rng.standard_normal(samples)
+    return (0.3 * audio / (np.abs(audio).max() or 1)).astype(np.float32)
+
+
+GENERATORS: Dict[str, Callable[[float, int], np.ndarray]] = {"tone": tone, "noise": noise, "speech": speech}
+
+
+def generate(kind: str, seconds: float, seed: int = 0) -> np.ndarray:
+    """Generate audio of one kind: `tone`, `noise` or `speech`"""
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown audio kind '{kind}', choose one of {list(GENERATORS)}")
+    return GENERATORS[kind](seconds, seed)
+
+
+def to_wav(audio: np.ndarray) -> bytes:
+    """Encode audio as a 16-bit 16 kHz WAV file"""
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, SAMPLE_RATE, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
@@ -24,6 +24,9 @@ class StandardAPI(BaseAPI):
         logger.info(f"Making API request to: {self.base_url}/transcribe")
         logger.debug(f"Request headers: {headers}")
         
+        if self.config.raw_pcm_upload and self.config.sample_rate == AudioUtils.WHISPER_SAMPLE_RATE:
+            return self._transcribe_raw_pcm(audio, language, headers)
+        
         # Save audio data to a temporary file
         with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
             # Save original audio to temporary file
@@ -52,26 +55,21 @@ class StandardAPI(BaseAPI):
                         overwrite=True
                     )
                 
-                # Prepare the file for upload
+                # Send the file as the request body, so the server decodes it while it arrives
                 with open(whisper_audio_path, 'rb') as audio_file:
-                    files = {
-                        'audio': ('audio.wav', audio_file, 'audio/wav')
-                    }
-                    
-                    # Add other parameters
-                    data = {
+                    params = {
                         'language': language,
                         'model': self.config.whisper_model,
                         'batch_size': self.config.batch_size
                     }
-                    logger.debug(f"Request parameters: {data}")
+                    logger.debug(f"Request parameters: {params}")
                     
                     # Send request
                     response = requests.post(
                         f"{self.base_url}/transcribe",
-                        headers=headers,
-                        files=files,
-                        data=data
+                        headers={**headers, 'Content-Type': 'audio/wav'},
+                        params=params,
+                        data=audio_file
                     )
                     response.raise_for_status()
                     
@@ -95,6 +93,43 @@ class StandardAPI(BaseAPI):
                 except Exception as e:
                     logger.warning(f"Failed to delete temporary file(s): {e}")
     
+    def _transcribe_raw_pcm(self, audio: np.ndarray, language: Optional[str], headers: Dict[str, str]) -> str:
+        """Send audio as raw int16 PCM, skipping WAV encoding and ffmpeg on both ends
+
+        int16 is half the size of float32 and loses nothing for microphone audio.
+        """
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        if audio.dtype != np.int16:
+            audio = np.clip(audio, -1.0, 1.0) * 32767
+        body = np.ascontiguousarray(audio, dtype='<i2').tobytes()
+        params = {
+            'language': language,
+            'model': self.config.whisper_model,
+            'sample_rate': AudioUtils.WHISPER_SAMPLE_RATE,
+            'dtype': 'int16'
+        }
+        logger.debug(f"Request parameters: {params}")
+        
+        try:
+            response = requests.post(
+                f"{self.base_url}/transcribe",
+                headers={**headers, 'Content-Type': 'application/octet-stream'},
+                params=params,
+                data=body
+            )
+            response.raise_for_status()
+            
+            result = response.json()
+            logger.info(f"API Response: {result}")
+            if isinstance(result, dict):
+                return result.get("text", "")
+            return str(result)
+        except Exception as e:
+            logger.error(f"API request failed: {str(e)}")
+            logger.error(f"Response content: {response.content if 'response' in locals() else 'No response'}")
+            raise
+    
     @property
     def supported_languages(self) -> Dict[str, str]:
         """Get supported languages from API"""
@@ -36,26 +36,21 @@ class StreamingAPI(BaseAPI):
             logger.debug(f"Saved audio to temporary file: {temp_path}")
         
         try:
-            # Prepare the file for upload
+            # Send the file as the request body, so the server decodes it while it arrives
             with open(temp_path, 'rb') as audio_file:
-                files = {
-                    'audio': ('audio.wav', audio_file, 'audio/wav')
-                }
-                
-                # Add other parameters
-                data = {
+                params = {
                     'language': language,
                     'model': self.config.whisper_model,
                     'batch_size': self.config.batch_size
                 }
-                logger.debug(f"Request parameters: {data}")
+                logger.debug(f"Request parameters: {params}")
                 
                 # Send request
                 response = requests.post(
                     f"{self.base_url}/transcribe/stream",
-                    headers=headers,
-                    files=files,
-                    data=data,
+                    headers={**headers, 'Content-Type': 'audio/wav'},
+                    params=params,
+                    data=audio_file,
                     stream=True
                 )
                 response.raise_for_status()
@@ -1,15 +1,44 @@
-from fastapi import FastAPI, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, HTTPException, Request, Response, File, Form, Query, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.requests import HTTPConnection
 from pydantic import BaseModel
-from typing import Optional, List
-import whisper
+from typing import BinaryIO, Callable, Dict, Optional, List, Tuple, Union
+from dataclasses import asdict, replace
+from contextlib import ExitStack, asynccontextmanager
+from functools import partial
 import torch
 import numpy as np
-import tempfile
+import asyncio
+import hmac
+import json
 import os
-from pathlib import Path
+import time
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 from dotenv import load_dotenv
+from whisper.audio import N_SAMPLES
+from src.server.inference import PRIORITY_WEIGHTS, CancelToken, InferenceExecutor, JobCancelled, QueueFullError
+from src.server.models import ModelRegistry
+from src.server.quantization import parse_quantization
+from src.server.workers import ProcessWorkerPool
+from src.server.transcriber import (
+    DECODING_OVERRIDES, TASKS, TranscriptionOptions, decoding_settings, detect_language, normalize_language, transcribe
+)
+from src.server.cache import TranscriptionCache
+from src.server.long_audio import transcribe_in_chunks
+from src.server.vad import SpeechMap
+from src.server.jobs import JobRunner, JobStore, QUEUED
+from src.server.metrics import InFlightMiddleware, MetricsRegistry
+from src.server.cpu import apply_torch_threads, pin_current_thread, plan_layout
+from src.server.realtime import RealtimeTranscriber
+from src.server.archives import extract_files, is_archive
+from src.server.uploads import UploadBudget, UploadLimitMiddleware
+from src.server.profiling import PROFILERS, profile_transcription
+from src.server.serialization import (
+    JSON, compress, encode, media_types, negotiate_encoding, negotiate_media_type, segment_view
+)
+from src.utils.audio_utils import AudioUtils, FFmpegStreamDecoder
 
 # Load environment variables
 load_dotenv('.env.local')  # Try to load .env.local first
@@ -23,14 +52,185 @@ app = FastAPI(title="Whisper Transcription API")
 # Load Whisper model
 MODEL_NAME = os.getenv("WHISPER_MODEL", "base")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "16"))
+SCHEDULER_AGING_RATE = float(os.getenv("SCHEDULER_AGING_RATE", "1"))
+DEFAULT_PRIORITY = os.getenv("DEFAULT_PRIORITY", "normal")
+# Decoding preset of requests that don't choose one: fast, balanced or accurate
+DECODING_PRESET = os.getenv("DECODING_PRESET", "balanced")
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+PRIORITY_API_KEYS = dict(
+    entry.strip().split("=", 1) for entry in os.getenv("PRIORITY_API_KEYS", "").split(",") if "=" in entry
+)
+INFERENCE_PROCESSES = int(os.getenv("INFERENCE_PROCESSES", "0"))
+INFERENCE_THREADS_PER_PROCESS = int(os.getenv("INFERENCE_THREADS_PER_PROCESS", "0"))
+INFERENCE_INTEROP_THREADS = int(os.getenv("INFERENCE_INTEROP_THREADS", "1"))
+# "off", "auto", or one core set per inference worker, e.g. "0-3;4-7"
+CPU_AFFINITY = os.getenv("CPU_AFFINITY", "off")
+CPU_RESERVED_CORES = int(os.getenv("CPU_RESERVED_CORES", "1"))
+WHISPER_ALLOWED_MODELS = [m.strip() for m in os.getenv("WHISPER_ALLOWED_MODELS", "").split(",") if m.strip()]
+MAX_LOADED_MODELS = int(os.getenv("MAX_LOADED_MODELS", "2"))
+MAX_MODEL_MEMORY_GB = float(os.getenv("MAX_MODEL_MEMORY_GB", "0")) or None
+# "int8" for every model, or per model, e.g. "base=int8,small=int8"
+WHISPER_QUANTIZE = parse_quantization(os.getenv("WHISPER_QUANTIZE", ""))
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MEMORY_MB = float(os.getenv("CACHE_MEMORY_MB", "64"))
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+WARMUP_AUDIO_SECONDS = float(os.getenv("WARMUP_AUDIO_SECONDS", "2"))
+LONG_AUDIO_CHUNK_SECONDS = float(os.getenv("LONG_AUDIO_CHUNK_SECONDS", "180"))
+LONG_AUDIO_OVERLAP_SECONDS = float(os.getenv("LONG_AUDIO_OVERLAP_SECONDS", "1"))
+VAD_FLATNESS_THRESHOLD = float(os.getenv("VAD_FLATNESS_THRESHOLD", "0")) or None
+REALTIME_MIN_CHUNK_SECONDS = float(os.getenv("REALTIME_MIN_CHUNK_SECONDS", "0.5"))
+REALTIME_TRIM_SECONDS = float(os.getenv("REALTIME_TRIM_SECONDS", "10"))
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "100"))
+BATCH_MAX_ARCHIVE_MB = float(os.getenv("BATCH_MAX_ARCHIVE_MB", "500"))
+BATCH_DECODE_CONCURRENCY = int(os.getenv("BATCH_DECODE_CONCURRENCY", "4"))
+# Largest request body accepted, and the most body bytes all in-flight uploads may hold together
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "500"))
+MAX_INFLIGHT_UPLOAD_MB = float(os.getenv("MAX_INFLIGHT_UPLOAD_MB", "2048"))
+# Responses at least this large are compressed for clients sending Accept-Encoding
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "4096"))
+# Admin token unlocking ?profile=1 on /transcribe; profiling is disabled when empty
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+JOBS_DIR = os.getenv("JOBS_DIR", "data/jobs")
+JOBS_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "1"))
+JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", "100"))
+JOBS_RETENTION_SECONDS = float(os.getenv("JOBS_RETENTION_SECONDS", str(24 * 3600)))
+JOBS_MAX_FINISHED = int(os.getenv("JOBS_MAX_FINISHED", "1000"))
+JOBS_MAX_WAIT_SECONDS = float(os.getenv("JOBS_MAX_WAIT_SECONDS", "30"))
 
-logger.info(f"Loading Whisper model: {MODEL_NAME}")
-model = whisper.load_model(MODEL_NAME)
-model.eval()
+# Models are loaded on first use; the default one is loaded and warmed up in the background at startup.
+# Windows from concurrent requests are decoded together when BATCH_SIZE > 1
+registry_config = dict(
+    default_model=MODEL_NAME,
+    allowed_models=WHISPER_ALLOWED_MODELS or None,
+    max_models=MAX_LOADED_MODELS,
+    max_memory_gb=MAX_MODEL_MEMORY_GB,
+    batch_size=BATCH_SIZE,
+    batch_max_wait_ms=BATCH_MAX_WAIT_MS,
+    quantize=WHISPER_QUANTIZE
+)
+model_registry = ModelRegistry(**registry_config)
+
+# Cores and torch thread pools of the inference workers: one slot per worker process, or a
+# single slot shared by the inference threads of this process. Unpinned in-process inference
+# keeps torch's default thread count unless INFERENCE_THREADS_PER_PROCESS is set
+cpu_layout = plan_layout(
+    workers=INFERENCE_PROCESSES or 1,
+    affinity=CPU_AFFINITY,
+    reserved_cores=CPU_RESERVED_CORES,
+    threads_per_worker=INFERENCE_THREADS_PER_PROCESS or (
+        torch.get_num_threads() if INFERENCE_PROCESSES == 0 and CPU_AFFINITY.strip().lower() == "off" else 0
+    ),
+    interop_threads=INFERENCE_INTEROP_THREADS
+)
+
+# With INFERENCE_PROCESSES > 0, models live in worker processes instead of this one.
+# Each process runs one job at a time, so there is nothing to batch inside it.
+if INFERENCE_PROCESSES > 0:
+    worker_pool = ProcessWorkerPool(
+        processes=INFERENCE_PROCESSES,
+        threads_per_process=cpu_layout.workers[0].threads,
+        registry_kwargs={**registry_config, "batch_size": 1},
+        slots=cpu_layout.workers
+    )
+    INFERENCE_WORKERS = INFERENCE_PROCESSES
+else:
+    worker_pool = None
+
+# Results of previously transcribed audio, keyed by content
+result_cache = TranscriptionCache(
+    max_memory_bytes=int(CACHE_MEMORY_MB * 1024 * 1024),
+    disk_path=CACHE_DB_PATH or None,
+    ttl_seconds=CACHE_TTL_SECONDS
+) if CACHE_ENABLED else None
+
+# Prometheus metrics, served at /metrics
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram(
+    "whisper_stage_seconds",
+    "Time spent in each processing stage of a request",
+    labelnames=("stage",)
+)
+queue_wait_seconds = metrics.histogram(
+    "whisper_queue_wait_seconds",
+    "Time transcription jobs wait for an inference worker"
+)
+# Inverse of the benchmarks' real-time factor, so that higher is faster like the other throughput metrics
+speed_factor = metrics.histogram(
+    "whisper_speed_factor",
+    "Audio seconds transcribed per second of processing",
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200)
+)
+inference_queue_depth = metrics.gauge("whisper_inference_queue_depth", "Transcription jobs waiting for a worker")
+inference_running = metrics.gauge("whisper_inference_running", "Transcription jobs being run")
+requests_in_flight = metrics.gauge("whisper_requests_in_flight", "HTTP requests being served")
+received_bytes = metrics.counter("whisper_received_bytes_total", "Audio bytes received")
+uploads_in_flight_bytes = metrics.gauge("whisper_upload_bytes_in_flight", "Request body bytes held by in-flight uploads")
+response_bytes = metrics.counter(
+    "whisper_response_bytes_total",
+    "Transcription response bytes sent, by media type and content encoding",
+    labelnames=("media_type", "encoding")
+)
+realtime_sessions = metrics.gauge("whisper_realtime_sessions", "Open WebSocket transcription sessions")
+cancelled_transcriptions = metrics.counter(
+    "whisper_cancelled_total",
+    "Transcriptions abandoned before they finished, by reason",
+    labelnames=("reason",)
+)
+model_requests = metrics.counter(
+    "whisper_model_requests_total",
+    "Transcriptions run, by model and outcome",
+    labelnames=("model", "status")
+)
+temperature_fallbacks = metrics.counter(
+    "whisper_temperature_fallbacks_total",
+    "Windows decoded again at a higher temperature because the output looked degenerate"
+)
+model_audio_seconds = metrics.counter(
+    "whisper_model_audio_seconds_total",
+    "Seconds of audio transcribed, by model",
+    labelnames=("model",)
+)
+model_processing_seconds = metrics.counter(
+    "whisper_model_processing_seconds_total",
+    "Seconds spent transcribing, by model",
+    labelnames=("model",)
+)
+app.add_middleware(InFlightMiddleware, gauge=requests_in_flight, exclude_paths=("/metrics",))
+
+# Oversized bodies are refused before they are read, and uploads beyond the budget are turned away
+upload_budget = UploadBudget(int(MAX_INFLIGHT_UPLOAD_MB * 1024 ** 2) if MAX_INFLIGHT_UPLOAD_MB > 0 else None)
+app.add_middleware(
+    UploadLimitMiddleware,
+    budget=upload_budget,
+    max_body_bytes=int(MAX_UPLOAD_MB * 1024 ** 2) if MAX_UPLOAD_MB > 0 else None
+)
+
+# Blocking inference runs here so the event loop stays responsive
+inference_executor = InferenceExecutor(
+    workers=INFERENCE_WORKERS,
+    max_queue_size=INFERENCE_QUEUE_SIZE,
+    on_wait=queue_wait_seconds.observe,
+    aging_rate=SCHEDULER_AGING_RATE,
+    # In-process inference threads run on the inference cores; dispatchers to worker processes don't need to
+    initializer=(lambda: pin_current_thread(cpu_layout.workers[0].cores)) if worker_pool is None else None
+)
+
+# Startup progress of the default model, reported by /ready
+readiness = {"status": "starting", "error": None, "load_seconds": None}
+
+# Queued and finished transcription jobs, persisted across restarts; the database is opened on startup
+job_store: Optional[JobStore] = None
 
 class TranscriptionResponse(BaseModel):
     text: str
     segments: List[dict]
+    language: Optional[str] = None
+    vad: Optional[dict] = None
+    profile: Optional[dict] = None
 
 @app.on_event("startup")
 async def startup_event():
@@ -40,76 +240,1290 @@ async def startup_event():
         logger.info(f"CUDA available: {torch.cuda.get_device_name(0)}")
     else:
         logger.warning("CUDA not available, using CPU")
+    # Threads started from here on (executor, to_thread pool, worker processes) inherit
+    # the event loop's cores until they pin themselves
+    pin_current_thread(cpu_layout.api_cores)
+    if worker_pool is None:
+        apply_torch_threads(cpu_layout.workers[0].threads, cpu_layout.workers[0].interop_threads)
+    logger.info(f"CPU layout ({cpu_layout.mode}): API cores {cpu_layout.api_cores or 'all'}, inference "
+                + ", ".join(f"{slot.cores or 'all'} x{slot.threads} threads" for slot in cpu_layout.workers))
+    if worker_pool is not None:
+        worker_pool.start()
+    inference_executor.start()
+    global job_store, job_runner
+    job_store = JobStore(JOBS_DIR)
+    # Jobs are drained in the background, sharing the inference executor with synchronous requests
+    job_runner = JobRunner(
+        job_store,
+        run_job,
+        concurrency=JOBS_CONCURRENCY,
+        retention_seconds=JOBS_RETENTION_SECONDS,
+        max_finished=JOBS_MAX_FINISHED
+    )
+    job_runner.start()
+    # Loading runs in the background so the server accepts connections right away;
+    # /ready reports when the model can serve traffic
+    app.state.warm_up_task = asyncio.create_task(warm_up_in_background())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await job_runner.stop()
+    job_store.close()
+    inference_executor.shutdown(wait=False)
+    if worker_pool is not None:
+        worker_pool.shutdown()
+    model_registry.shutdown()
+    if result_cache is not None:
+        result_cache.close()
+
+def warm_up() -> None:
+    """Load the default model and transcribe synthetic audio with it
+
+    The first transcription initializes torch kernels and allocator pools,
+    which would otherwise slow down the first real request. In process
+    mode every worker process is warmed up.
+    """
+    if WARMUP_AUDIO_SECONDS <= 0:
+        if worker_pool is None:
+            model_registry.preload(MODEL_NAME)
+        return
+
+    # Faint noise: enough to run language detection, the encoder and a few decoder steps
+    audio = (np.random.default_rng(0).standard_normal(
+        int(WARMUP_AUDIO_SECONDS * AudioUtils.WHISPER_SAMPLE_RATE)
+    ) * 1e-3).astype(np.float32)
+
+    def options() -> TranscriptionOptions:
+        return TranscriptionOptions(temperature=(0.0,), fp16=torch.cuda.is_available())
+
+    if worker_pool is None:
+        # Not counted as a request of the model
+        with model_registry.acquire(MODEL_NAME, record=False) as handle:
+            transcribe(handle.decoder, audio, options())
+        return
+
+    # Each call holds one worker process until it returns, so concurrent calls reach every process
+    with ThreadPoolExecutor(max_workers=worker_pool.processes) as pool:
+        list(pool.map(lambda _: transcribe_pcm(audio, MODEL_NAME, options()), range(worker_pool.processes)))
+
+async def warm_up_in_background() -> None:
+    """Warm up the default model and mark the server ready"""
+    readiness["status"] = "loading"
+    started = time.perf_counter()
+    try:
+        # In-process models warm up on an inference thread, so the threads they start share its cores
+        if worker_pool is None:
+            await inference_executor.run(warm_up)
+        else:
+            await asyncio.to_thread(warm_up)
+    except Exception as e:
+        logger.error(f"Model warm-up failed: {str(e)}")
+        readiness.update(status="failed", error=str(e))
+        return
+    readiness.update(status="ready", load_seconds=round(time.perf_counter() - started, 3))
+    logger.info(f"Model {MODEL_NAME} is warm after {readiness['load_seconds']}s, ready for traffic")
+
+def transcribe_pcm(
+    audio: np.ndarray,
+    model_name: str,
+    options: TranscriptionOptions,
+    on_window: Optional[Callable[[List[dict]], None]] = None,
+    cancel: Optional[CancelToken] = None,
+    profiler: Optional[str] = None
+) -> dict:
+    """Transcribe decoded audio; runs on an inference worker
+
+    With `cancel`, the work stops with `JobCancelled` before the next
+    30-second window once the token is cancelled. With `profiler`, the
+    transcription runs under it and the result gets a `profile` summary.
+    """
+    if cancel is not None:
+        # It may have waited in the queue past its deadline
+        cancel.raise_if_cancelled()
+    if worker_pool is not None:
+        return worker_pool.transcribe(
+            audio, model_name, options, on_window=on_window, cancel=cancel, profiler=profiler
+        )
+    run = partial(profile_transcription, profiler=profiler) if profiler else transcribe
+    with model_registry.acquire(model_name) as handle:
+        return run(
+            handle.decoder, audio, options,
+            on_window=on_window,
+            check_cancelled=cancel.raise_if_cancelled if cancel is not None else None
+        )
+
+def detect_language_pcm(audio: np.ndarray, model_name: str, options: TranscriptionOptions) -> dict:
+    """Detect the language of decoded audio; runs on an inference worker"""
+    if worker_pool is not None:
+        return worker_pool.detect_language(audio, model_name, options)
+    with model_registry.acquire(model_name) as handle:
+        return detect_language(handle.decoder, audio, fp16=options.fp16)
+
+def request_model_name(request: Request, model: Optional[str]) -> str:
+    """Get the model a request asked for, from the form field or the query string"""
+    try:
+        return model_registry.resolve(model or request.query_params.get("model"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def decoding_options(
+    language: Optional[str],
+    task: Optional[str],
+    decoding: Optional[Dict[str, Optional[str]]] = None
+) -> TranscriptionOptions:
+    """Build transcription options from a requested language, task and decoding settings
+
+    A given language skips language detection.
+
+    Args:
+        language: Language code or English name
+        task: `transcribe` or `translate`
+        decoding: The `preset` and the overridden options, as text
+
+    Raises:
+        ValueError: If the language, task or a decoding setting is not supported
+    """
+    task = (task or "transcribe").lower()
+    if task not in TASKS:
+        raise ValueError(f"Unsupported task '{task}', choose one of {list(TASKS)}")
+    decoding = dict(decoding or {})
+    settings = decoding_settings(decoding.pop("preset", None) or DECODING_PRESET, **decoding)
+    return TranscriptionOptions(
+        language=normalize_language(language), task=task, fp16=torch.cuda.is_available(), **settings
+    )
+
+def decoding_fields(
+    preset: Optional[str] = Form(None),
+    temperature: Optional[str] = Form(None),
+    beam_size: Optional[str] = Form(None),
+    best_of: Optional[str] = Form(None),
+    patience: Optional[str] = Form(None),
+    condition_on_previous_text: Optional[str] = Form(None),
+    compression_ratio_threshold: Optional[str] = Form(None),
+    logprob_threshold: Optional[str] = Form(None),
+    no_speech_threshold: Optional[str] = Form(None)
+) -> Dict[str, Optional[str]]:
+    """Form fields choosing the decoding preset and overriding its options"""
+    return {
+        "preset": preset,
+        "temperature": temperature,
+        "beam_size": beam_size,
+        "best_of": best_of,
+        "patience": patience,
+        "condition_on_previous_text": condition_on_previous_text,
+        "compression_ratio_threshold": compression_ratio_threshold,
+        "logprob_threshold": logprob_threshold,
+        "no_speech_threshold": no_speech_threshold
+    }
+
+def request_options(
+    request: Request,
+    language: Optional[str],
+    task: Optional[str],
+    decoding: Optional[Dict[str, Optional[str]]] = None
+) -> TranscriptionOptions:
+    """Build the transcription options of a request from the form fields or the query string"""
+    decoding = {
+        name: value if value is not None else request.query_params.get(name)
+        for name, value in (decoding or dict.fromkeys(("preset",) + DECODING_OVERRIDES)).items()
+    }
+    try:
+        return decoding_options(
+            language or request.query_params.get("language"),
+            task or request.query_params.get("task"),
+            decoding
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def request_priority(connection: HTTPConnection, priority: Optional[str] = None, default: str = DEFAULT_PRIORITY) -> str:
+    """Get the scheduling class of a request
+
+    Taken from the form field, the `X-Priority` header or the `priority`
+    query parameter, then from the class mapped to the caller's API key
+    (`Authorization: Bearer <key>` or `X-API-Key`) in PRIORITY_API_KEYS.
+
+    Raises:
+        ValueError: If the priority class is unknown
+    """
+    priority = priority or connection.headers.get("x-priority") or connection.query_params.get("priority")
+    if not priority:
+        key = connection.headers.get("x-api-key") or connection.headers.get("authorization", "").removeprefix("Bearer ")
+        priority = PRIORITY_API_KEYS.get(key.strip(), default)
+    priority = priority.strip().lower()
+    if priority not in PRIORITY_WEIGHTS:
+        raise ValueError(f"Unknown priority '{priority}', choose one of {list(PRIORITY_WEIGHTS)}")
+    return priority
+
+def scheduling_priority(request: Request, priority: Optional[str], default: str = DEFAULT_PRIORITY) -> str:
+    """Get the scheduling class of an HTTP request, answering 400 when it is invalid"""
+    try:
+        return request_priority(request, priority, default)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def audio_cost(audio: np.ndarray) -> float:
+    """Expected cost of transcribing audio for the scheduler: its duration in seconds"""
+    return len(audio) / AudioUtils.WHISPER_SAMPLE_RATE
+
+def request_cancel_token(request: Request) -> CancelToken:
+    """Create the cancel token of a request, with the deadline set by `X-Deadline-Ms`
+
+    The header gives the milliseconds the client is willing to wait, counted
+    from when the request is handled.
+    """
+    deadline_ms = request.headers.get("x-deadline-ms")
+    if deadline_ms is None:
+        return CancelToken()
+    try:
+        deadline_ms = float(deadline_ms)
+    except ValueError:
+        deadline_ms = 0
+    if deadline_ms <= 0:
+        raise HTTPException(status_code=400, detail="X-Deadline-Ms must be a positive number of milliseconds")
+    return CancelToken(deadline=time.monotonic() + deadline_ms / 1000)
 
-@app.post("/transcribe", response_model=TranscriptionResponse)
+@asynccontextmanager
+async def cancel_on_disconnect(request: Request, cancel: CancelToken):
+    """Cancel `cancel` if the client disconnects while the block runs"""
+    async def watch() -> None:
+        while not cancel.cancelled():
+            if await request.is_disconnected():
+                cancel.cancel("disconnect")
+                return
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+    watcher = asyncio.create_task(watch())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+def observe_cancellation(model_name: str, reason: str) -> None:
+    """Record a transcription abandoned before it finished"""
+    logger.info(f"Transcription with {model_name} cancelled ({reason})")
+    model_requests.inc(model=model_name, status="cancelled")
+    cancelled_transcriptions.inc(reason=reason)
+
+def request_flag(request: Request, value: Optional[bool], name: str) -> bool:
+    """Get a boolean option from the form field or the query string"""
+    if value is not None:
+        return value
+    return request.query_params.get(name, "").lower() in ("1", "true", "yes")
+
+def request_profiler(request: Request) -> Optional[str]:
+    """Get the profiler a request asked for with `?profile=`, checking the admin token
+
+    `profile=1` (or `cprofile`) runs cProfile, `profile=torch` adds
+    `torch.profiler`. The request must carry PROFILING_TOKEN in `X-Admin-Token`.
+    """
+    profile = request.query_params.get("profile", "").strip().lower()
+    if profile in ("", "0", "false", "no"):
+        return None
+    profiler = "cprofile" if profile in ("1", "true", "yes") else profile
+    if profiler not in PROFILERS:
+        raise HTTPException(status_code=400, detail=f"Unknown profiler '{profile}', choose one of {list(PROFILERS)}")
+    if not PROFILING_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiling is disabled; set PROFILING_TOKEN to enable it")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), PROFILING_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Profiling requires a valid X-Admin-Token header")
+    # Filled in by observe_stage while the audio is read
+    request.state.profile_stages = {}
+    return profiler
+
+def request_profile(request: Request, result: dict, inference_seconds: float) -> dict:
+    """Assemble the profile of a profiled request from its result and the request's own stages"""
+    profile = result.pop("profile", None) or {"stages": {}, "windows": 0, "fallbacks": 0}
+    stages = {**request.state.profile_stages, **profile.get("stages", {})}
+    stages["inference"] = round(inference_seconds, 6)
+    if "seconds" in profile:
+        # Waiting for a worker, plus the hand-off to a worker process
+        stages["queue_wait"] = round(max(0.0, inference_seconds - profile["seconds"]), 6)
+    return {**profile, "stages": stages}
+
+def cache_options(options: TranscriptionOptions, **flags: bool) -> Union[TranscriptionOptions, dict]:
+    """Get what identifies a result in the cache: the options plus the request flags that change it"""
+    enabled = {name: True for name, value in flags.items() if value}
+    return {**asdict(options), **enabled} if enabled else options
+
+def cache_policy(request: Request) -> Tuple[bool, bool]:
+    """Decide whether to read and write the result cache for a request
+
+    `Cache-Control: no-cache` skips the lookup but stores the new result,
+    `Cache-Control: no-store` bypasses the cache entirely.
+    """
+    if result_cache is None:
+        return False, False
+    directives = {d.strip().lower() for d in request.headers.get("cache-control", "").split(",")}
+    if "no-store" in directives:
+        return False, False
+    return "no-cache" not in directives, True
+
+async def cache_lookup(
+    request: Request,
+    audio: np.ndarray,
+    model_name: str,
+    options: Union[TranscriptionOptions, dict]
+) -> Tuple[Optional[str], Optional[dict]]:
+    """Get the cache key to store a result under, and the cached result if any"""
+    read_cache, write_cache = cache_policy(request)
+    if not write_cache:
+        return None, None
+    # int8 results differ slightly from float ones, so they are cached separately
+    key = await asyncio.to_thread(
+        TranscriptionCache.make_key, audio, model_registry.variant(model_name), options
+    )
+    cached = await asyncio.to_thread(result_cache.get, key) if read_cache else None
+    return key, cached
+
+def observe_stage(request: Request, stage: str, seconds: float) -> None:
+    """Record the time a request spent in a stage, also in its profile when it is profiled"""
+    stage_seconds.observe(seconds, stage=stage)
+    profile_stages = getattr(request.state, "profile_stages", None)
+    if profile_stages is not None:
+        profile_stages[stage] = round(seconds, 6)
+
+async def read_upload_audio(request: Request, audio: UploadFile, max_samples: Optional[int] = None) -> np.ndarray:
+    """Decode an uploaded file off the event loop, reading it in chunks, up to `max_samples` if given"""
+    # The multipart body was received and parsed before the endpoint ran; files
+    # larger than 1 MB were spooled to disk and are never read into memory whole
+    observe_stage(request, "upload_read", time.perf_counter() - request.state.started_at)
+    received_bytes.inc(audio.size or 0)
+    started = time.perf_counter()
+    try:
+        await audio.seek(0)
+        pcm = await asyncio.to_thread(AudioUtils.decode_audio_file, audio.file, max_samples=max_samples)
+    except FileNotFoundError:
+        logger.error("ffmpeg is not installed, uploaded audio can't be decoded")
+        raise HTTPException(status_code=503, detail="Audio decoding is unavailable: ffmpeg is not installed")
+    except Exception as e:
+        logger.warning(f"Failed to decode uploaded audio: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Could not decode audio: {str(e)}")
+    observe_stage(request, "audio_decode", time.perf_counter() - started)
+    return pcm
+
+async def read_raw_pcm(request: Request, max_samples: Optional[int] = None) -> np.ndarray:
+    """Read a raw PCM request body, stopping after `max_samples` samples if given
+
+    The sample format is declared with the `sample_rate`, `dtype` and
+    `channels` query parameters or the `X-Sample-Rate`, `X-Sample-Format`
+    and `X-Channels` headers.
+    """
+    params = request.query_params
+    headers = request.headers
+    try:
+        sample_rate = int(params.get("sample_rate") or headers.get("x-sample-rate")
+                          or AudioUtils.WHISPER_SAMPLE_RATE)
+        channels = int(params.get("channels") or headers.get("x-channels") or 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="sample_rate and channels must be integers")
+    dtype = params.get("dtype") or headers.get("x-sample-format") or "float32"
+
+    if sample_rate != AudioUtils.WHISPER_SAMPLE_RATE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Raw PCM must be sampled at {AudioUtils.WHISPER_SAMPLE_RATE} Hz; "
+                   f"upload an encoded audio file for other sample rates"
+        )
+
+    max_bytes = None
+    if max_samples is not None and dtype in AudioUtils.PCM_DTYPES:
+        max_bytes = max_samples * np.dtype(AudioUtils.PCM_DTYPES[dtype]).itemsize * max(channels, 1)
+
+    # A bytearray keeps the wrapped samples writable, so torch can use them without a copy
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if max_bytes is not None and len(body) >= max_bytes:
+            del body[max_bytes:]
+            break
+    observe_stage(request, "upload_read", time.perf_counter() - request.state.started_at)
+    received_bytes.inc(len(body))
+    started = time.perf_counter()
+    try:
+        pcm = AudioUtils.pcm_from_bytes(body, dtype=dtype, channels=channels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    observe_stage(request, "audio_decode", time.perf_counter() - started)
+    return pcm
+
+async def read_streamed_audio(request: Request, max_samples: Optional[int] = None) -> np.ndarray:
+    """Decode an encoded audio file sent as the request body while it is being received
+
+    Every chunk is piped to ffmpeg as it arrives, so only the decoded
+    samples are kept in memory, and decoding is mostly done by the time the
+    upload is. WAV and FLAC files at 16 kHz are read with soundfile instead,
+    and MP4 files with their index at the end are decoded once received
+    (`FFmpegStreamDecoder`). `audio_decode` is the decoding left after the
+    last chunk. With `max_samples`, the rest of the body is not read once
+    the decoder has that many samples.
+    """
+    decoder = FFmpegStreamDecoder(max_samples=max_samples)
+    try:
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await asyncio.to_thread(decoder.write, chunk)
+                if decoder.done:
+                    break
+            observe_stage(request, "upload_read", time.perf_counter() - request.state.started_at)
+            received_bytes.inc(decoder.bytes_written)
+            if not decoder.bytes_written:
+                raise HTTPException(status_code=400, detail="No audio provided")
+            started = time.perf_counter()
+            pcm = await asyncio.to_thread(decoder.finish)
+        except FileNotFoundError:
+            logger.error("ffmpeg is not installed, streamed audio can't be decoded")
+            raise HTTPException(status_code=503, detail="Audio decoding is unavailable: ffmpeg is not installed")
+        except (RuntimeError, OSError) as e:
+            logger.warning(f"Failed to decode streamed audio: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Could not decode audio: {str(e)}")
+        observe_stage(request, "audio_decode", time.perf_counter() - started)
+        return pcm
+    finally:
+        await asyncio.to_thread(decoder.close)
+
+def is_encoded_audio(content_type: str) -> bool:
+    """Check whether a request body is an encoded audio file, from its content type"""
+    return content_type.startswith(("audio/", "video/", "application/ogg"))
+
+async def read_request_audio(
+    request: Request,
+    audio: Optional[UploadFile],
+    max_samples: Optional[int] = None
+) -> np.ndarray:
+    """Get decoded audio from a raw PCM body, an encoded audio body or a multipart upload
+
+    With `max_samples`, only that many samples from the start are decoded.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/octet-stream"):
+        return await read_raw_pcm(request, max_samples)
+    if is_encoded_audio(content_type):
+        return await read_streamed_audio(request, max_samples)
+    if audio is None:
+        raise HTTPException(status_code=400, detail="No audio provided")
+    return await read_upload_audio(request, audio, max_samples)
+
+def observe_transcription(model_name: str, audio: np.ndarray, elapsed: Optional[float], result: Optional[dict]) -> None:
+    """Record the metrics of one transcription; `result` is None when it failed
+
+    The stage timings and decoding counts measured by the transcriber are
+    removed from the result, so they are not cached or returned.
+    """
+    if result is None:
+        model_requests.inc(model=model_name, status="error")
+        return
+    for stage, seconds in result.pop("timings", {}).items():
+        stage_seconds.observe(seconds, stage=stage)
+    temperature_fallbacks.inc(result.pop("decoding", {}).get("fallbacks", 0))
+    audio_seconds = len(audio) / AudioUtils.WHISPER_SAMPLE_RATE
+    model_requests.inc(model=model_name, status="ok")
+    model_audio_seconds.inc(audio_seconds, model=model_name)
+    model_processing_seconds.inc(elapsed, model=model_name)
+    if elapsed > 0:
+        speed_factor.observe(audio_seconds / elapsed)
+
+def isolate_speech(audio: np.ndarray) -> Tuple[np.ndarray, SpeechMap]:
+    """Find the speech in a recording and join it end to end"""
+    speech_map = SpeechMap.detect(audio, flatness_threshold=VAD_FLATNESS_THRESHOLD)
+    return speech_map.speech_audio(audio), speech_map
+
+async def run_transcription(
+    audio: np.ndarray,
+    model_name: str,
+    options: TranscriptionOptions,
+    long_audio: bool = False,
+    vad: bool = False,
+    on_progress: Optional[Callable[[float], None]] = None,
+    priority: str = DEFAULT_PRIORITY,
+    cancel: Optional[CancelToken] = None,
+    profiler: Optional[str] = None
+) -> dict:
+    """Transcribe on the inference executor
+
+    Long audio is split into parallel chunks; with `vad`, only the speech
+    regions are transcribed and the segments mapped back to the original timeline.
+    `on_progress` receives the transcribed fraction of the audio. Every
+    inference call is scheduled in the `priority` class, by the length of
+    the audio it decodes, and stops between windows once `cancel` is cancelled.
+    With `profiler`, a single transcription runs under it and the result gets
+    a `profile` summary including its stage timings and decoding counts.
+    """
+    started = time.perf_counter()
+    try:
+        result = await _run_transcription(
+            audio, model_name, options, long_audio, vad, on_progress, priority, cancel, profiler
+        )
+    except QueueFullError:
+        model_requests.inc(model=model_name, status="rejected")
+        raise
+    except JobCancelled as e:
+        observe_cancellation(model_name, e.reason)
+        raise
+    except Exception:
+        observe_transcription(model_name, audio, None, None)
+        raise
+    observe_transcription(model_name, audio, time.perf_counter() - started, result)
+    return result
+
+async def _run_transcription(
+    audio: np.ndarray,
+    model_name: str,
+    options: TranscriptionOptions,
+    long_audio: bool,
+    vad: bool,
+    on_progress: Optional[Callable[[float], None]],
+    priority: str,
+    cancel: Optional[CancelToken],
+    profiler: Optional[str]
+) -> dict:
+    speech_map = None
+    if vad:
+        audio, speech_map = await asyncio.to_thread(isolate_speech, audio)
+        if not speech_map.regions:
+            return {"text": "", "segments": [], "language": options.language, "vad": speech_map.stats()}
+
+    if long_audio:
+        done = []
+
+        async def run_chunk(chunk: np.ndarray, chunk_options: TranscriptionOptions) -> dict:
+            result = await inference_executor.run(
+                transcribe_pcm, chunk, model_name, chunk_options,
+                cancel=cancel, cost=audio_cost(chunk), priority=priority
+            )
+            done.append(len(chunk))
+            if on_progress is not None:
+                on_progress(min(1.0, sum(done) / max(len(audio), 1)))
+            return result
+
+        result = await transcribe_in_chunks(
+            audio,
+            options,
+            run_chunk,
+            chunk_seconds=LONG_AUDIO_CHUNK_SECONDS,
+            overlap_seconds=LONG_AUDIO_OVERLAP_SECONDS,
+            concurrency=INFERENCE_WORKERS
+        )
+    else:
+        duration = max(len(audio), 1) / AudioUtils.WHISPER_SAMPLE_RATE
+
+        def on_window(segments: List[dict]) -> None:
+            if on_progress is not None and segments:
+                on_progress(min(1.0, segments[-1]["end"] / duration))
+
+        result = await inference_executor.run(
+            transcribe_pcm, audio, model_name, options, on_window,
+            cancel=cancel, profiler=profiler, cost=audio_cost(audio), priority=priority
+        )
+        if profiler is not None:
+            # Copied, since the timings and counts are removed from the result once observed
+            stages = {stage: round(seconds, 6) for stage, seconds in result["timings"].items()}
+            result["profile"].update(stages=stages, **result["decoding"])
+
+    if speech_map is not None:
+        speech_map.remap_segments(result["segments"])
+        result["vad"] = speech_map.stats()
+    return result
+
+def public_result(result: dict, full_segments: bool = False) -> dict:
+    """Get the part of a transcription result returned to clients
+
+    Segments have their `start`, `end` and `text`, or with `full_segments`
+    also their tokens and decoding statistics.
+    """
+    public = {
+        "text": result["text"],
+        "segments": [segment_view(seg, full_segments) for seg in result["segments"]],
+        "language": result.get("language")
+    }
+    if "vad" in result:
+        public["vad"] = result["vad"]
+    return public
+
+def response_media_type(request: Request) -> str:
+    """Negotiate the media type of a transcription response from its `Accept` header
+
+    Checked before any work is done, so an unsupported type fails fast with 406.
+    """
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    if media_type is None:
+        raise HTTPException(
+            status_code=406,
+            detail=f"Unsupported Accept header, choose one of {media_types()}"
+        )
+    return media_type
+
+def encoded_response(
+    request: Request,
+    payload: Union[dict, list],
+    media_type: str,
+    headers: Optional[dict] = None,
+    status_code: int = 200
+) -> Response:
+    """Encode a transcription response, compressing large bodies when the client accepts it"""
+    started = time.perf_counter()
+    body = encode(payload, media_type)
+    stage_seconds.observe(time.perf_counter() - started, stage="serialization")
+
+    headers = {**(headers or {}), "Vary": "Accept, Accept-Encoding"}
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None and len(body) >= COMPRESSION_MIN_BYTES:
+        started = time.perf_counter()
+        body = compress(body, encoding)
+        stage_seconds.observe(time.perf_counter() - started, stage="compression")
+        headers["Content-Encoding"] = encoding
+    else:
+        encoding = "identity"
+    response_bytes.inc(len(body), media_type=media_type, encoding=encoding)
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+def queue_full_exception(e: QueueFullError) -> HTTPException:
+    """Build the 429 response returned when the inference queue is full"""
+    logger.warning(str(e))
+    return HTTPException(
+        status_code=429,
+        detail="Server is busy, please retry later",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+@app.post("/transcribe", response_model=TranscriptionResponse, response_model_exclude_none=True)
 async def transcribe_audio(
-    audio: UploadFile,
-    stream: bool = False,
-    background_tasks: BackgroundTasks = None
+    request: Request,
+    audio: Optional[UploadFile] = None,
+    model: Optional[str] = Form(None),
+    language: Optional[str] = Form(None),
+    task: Optional[str] = Form(None),
+    long_audio: Optional[bool] = Form(None),
+    vad: Optional[bool] = Form(None),
+    priority: Optional[str] = Form(None),
+    full_segments: Optional[bool] = Form(None),
+    decoding: Dict[str, Optional[str]] = Depends(decoding_fields),
+    stream: bool = False
 ):
+    model_name = request_model_name(request, model)
+    options = request_options(request, language, task, decoding)
+    priority = scheduling_priority(request, priority)
+    cancel = request_cancel_token(request)
+    media_type = response_media_type(request)
+    long_audio = request_flag(request, long_audio, "long_audio")
+    vad = request_flag(request, vad, "vad")
+    full_segments = request_flag(request, full_segments, "full_segments")
+    profiler = request_profiler(request)
+    if profiler is not None and long_audio:
+        raise HTTPException(status_code=400, detail="Profiling covers a single transcription; drop long_audio")
+    pcm = await read_request_audio(request, audio)
     try:
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(audio.filename).suffix) as temp_file:
-            content = await audio.read()
-            temp_file.write(content)
-            temp_file.flush()
-
+        # Chunking and silence removal change the output slightly, so those results are cached separately.
+        # A profiled request always transcribes, and its result isn't cached
+        cache_key, result = await cache_lookup(
+            request, pcm, model_name, cache_options(options, long_audio=long_audio, vad=vad)
+        ) if profiler is None else (None, None)
+        headers = {"X-Cache": "HIT" if result is not None else "MISS"}
+        if result is None:
             # Transcribe audio
-            result = model.transcribe(
-                temp_file.name,
-                fp16=torch.cuda.is_available()
-            )
+            # The deadline also ends the wait for a worker; work already running stops at its next window
+            inference_started = time.perf_counter()
+            async with cancel_on_disconnect(request, cancel):
+                try:
+                    result = await asyncio.wait_for(
+                        run_transcription(
+                            pcm, model_name, options, long_audio, vad,
+                            priority=priority, cancel=cancel, profiler=profiler
+                        ),
+                        cancel.remaining()
+                    )
+                except asyncio.TimeoutError:
+                    cancel.cancel("deadline")
+                    observe_cancellation(model_name, "deadline")
+                    raise JobCancelled("deadline")
+            if cache_key is not None:
+                await asyncio.to_thread(result_cache.put, cache_key, result)
+        if "vad" in result:
+            headers["X-VAD-Skipped"] = str(result["vad"]["skipped_fraction"])
 
-            # Clean up temp file
-            background_tasks.add_task(os.unlink, temp_file.name)
+        public = public_result(result, full_segments)
+        if profiler is not None:
+            public["profile"] = request_profile(request, result, time.perf_counter() - inference_started)
 
-            return TranscriptionResponse(
-                text=result["text"],
-                segments=[{
-                    "start": seg["start"],
-                    "end": seg["end"],
-                    "text": seg["text"]
-                } for seg in result["segments"]]
-            )
+        # Encoded here rather than by FastAPI: the result is built by the server, so validating
+        # every segment against TranscriptionResponse would only cost time
+        public = {key: value for key, value in public.items() if value is not None}
+        return encoded_response(request, public, media_type, headers)
 
+    except QueueFullError as e:
+        raise queue_full_exception(e)
+    except JobCancelled as e:
+        if e.reason == "deadline":
+            raise HTTPException(status_code=504, detail="Deadline exceeded before the transcription finished")
+        # Nobody is listening any more; 499 is the usual status for a closed client connection
+        return Response(status_code=499)
     except Exception as e:
         logger.error(f"Error during transcription: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/transcribe/stream")
-async def transcribe_stream(audio: UploadFile):
+async def transcribe_stream(
+    request: Request,
+    audio: Optional[UploadFile] = None,
+    model: Optional[str] = Form(None),
+    language: Optional[str] = Form(None),
+    task: Optional[str] = Form(None),
+    vad: Optional[bool] = Form(None),
+    priority: Optional[str] = Form(None),
+    full_segments: Optional[bool] = Form(None),
+    decoding: Dict[str, Optional[str]] = Depends(decoding_fields)
+):
+    model_name = request_model_name(request, model)
+    options = request_options(request, language, task, decoding)
+    priority = scheduling_priority(request, priority)
+    cancel = request_cancel_token(request)
+    vad = request_flag(request, vad, "vad")
+    full_segments = request_flag(request, full_segments, "full_segments")
+    pcm = await read_request_audio(request, audio)
+    cache_key, cached = await cache_lookup(request, pcm, model_name, cache_options(options, vad=vad))
+    headers = {"X-Cache": "HIT" if cached is not None else "MISS"}
+
+    speech_map = None
+    original_pcm = pcm
+    if cached is None and vad:
+        pcm, speech_map = await asyncio.to_thread(isolate_speech, pcm)
+        headers["X-VAD-Skipped"] = str(speech_map.stats()["skipped_fraction"])
+    elif cached is not None and "vad" in cached:
+        headers["X-VAD-Skipped"] = str(cached["vad"]["skipped_fraction"])
+
+    # Segments are pushed from the inference worker as soon as each window is decoded
+    loop = asyncio.get_running_loop()
+    segment_queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(segments: List[dict]) -> None:
+        if speech_map is not None:
+            # Copies, so the segments of the final result are remapped exactly once
+            segments = speech_map.remap_segments([dict(segment) for segment in segments])
+        loop.call_soon_threadsafe(segment_queue.put_nowait, segments)
+
+    submitted = time.perf_counter()
+    finished = []
+
+    def on_done(_) -> None:
+        # Runs after the last emit, so the sentinel is always queued behind every window
+        finished.append(time.perf_counter())
+        loop.call_soon_threadsafe(segment_queue.put_nowait, None)
+
+    future = None
+    if cached is not None:
+        segment_queue.put_nowait(cached["segments"])
+        segment_queue.put_nowait(None)
+    elif speech_map is not None and not speech_map.regions:
+        # Nothing but silence
+        segment_queue.put_nowait(None)
+    else:
+        # Admit the job before the response starts so a full queue still yields a 429
+        try:
+            future = inference_executor.submit(
+                transcribe_pcm, pcm, model_name, options, emit,
+                cancel=cancel, cost=audio_cost(pcm), priority=priority
+            )
+        except QueueFullError as e:
+            model_requests.inc(model=model_name, status="rejected")
+            raise queue_full_exception(e)
+        future.add_done_callback(on_done)
+
     async def generate_transcription():
+        serialization_seconds = 0.0
         try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(audio.filename).suffix) as temp_file:
-                content = await audio.read()
-                temp_file.write(content)
-                temp_file.flush()
-
-                # Process audio and stream segments
-                result = model.transcribe(
-                    temp_file.name,
-                    fp16=torch.cuda.is_available()
-                )
-                
-                # Stream each segment as it's processed
-                for segment in result["segments"]:
-                    yield f"data: {segment['text']}\n\n"
+            while True:
+                segments = await segment_queue.get()
+                if segments is None:
+                    break
+                for segment in segments:
+                    if not segment["text"]:
+                        continue
+                    serializing = time.perf_counter()
+                    data = {**segment_view(segment, full_segments), "window": segment["window"]}
+                    event = f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                    serialization_seconds += time.perf_counter() - serializing
+                    yield event
+            stage_seconds.observe(serialization_seconds, stage="serialization")
 
-                # Clean up
-                os.unlink(temp_file.name)
+            if future is not None:
+                # Surface errors raised by the inference job
+                try:
+                    result = future.result()
+                except JobCancelled as e:
+                    observe_cancellation(model_name, e.reason)
+                    raise
+                except Exception:
+                    observe_transcription(model_name, original_pcm, None, None)
+                    raise
+                observe_transcription(model_name, original_pcm, finished[0] - submitted, result)
+                if speech_map is not None:
+                    speech_map.remap_segments(result["segments"])
+                    result["vad"] = speech_map.stats()
+                if cache_key is not None:
+                    await asyncio.to_thread(result_cache.put, cache_key, result)
 
         except Exception as e:
             logger.error(f"Error during streaming transcription: {str(e)}")
             yield f"error: {str(e)}\n\n"
+        finally:
+            # The client went away (the response task was cancelled): drop the job if it is still
+            # queued, or stop it at its next window
+            if future is not None and not future.done():
+                cancel.cancel("disconnect")
+                future.cancel()
+                observe_cancellation(model_name, "disconnect")
 
     return StreamingResponse(
         generate_transcription(),
-        media_type="text/event-stream"
+        media_type="text/event-stream",
+        headers=headers
+    )
+
+async def run_job(job: dict, audio: np.ndarray, on_progress: Callable[[float], None]) -> dict:
+    """Transcribe the audio of a queued job, through the result cache"""
+    params = job["params"]
+    options = TranscriptionOptions(
+        language=params.get("language"),
+        task=params.get("task", "transcribe"),
+        fp16=torch.cuda.is_available(),
+        **params.get("decoding", {})
+    )
+    flags = {name: params.get(name, False) for name in ("long_audio", "vad")}
+    cache_key = None
+    if result_cache is not None:
+        cache_key = await asyncio.to_thread(
+            TranscriptionCache.make_key, audio, model_registry.variant(job["model"]), cache_options(options, **flags)
+        )
+        result = await asyncio.to_thread(result_cache.get, cache_key)
+        if result is not None:
+            return public_result(result, params.get("full_segments", False))
+
+    result = await run_transcription(
+        audio, job["model"], options,
+        long_audio=flags["long_audio"],
+        vad=flags["vad"],
+        on_progress=on_progress,
+        # Jobs are asynchronous by nature, so by default they yield to interactive requests
+        priority=params.get("priority", "batch")
     )
+    if cache_key is not None:
+        await asyncio.to_thread(result_cache.put, cache_key, result)
+    return public_result(result, params.get("full_segments", False))
+
+# Drains the job store; created with it on startup
+job_runner: Optional[JobRunner] = None
+
+def job_response(job: dict) -> dict:
+    """Get the client view of a job"""
+    response = {
+        "id": job["id"],
+        "status": job["status"],
+        "model": job["model"],
+        "duration": job["duration"],
+        "progress": job["progress"],
+        "created": job["created"],
+        "started": job["started"],
+        "finished": job["finished"]
+    }
+    if job["result"] is not None:
+        response["result"] = job["result"]
+    if job["error"] is not None:
+        response["error"] = job["error"]
+    return response
+
+@app.websocket("/ws/transcribe")
+async def transcribe_websocket(websocket: WebSocket):
+    """Transcribe live audio sent as binary PCM frames
+
+    Query parameters: `model`, `language`, `task`, the decoding `preset` and
+    option overrides (each pass decodes once, at temperature 0), and the PCM
+    format as `dtype` (float32 or int16), `channels` and `sample_rate` (16000). The
+    server answers with JSON messages: `partial` hypotheses after every
+    decoding pass, `commit` once words are stable across two passes, and
+    `final` with the whole text after the client sends `stop` (or
+    `{"type": "stop"}`). Invalid parameters are reported with an `error`
+    message before the socket is closed.
+    """
+    await websocket.accept()
+    params = websocket.query_params
+    try:
+        model_name = model_registry.resolve(params.get("model"))
+        options = decoding_options(
+            params.get("language"), params.get("task"),
+            {name: params.get(name) for name in ("preset",) + DECODING_OVERRIDES}
+        )
+        priority = request_priority(websocket, default="interactive")
+        dtype = params.get("dtype") or "float32"
+        channels = int(params.get("channels") or 1)
+        if dtype not in AudioUtils.PCM_DTYPES or channels < 1:
+            raise ValueError(f"Unsupported PCM format {dtype} with {channels} channel(s)")
+        if int(params.get("sample_rate") or AudioUtils.WHISPER_SAMPLE_RATE) != AudioUtils.WHISPER_SAMPLE_RATE:
+            raise ValueError(f"Audio must be sampled at {AudioUtils.WHISPER_SAMPLE_RATE} Hz")
+    except ValueError as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=1008)
+        return
+
+    realtime_sessions.inc()
+    stream = RealtimeTranscriber(trim_seconds=REALTIME_TRIM_SECONDS)
+    frame_bytes = np.dtype(AudioUtils.PCM_DTYPES[dtype]).itemsize * channels
+    leftover = bytearray()
+    audio_received = asyncio.Event()
+
+    async def receive() -> None:
+        # Frames don't have to hold whole samples; incomplete ones are kept for the next frame
+        nonlocal leftover
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                received_bytes.inc(len(message["bytes"]))
+                data = leftover + message["bytes"]
+                usable = len(data) - len(data) % frame_bytes
+                leftover = data[usable:]
+                stream.append(AudioUtils.pcm_from_bytes(data[:usable], dtype=dtype, channels=channels))
+                audio_received.set()
+            elif message.get("text") is not None:
+                text = message["text"].strip()
+                try:
+                    text = json.loads(text).get("type", "")
+                except (ValueError, AttributeError):
+                    pass
+                if text == "stop":
+                    return
+
+    async def decode(final: bool) -> None:
+        audio = stream.snapshot()
+        # Greedy decoding only: a temperature fallback would stall the partials
+        pass_options = replace(options, language=options.language or stream.language, temperature=(0.0,))
+        try:
+            result = await inference_executor.run(
+                transcribe_pcm, audio, model_name, pass_options, cost=audio_cost(audio), priority=priority
+            )
+        except QueueFullError as e:
+            # Skipped passes are caught up by the next one, which decodes the whole buffer again
+            await websocket.send_json({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+            return
+        for stage, seconds in result.pop("timings", {}).items():
+            stage_seconds.observe(seconds, stage=stage)
+        update = stream.update(result, final=final)
+        if update["commit"] is not None:
+            await websocket.send_json({"type": "commit", **update["commit"]})
+        if not final:
+            await websocket.send_json({
+                "type": "partial",
+                "text": update["partial"],
+                "audio_seconds": round(stream.stream_seconds, 2)
+            })
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while not receiver.done():
+            if stream.pending_seconds < REALTIME_MIN_CHUNK_SECONDS:
+                audio_received.clear()
+                waiter = asyncio.ensure_future(audio_received.wait())
+                await asyncio.wait({receiver, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                continue
+            await decode(final=False)
+        receiver.result()
+
+        if len(stream.buffer):
+            await decode(final=True)
+        await websocket.send_json({
+            "type": "final",
+            "text": stream.text(),
+            "language": stream.language or options.language,
+            "audio_seconds": round(stream.stream_seconds, 2)
+        })
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Realtime transcription client disconnected")
+    except Exception as e:
+        logger.error(f"Error during realtime transcription: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        receiver.cancel()
+        realtime_sessions.dec()
+
+async def read_batch_files(request: Request, files: List[UploadFile], held: ExitStack) -> List[Tuple[str, BinaryIO]]:
+    """Get the files of a batch request, expanding zip and tar archives
+
+    Uploads are used as the spooled files the multipart parser wrote, and
+    archives are opened from them, so no file is read into memory whole.
+    Archive entries are copied to temporary files and count against the
+    upload budget on top of the request body; `held` closes them and
+    returns their budget once the batch is done.
+    """
+    def reserve(size: int) -> None:
+        if not upload_budget.try_acquire(size):
+            raise HTTPException(
+                status_code=429,
+                detail="Too many uploads in flight, please retry later",
+                headers={"Retry-After": "1"}
+            )
+        held.callback(upload_budget.release, size)
+
+    contents: List[Tuple[str, BinaryIO]] = []
+    for upload in files:
+        received_bytes.inc(upload.size or 0)
+        name = upload.filename or f"file{len(contents)}"
+        await upload.seek(0)
+        if await asyncio.to_thread(is_archive, upload.file):
+            try:
+                entries = await asyncio.to_thread(
+                    extract_files, upload.file, BATCH_MAX_FILES - len(contents),
+                    int(BATCH_MAX_ARCHIVE_MB * 1024 ** 2), reserve
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"{name}: {str(e)}")
+            for _, entry in entries:
+                held.callback(entry.close)
+            contents.extend(entries)
+        else:
+            contents.append((name, upload.file))
+        if len(contents) > BATCH_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"A batch may hold at most {BATCH_MAX_FILES} files")
+    stage_seconds.observe(time.perf_counter() - request.state.started_at, stage="upload_read")
+    if not contents:
+        raise HTTPException(status_code=400, detail="No audio provided")
+    return contents
+
+async def transcribe_batch_file(
+    request: Request,
+    index: int,
+    name: str,
+    file: BinaryIO,
+    model_name: str,
+    options: TranscriptionOptions,
+    vad: bool,
+    full_segments: bool,
+    priority: str,
+    cancel: CancelToken,
+    decode_slots: asyncio.Semaphore,
+    inference_slots: asyncio.Semaphore
+) -> dict:
+    """Decode and transcribe one file of a batch; errors are returned as the file's result"""
+    entry = {"index": index, "filename": name}
+    try:
+        async with decode_slots:
+            started = time.perf_counter()
+            pcm = await asyncio.to_thread(AudioUtils.decode_audio_file, file)
+        stage_seconds.observe(time.perf_counter() - started, stage="audio_decode")
+    except FileNotFoundError:
+        return {**entry, "status": 503, "error": "Audio decoding is unavailable: ffmpeg is not installed"}
+    except Exception as e:
+        logger.warning(f"Failed to decode batch file {name}: {str(e)}")
+        return {**entry, "status": 400, "error": f"Could not decode audio: {str(e)}"}
+    entry["duration"] = round(audio_cost(pcm), 3)
+
+    try:
+        cache_key, result = await cache_lookup(request, pcm, model_name, cache_options(options, vad=vad))
+        if result is None:
+            # At most one file per inference worker is queued at a time, so a batch
+            # neither overflows the queue nor holds every worker for long
+            async with inference_slots:
+                result = await run_transcription(
+                    pcm, model_name, replace(options), vad=vad, priority=priority, cancel=cancel
+                )
+            if cache_key is not None:
+                await asyncio.to_thread(result_cache.put, cache_key, result)
+    except QueueFullError as e:
+        return {**entry, "status": 429, "error": str(e), "retry_after": e.retry_after}
+    except JobCancelled as e:
+        return {**entry, "status": 504 if e.reason == "deadline" else 499, "error": str(e)}
+    except Exception as e:
+        logger.error(f"Error during transcription of batch file {name}: {str(e)}")
+        return {**entry, "status": 500, "error": str(e)}
+    return {**entry, "status": 200, **public_result(result, full_segments)}
+
+@app.post("/transcribe/batch")
+async def transcribe_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    model: Optional[str] = Form(None),
+    language: Optional[str] = Form(None),
+    task: Optional[str] = Form(None),
+    vad: Optional[bool] = Form(None),
+    priority: Optional[str] = Form(None),
+    format: Optional[str] = Form(None),
+    full_segments: Optional[bool] = Form(None),
+    decoding: Dict[str, Optional[str]] = Depends(decoding_fields)
+):
+    """Transcribe many files, or the files of zip/tar archives, in one request
+
+    Files are decoded concurrently and transcribed concurrently, so their
+    30-second windows are decoded in shared batches. The response is a JSON
+    array in upload order, or with `format=ndjson` (or `Accept:
+    application/x-ndjson`) one JSON line per file as soon as it is done.
+    A file that fails gets an `error` and its own `status`; the others are
+    unaffected.
+    """
+    model_name = request_model_name(request, model)
+    options = request_options(request, language, task, decoding)
+    priority = scheduling_priority(request, priority, default="batch")
+    cancel = request_cancel_token(request)
+    vad = request_flag(request, vad, "vad")
+    full_segments = request_flag(request, full_segments, "full_segments")
+    format = (format or request.query_params.get("format") or "").lower()
+    if format not in ("", "json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}', choose json or ndjson")
+    ndjson = format == "ndjson" or (not format and "application/x-ndjson" in request.headers.get("accept", ""))
+    media_type = response_media_type(request) if not ndjson else None
+    held = ExitStack()
+    try:
+        contents = await read_batch_files(request, files, held)
+    except BaseException:
+        held.close()
+        raise
+
+    decode_slots = asyncio.Semaphore(max(1, BATCH_DECODE_CONCURRENCY))
+    inference_slots = asyncio.Semaphore(max(1, INFERENCE_WORKERS))
+    tasks = [
+        asyncio.create_task(transcribe_batch_file(
+            request, index, name, file, model_name, options, vad, full_segments, priority, cancel,
+            decode_slots, inference_slots
+        ))
+        for index, (name, file) in enumerate(contents)
+    ]
+
+    if not ndjson:
+        try:
+            async with cancel_on_disconnect(request, cancel):
+                results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            held.close()
+        return encoded_response(request, results, media_type)
+
+    async def generate_results():
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield encode(await finished, JSON) + b"\n"
+        finally:
+            # The client went away: stop the files still being transcribed
+            if not all(task.done() for task in tasks):
+                cancel.cancel("disconnect")
+                for task in tasks:
+                    task.cancel()
+
+    # Runs once the response is over, also when the stream never started
+    return StreamingResponse(
+        generate_results(), media_type="application/x-ndjson", background=BackgroundTask(held.close)
+    )
+
+@app.post("/detect-language")
+async def detect_audio_language(
+    request: Request,
+    audio: Optional[UploadFile] = None,
+    model: Optional[str] = Form(None),
+    top: int = Query(5, ge=1),
+    priority: Optional[str] = Form(None)
+):
+    # Only the encoder and one decoder step run, on the first 30 seconds, so no more is decoded
+    model_name = request_model_name(request, model)
+    priority = scheduling_priority(request, priority)
+    pcm = await read_request_audio(request, audio, max_samples=N_SAMPLES)
+    try:
+        result = await inference_executor.run(
+            detect_language_pcm, pcm, model_name, TranscriptionOptions(fp16=torch.cuda.is_available()),
+            cost=min(audio_cost(pcm), 30.0), priority=priority
+        )
+    except QueueFullError as e:
+        raise queue_full_exception(e)
+    except Exception as e:
+        logger.error(f"Error during language detection: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    for stage, seconds in result["timings"].items():
+        stage_seconds.observe(seconds, stage=stage)
+    probabilities = dict(list(result["probabilities"].items())[:top])
+    return {
+        "language": result["language"],
+        "probability": probabilities[result["language"]],
+        "probabilities": probabilities,
+        "model": model_name
+    }
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    request: Request,
+    response: Response,
+    audio: Optional[UploadFile] = None,
+    model: Optional[str] = Form(None),
+    language: Optional[str] = Form(None),
+    task: Optional[str] = Form(None),
+    long_audio: Optional[bool] = Form(None),
+    vad: Optional[bool] = Form(None),
+    priority: Optional[str] = Form(None),
+    full_segments: Optional[bool] = Form(None),
+    decoding: Dict[str, Optional[str]] = Depends(decoding_fields)
+):
+    model_name = request_model_name(request, model)
+    options = request_options(request, language, task, decoding)
+    params = {
+        "language": options.language,
+        "task": options.task,
+        # Resolved now, so the job decodes as asked even if DECODING_PRESET changes before it runs
+        "decoding": {name: getattr(options, name) for name in DECODING_OVERRIDES},
+        "long_audio": request_flag(request, long_audio, "long_audio"),
+        "vad": request_flag(request, vad, "vad"),
+        "priority": scheduling_priority(request, priority, default="batch"),
+        "full_segments": request_flag(request, full_segments, "full_segments")
+    }
+    pcm = await read_request_audio(request, audio)
+    if await asyncio.to_thread(job_store.count, QUEUED) >= JOBS_MAX_QUEUED:
+        raise HTTPException(status_code=429, detail="Too many queued jobs, please retry later")
+
+    job = await asyncio.to_thread(job_store.create, pcm, model_name, params)
+    job_runner.notify()
+    response.headers["Location"] = f"/jobs/{job['id']}"
+    return job_response(job)
+
+@app.get("/jobs/{job_id}")
+async def get_job(request: Request, job_id: str, wait: float = Query(0, ge=0)):
+    media_type = response_media_type(request)
+    # Long-poll: hold the request until the job finishes or `wait` seconds pass
+    job = await job_runner.wait(job_id, min(wait, JOBS_MAX_WAIT_SECONDS))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return encoded_response(request, job_response(job), media_type)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    inference = inference_executor.stats()
+    inference_queue_depth.set(inference["queue_depth"])
+    inference_running.set(inference["running"])
+    uploads_in_flight_bytes.set(upload_budget.stats()["in_flight_bytes"])
+    return Response(content=metrics.render(), media_type=MetricsRegistry.CONTENT_TYPE)
+
+@app.get("/ready")
+async def ready_check():
+    # Unlike /health, this only succeeds once the default model is loaded and warm
+    status_code = 200 if readiness["status"] == "ready" else 503
+    return JSONResponse(status_code=status_code, content={"model": MODEL_NAME, **readiness})
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "model": MODEL_NAME}
+    return {
+        "status": "healthy",
+        "model": MODEL_NAME,
+        "ready": readiness["status"] == "ready",
+        "inference": inference_executor.stats(),
+        "models": model_registry.stats(),
+        "processes": worker_pool.stats() if worker_pool is not None else None,
+        "cpu": cpu_layout.to_dict(),
+        "cache": result_cache.stats() if result_cache is not None else None,
+        "jobs": job_store.stats(),
+        "uploads": upload_budget.stats()
+    }
 
 if __name__ == "__main__":
     import uvicorn
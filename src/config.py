@@ -28,6 +28,8 @@ class Config:
         # Whisper Configuration
         self.whisper_model = os.getenv("WHISPER_MODEL", "base")
         self.batch_size = int(os.getenv("BATCH_SIZE", "16"))
+        # Send 16kHz audio as raw int16 PCM instead of an encoded WAV file; needs a server that accepts it
+        self.raw_pcm_upload = os.getenv("RAW_PCM_UPLOAD", "false").lower() == "true"
         
         # Audio Configuration
         self.sample_rate = int(os.getenv("SAMPLE_RATE", "16000"))
@@ -0,0 +1 @@
+# Server package initialization 
\ No newline at end of file
@@ -0,0 +1,102 @@
+import io
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from typing import BinaryIO, Callable, List, Optional, Tuple, Union
+
+# Archive entries that are never audio: macOS resource forks and Finder metadata
+_IGNORED_PREFIXES = ("__MACOSX/", "._", ".DS_Store")
+
+
+def is_archive(data: Union[bytes, BinaryIO]) -> bool:
+    """Check whether an upload, given as bytes or a seekable file, is a zip or tar archive (plain or compressed)"""
+    file = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    try:
+        if zipfile.is_zipfile(file):
+            return True
+        file.seek(0)
+        with tarfile.open(fileobj=file):
+            return True
+    except tarfile.TarError:
+        return False
+    finally:
+        file.seek(0)
+
+
+def extract_files(
+    data: Union[bytes, BinaryIO],
+    max_files: int,
+    max_bytes: int,
+    reserve: Optional[Callable[[int], None]] = None,
+    spool_memory_bytes: int = 1024 * 1024
+) -> List[Tuple[str, BinaryIO]]:
+    """Copy the regular files of a zip or tar archive to temporary files
+
+    Directories and macOS metadata entries are skipped; files keep their
+    path inside the archive as their name, in archive order. Each copy is
+    kept in memory up to `spool_memory_bytes` and moved to disk beyond, so
+    the archive is never inflated in memory. The caller closes the copies.
+
+    Args:
+        data: Archive, as bytes or a seekable file
+        max_files: Maximum number of files the archive may hold
+        max_bytes: Maximum total uncompressed size of the files
+        reserve: Optional callable receiving each file's size before it is
+            copied; it may raise to stop the extraction
+        spool_memory_bytes: Size up to which a copy is kept in memory
+
+    Returns:
+        List[Tuple[str, BinaryIO]]: Name and copy of each file, positioned at its start
+
+    Raises:
+        ValueError: If the archive is unreadable or exceeds the limits
+    """
+    archive_file = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    files: List[Tuple[str, BinaryIO]] = []
+    total = 0
+
+    def add(name: str, size: int, open_member) -> None:
+        nonlocal total
+        base = posixpath.basename(name)
+        if name.startswith(_IGNORED_PREFIXES) or base.startswith(_IGNORED_PREFIXES):
+            return
+        if len(files) >= max_files:
+            raise ValueError(f"Archive holds more than {max_files} files")
+        # Checked before reading, so an archive bomb is never inflated
+        total += size
+        if total > max_bytes:
+            raise ValueError(f"Archive contents exceed {max_bytes // 1024 ** 2} MB")
+        if reserve is not None:
+            reserve(size)
+        copy = tempfile.SpooledTemporaryFile(max_size=spool_memory_bytes)
+        files.append((name, copy))
+        with open_member() as member:
+            shutil.copyfileobj(member, copy)
+        copy.seek(0)
+
+    try:
+        if zipfile.is_zipfile(archive_file):
+            with zipfile.ZipFile(archive_file) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        add(info.filename, info.file_size, lambda: archive.open(info))
+        else:
+            archive_file.seek(0)
+            with tarfile.open(fileobj=archive_file) as archive:
+                for member in archive:
+                    if member.isfile():
+                        add(member.name, member.size, lambda: archive.extractfile(member))
+    except (zipfile.BadZipFile, tarfile.TarError, OSError, EOFError) as e:
+        _close_all(files)
+        raise ValueError(f"Could not read archive: {e}")
+    except BaseException:
+        _close_all(files)
+        raise
+    return files
+
+
+def _close_all(files: List[Tuple[str, BinaryIO]]) -> None:
+    for _, file in files:
+        file.close()
@@ -0,0 +1,231 @@
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import fields, replace
+from typing import Any, Dict, Iterator, List, Optional
+import torch
+from loguru import logger
+from whisper.decoding import DecodingOptions, DecodingResult
+from src.server.transcriber import ModelDecoder, add_time, decode_windows
+
+
+class _PendingWindow:
+    """A mel window waiting to be decoded as part of a batch"""
+
+    def __init__(
+        self,
+        mel: torch.Tensor,
+        options: DecodingOptions,
+        timings: Optional[Dict[str, float]],
+        max_prompt: int
+    ):
+        self.mel = mel
+        self.options = _trim_prompt(options, max_prompt)
+        self.timings = timings
+        self.key = _options_key(self.options)
+        self.future: Future = Future()
+
+
+class DecodeBatcher(ModelDecoder):
+    """Decoder that batches 30-second mel windows across concurrent requests
+
+    Inference worker threads hand windows to `decode` and block until the
+    result is ready. A single batching thread collects pending windows until
+    `max_batch_size` is reached, every active request has submitted a window,
+    or `max_wait_ms` has passed. It then runs the encoder on all of them at
+    once, and the decoder once per group of windows whose options differ at
+    most in their prompt and language.
+
+    With `condition_on_previous_text`, each window is prompted with its
+    request's previous text. So that windows of different requests can share
+    the decoder, prompts are trimmed to their most recent 2^k tokens (up to
+    whisper's limit of half the text context); every window of a group then
+    starts from as many tokens, each row with its own prompt.
+    """
+
+    def __init__(self, model, max_batch_size: int = 16, max_wait_ms: float = 10):
+        """Initialize the batcher
+
+        Args:
+            model: Whisper model
+            max_batch_size: Maximum number of windows decoded together
+            max_wait_ms: Maximum time to wait for a batch to fill up
+        """
+        super().__init__(model)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._cond = threading.Condition()
+        self._pending: List[_PendingWindow] = []
+        self._active = 0
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        self._max_prompt = model.dims.n_text_ctx // 2 - 1
+        self._batches = 0
+        self._windows = 0
+        self._largest_batch = 0
+        self._encoder_batches = 0
+
+    def start(self) -> None:
+        """Start the batching thread"""
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._batch_loop, name="decode-batcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Decode batcher started (max batch {self.max_batch_size}, "
+                    f"max wait {self.max_wait * 1000:.0f} ms)")
+
+    def shutdown(self) -> None:
+        """Stop the batching thread once pending windows are decoded"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def decode(
+        self,
+        mel: torch.Tensor,
+        options: DecodingOptions,
+        timings: Optional[Dict[str, float]] = None
+    ) -> DecodingResult:
+        """Queue a window for batched decoding and wait for its result
+
+        Each window is charged an equal share of its batch's encoder and decoder time.
+        """
+        window = _PendingWindow(mel, options, timings, self._max_prompt)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Decode batcher is stopped")
+            self._pending.append(window)
+            self._cond.notify_all()
+        return window.future.result()
+
+    @contextmanager
+    def session(self) -> Iterator[None]:
+        """Track a request that is going to submit windows
+
+        The batching thread stops waiting for more windows as soon as every
+        active request has one pending, so a lone request pays no extra latency.
+        """
+        with self._cond:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._cond.notify_all()
+
+    def unbatched(self) -> ModelDecoder:
+        """Get a decoder running this model on the calling thread, outside of batches
+
+        It shares the model lock, so its calls take turns with the batches.
+        """
+        decoder = ModelDecoder(self.model)
+        decoder._lock = self._lock
+        return decoder
+
+    def stats(self) -> Dict[str, Any]:
+        """Get batching counters for monitoring"""
+        with self._cond:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "windows": self._windows,
+                "avg_batch_size": self._windows / self._batches if self._batches else 0.0,
+                "largest_batch": self._largest_batch,
+                "encoder_batches": self._encoder_batches,
+                "pending": len(self._pending),
+            }
+
+    def _batch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < min(self.max_batch_size, max(self._active, 1)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._stopped:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+
+            self._decode_batch(batch)
+
+    def _decode_batch(self, batch: List[_PendingWindow]) -> None:
+        # Windows are decoded together when their options match except for prompts and languages
+        groups: Dict[tuple, List[int]] = {}
+        for index, window in enumerate(batch):
+            groups.setdefault(window.key, []).append(index)
+
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                with torch.no_grad():
+                    audio_features = self.model.embed_audio(torch.stack([window.mel for window in batch]))
+            except Exception as e:
+                for window in batch:
+                    window.future.set_exception(e)
+                return
+            encoder_seconds = time.perf_counter() - started
+            for window in batch:
+                add_time(window.timings, "encoder", encoder_seconds / len(batch))
+
+            for indices in groups.values():
+                group = [batch[index] for index in indices]
+                started = time.perf_counter()
+                try:
+                    results = decode_windows(
+                        self.model, audio_features[indices], [window.options for window in group]
+                    )
+                except Exception as e:
+                    for window in group:
+                        window.future.set_exception(e)
+                    continue
+                decoder_seconds = time.perf_counter() - started
+                for window, result in zip(group, results):
+                    add_time(window.timings, "decoder", decoder_seconds / len(group))
+                    window.future.set_result(result)
+                with self._cond:
+                    self._batches += 1
+                    self._windows += len(group)
+                    self._largest_batch = max(self._largest_batch, len(group))
+        with self._cond:
+            self._encoder_batches += 1
+
+
+def _trim_prompt(options: DecodingOptions, max_prompt: int) -> DecodingOptions:
+    """Keep the most recent 2^k prompt tokens, or `max_prompt` tokens when there are more"""
+    prompt = options.prompt or []
+    if len(prompt) >= max_prompt:
+        length = max_prompt
+    else:
+        length = 1 << (len(prompt).bit_length() - 1) if prompt else 0
+    return replace(options, prompt=list(prompt[len(prompt) - length:]) if length else None)
+
+
+def _options_key(options: DecodingOptions) -> tuple:
+    """Hashable key of the decoding options a batch must share
+
+    Prompts and languages can differ within a batch, but not the prompt
+    length, nor whether the language is still to be detected.
+    """
+    values = []
+    for f in fields(options):
+        value = getattr(options, f.name)
+        if f.name == "prompt":
+            value = len(value or [])
+        elif f.name == "language":
+            value = value is None
+        values.append(tuple(value) if isinstance(value, list) else value)
+    return tuple(values)
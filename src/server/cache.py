@@ -0,0 +1,163 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, is_dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+import numpy as np
+from loguru import logger
+
+
+class TranscriptionCache:
+    """Content-addressed cache of transcription results
+
+    Results are keyed by a hash of the decoded audio samples together with
+    the model name and decoding options, so the same audio uploaded in a
+    different container format still hits. Entries live in a size-bounded
+    in-memory LRU tier and, optionally, in a sqlite database on disk whose
+    entries expire after `ttl_seconds`.
+    """
+
+    # Expired disk entries are purged once every this many writes
+    PURGE_INTERVAL = 100
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        disk_path: Optional[Union[str, Path]] = None,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600
+    ):
+        """Initialize the cache
+
+        Args:
+            max_memory_bytes: Size budget of the in-memory tier (serialized JSON bytes)
+            disk_path: Path of the sqlite database for the disk tier, or None to disable it
+            ttl_seconds: Lifetime of disk entries, or None to keep them forever
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._hits = {"memory": 0, "disk": 0}
+        self._misses = 0
+        self._writes = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(disk_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"Transcription cache disk tier at {disk_path}")
+
+    @staticmethod
+    def make_key(audio: np.ndarray, model_name: str, options: Any = None) -> str:
+        """Build the cache key for decoded audio and the settings used to transcribe it
+
+        Args:
+            audio: Decoded float32 audio
+            model_name: Name of the Whisper model
+            options: Decoding options, as a dataclass or dict
+
+        Returns:
+            str: Hex digest identifying the transcription
+        """
+        if is_dataclass(options):
+            options = asdict(options)
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).data)
+        digest.update(json.dumps(
+            {"model": model_name, "options": options},
+            sort_keys=True,
+            default=str
+        ).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a result, promoting disk hits into memory
+
+        Returns:
+            Optional[Dict[str, Any]]: A fresh copy of the cached result, or None
+        """
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._hits["memory"] += 1
+                return json.loads(value)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    self._store_in_memory(key, row[0])
+                    self._hits["disk"] += 1
+                    return json.loads(row[0])
+
+            self._misses += 1
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result in both tiers"""
+        value = json.dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._store_in_memory(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, time.time())
+                )
+                self._writes += 1
+                if self.ttl_seconds is not None and self._writes % self.PURGE_INTERVAL == 0:
+                    self._db.execute(
+                        "DELETE FROM results WHERE created < ?",
+                        (time.time() - self.ttl_seconds,)
+                    )
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and tier sizes for monitoring"""
+        with self._lock:
+            lookups = sum(self._hits.values()) + self._misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_enabled": self._db is not None,
+                "memory_hits": self._hits["memory"],
+                "disk_hits": self._hits["disk"],
+                "misses": self._misses,
+                "hit_ratio": sum(self._hits.values()) / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        """Close the disk tier"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _store_in_memory(self, key: str, value: str) -> None:
+        size = len(value)
+        if size > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = value
+        self._memory_bytes += size
+        # Evict least recently used entries until the tier fits its budget
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
@@ -0,0 +1,157 @@
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+import torch
+from loguru import logger
+
+
+@dataclass
+class WorkerSlot:
+    """CPU resources of one inference worker"""
+
+    worker: int
+    # Cores the worker is pinned to, or None to leave its affinity alone
+    cores: Optional[List[int]]
+    threads: int
+    interop_threads: int
+
+
+@dataclass
+class CpuLayout:
+    """How the available cores are divided between the API and the inference workers"""
+
+    mode: str
+    available_cores: List[int]
+    # Cores the API process (event loop, uploads, dispatch) is pinned to, or None
+    api_cores: Optional[List[int]]
+    workers: List[WorkerSlot] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the layout for /health"""
+        return asdict(self)
+
+
+def available_cores() -> List[int]:
+    """Get the cores this process may run on, honoring container CPU sets"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cores(value: str) -> List[int]:
+    """Parse a core list such as `0-3,8,10-11`"""
+    cores = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cores.update(range(int(first), int(last or first) + 1))
+    return sorted(cores)
+
+
+def plan_layout(
+    workers: int,
+    affinity: str = "off",
+    reserved_cores: int = 1,
+    threads_per_worker: int = 0,
+    interop_threads: int = 1,
+    cores: Optional[List[int]] = None
+) -> CpuLayout:
+    """Divide the available cores between the inference workers
+
+    With `affinity="off"` nothing is pinned and each worker gets an equal
+    share of the cores as its thread budget. `auto` keeps `reserved_cores`
+    for the API process and splits the rest into contiguous groups, one per
+    worker; when there are fewer cores than workers, workers share them
+    round-robin and nothing is reserved. Otherwise `affinity` lists one core
+    set per worker separated by `;`, e.g. `0-3;4-7`, and the API process
+    gets the cores no worker uses.
+
+    Args:
+        workers: Number of inference workers
+        affinity: `off`, `auto` or explicit core sets
+        reserved_cores: Cores kept for the API process in `auto` mode
+        threads_per_worker: torch intra-op threads of each worker; 0 uses
+            the size of its core set
+        interop_threads: torch inter-op threads of each worker
+        cores: Cores to divide; defaults to `available_cores()`
+
+    Returns:
+        CpuLayout: The planned layout
+
+    Raises:
+        ValueError: If explicit core sets don't match the workers or the available cores
+    """
+    workers = max(1, workers)
+    cores = list(cores) if cores is not None else available_cores()
+    mode = affinity.strip().lower() or "off"
+
+    if mode == "off":
+        threads = threads_per_worker or max(1, len(cores) // workers)
+        return CpuLayout("off", cores, None, [
+            WorkerSlot(i, None, threads, interop_threads) for i in range(workers)
+        ])
+
+    api_cores: Optional[List[int]]
+    if mode == "auto":
+        reserved = max(0, reserved_cores) if len(cores) - reserved_cores >= workers else 0
+        api_cores, worker_cores = cores[:reserved] or None, cores[reserved:]
+        if len(worker_cores) >= workers:
+            size, extra = divmod(len(worker_cores), workers)
+            groups, start = [], 0
+            for i in range(workers):
+                end = start + size + (1 if i < extra else 0)
+                groups.append(worker_cores[start:end])
+                start = end
+        else:
+            groups = [[worker_cores[i % len(worker_cores)]] for i in range(workers)]
+    else:
+        groups = [parse_cores(group) for group in affinity.split(";") if group.strip()]
+        mode = "manual"
+        if len(groups) != workers:
+            raise ValueError(f"CPU affinity lists {len(groups)} core set(s) for {workers} inference worker(s)")
+        unknown = sorted(set(core for group in groups for core in group) - set(cores))
+        if unknown or not all(groups):
+            raise ValueError(f"CPU affinity uses cores {unknown} outside the available cores {cores}")
+        used = set(core for group in groups for core in group)
+        api_cores = [core for core in cores if core not in used] or None
+
+    return CpuLayout(mode, cores, api_cores, [
+        WorkerSlot(i, group, threads_per_worker or len(group), interop_threads)
+        for i, group in enumerate(groups)
+    ])
+
+
+def pin_current_thread(cores: Optional[List[int]]) -> None:
+    """Restrict the calling thread, and the threads it starts later, to `cores`
+
+    On Linux, affinity is per thread and inherited by new threads, so
+    torch's OpenMP pool created by an inference thread stays on its cores.
+    """
+    if not cores or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, cores)
+    except OSError as e:
+        logger.warning(f"Could not pin thread to cores {cores}: {e}")
+
+
+def apply_torch_threads(threads: int, interop_threads: int) -> None:
+    """Set the torch intra-op and inter-op thread counts of this process
+
+    The inter-op pool can only be sized before it is first used, so a
+    failure there is logged and ignored.
+    """
+    torch.set_num_threads(max(1, threads))
+    if interop_threads > 0 and torch.get_num_interop_threads() != interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            logger.warning(f"Could not set torch inter-op threads to {interop_threads}: {e}")
+
+
+def apply_slot(slot: WorkerSlot) -> None:
+    """Pin the calling thread and size torch's thread pools for one worker"""
+    pin_current_thread(slot.cores)
+    apply_torch_threads(slot.threads, slot.interop_threads)
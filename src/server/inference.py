@@ -0,0 +1,325 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+
+# Cost multipliers of the priority classes: an interactive job is scheduled
+# like one a quarter of its length, a batch job like one four times as long
+PRIORITY_WEIGHTS = {"interactive": 0.25, "normal": 1.0, "batch": 4.0}
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue cannot accept more work"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    """Raised by inference work that stopped because its result is no longer needed"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Inference cancelled ({reason})")
+        self.reason = reason
+
+
+class CancelToken:
+    """Cooperative cancellation of the inference work of one request
+
+    The event loop cancels the token when the client disconnects; a token
+    with a deadline also cancels itself once the deadline has passed. The
+    inference code checks it between 30-second decoding windows and stops
+    with `JobCancelled`, so at most one window is wasted.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        """Initialize the token
+
+        Args:
+            deadline: `time.monotonic()` time after which the result is no longer needed
+        """
+        self.deadline = deadline
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str) -> None:
+        """Cancel the work, keeping the first reason given"""
+        if self.reason is None:
+            self.reason = reason
+
+    def cancelled(self) -> bool:
+        """Check whether the work was cancelled or its deadline has passed"""
+        if self.reason is None and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.reason = "deadline"
+        return self.reason is not None
+
+    def remaining(self) -> Optional[float]:
+        """Get the seconds left until the deadline, or None without one"""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def raise_if_cancelled(self) -> None:
+        """Raise `JobCancelled` if the work should stop"""
+        if self.cancelled():
+            raise JobCancelled(self.reason)
+
+
+class _WorkItem:
+    """A queued unit of inference work"""
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: dict, cost: float, priority: str, seq: int):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cost = cost
+        self.priority = priority
+        self.seq = seq
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class InferenceExecutor:
+    """Bounded executor that runs blocking inference off the event loop
+
+    Work is queued in a bounded queue and executed by a fixed number of
+    worker threads. When the queue is full, submissions are rejected right
+    away so the API can answer with 429 instead of piling up requests.
+
+    Queued work is scheduled shortest job first: each submission carries an
+    expected cost (e.g. its audio duration in seconds), scaled by the weight
+    of its priority class, and the job with the lowest score starts next.
+    A job's score drops by `aging_rate` for every second it waits, so long
+    jobs are not starved by a steady stream of short ones. Jobs without a
+    cost keep their submission order.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        max_queue_size: int = 16,
+        on_wait: Optional[Callable[[float], None]] = None,
+        initializer: Optional[Callable[[], None]] = None,
+        aging_rate: float = 1.0
+    ):
+        """Initialize the executor
+
+        Args:
+            workers: Number of worker threads running inference
+            max_queue_size: Maximum number of jobs waiting to start
+            on_wait: Optional callback receiving each job's queue wait in seconds
+            initializer: Optional callable run by each worker thread when it starts,
+                e.g. to pin it to a set of cores
+            aging_rate: Cost units a queued job's score drops per second of waiting
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1")
+
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.on_wait = on_wait
+        self.initializer = initializer
+        self.aging_rate = aging_rate
+        self._pending: List[_WorkItem] = []
+        self._seq = 0
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._cancelled = 0
+        self._wait_times = deque(maxlen=256)
+        self._service_times = deque(maxlen=256)
+
+    def start(self) -> None:
+        """Start the worker threads"""
+        if self._threads:
+            return
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"inference-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Inference executor started with {self.workers} worker(s), "
+                    f"queue size {self.max_queue_size}")
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker threads after the queued work has drained
+
+        Args:
+            wait: Whether to block until the worker threads exit
+        """
+        with self._not_empty:
+            self._stopping = True
+            self._not_empty.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        cost: float = 0.0,
+        priority: str = "normal",
+        **kwargs: Any
+    ) -> Future:
+        """Queue a blocking call for execution
+
+        Args:
+            fn: Blocking function to call
+            *args: Positional arguments of `fn`
+            cost: Expected cost of the call, e.g. seconds of audio
+            priority: Priority class, a key of PRIORITY_WEIGHTS
+            **kwargs: Keyword arguments of `fn`
+
+        Returns:
+            Future: Future resolved with the call's result
+
+        Raises:
+            QueueFullError: If the queue is at capacity
+            ValueError: If the priority class is unknown
+        """
+        if priority not in PRIORITY_WEIGHTS:
+            raise ValueError(f"Unknown priority '{priority}', choose one of {list(PRIORITY_WEIGHTS)}")
+        with self._not_empty:
+            self._drop_cancelled()
+            if len(self._pending) >= self.max_queue_size:
+                self._rejected += 1
+                rejected = True
+            else:
+                rejected = False
+                self._seq += 1
+                item = _WorkItem(fn, args, kwargs, cost, priority, self._seq)
+                self._pending.append(item)
+                self._not_empty.notify()
+        if rejected:
+            raise QueueFullError(self.retry_after())
+        return item.future
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        cost: float = 0.0,
+        priority: str = "normal",
+        **kwargs: Any
+    ) -> Any:
+        """Run a blocking call on the executor and await its result
+
+        If the awaiting task is cancelled while the job is still queued,
+        the job is dropped without running.
+        """
+        return await asyncio.wrap_future(self.submit(fn, *args, cost=cost, priority=priority, **kwargs))
+
+    def retry_after(self) -> int:
+        """Estimate the number of seconds until the queue has room again"""
+        with self._lock:
+            if not self._service_times:
+                return 1
+            self._drop_cancelled()
+            avg_service = sum(self._service_times) / len(self._service_times)
+            backlog = len(self._pending) + self._running
+        return max(1, math.ceil(avg_service * backlog / self.workers))
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth, wait times and job counters for monitoring"""
+        with self._lock:
+            self._drop_cancelled()
+            wait_times = list(self._wait_times)
+            service_times = list(self._service_times)
+            return {
+                "workers": self.workers,
+                "queue_depth": len(self._pending),
+                "queued_by_priority": {
+                    name: sum(1 for item in self._pending if item.priority == name) for name in PRIORITY_WEIGHTS
+                },
+                "max_queue_size": self.max_queue_size,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+                "avg_wait_seconds": _mean(wait_times),
+                "max_wait_seconds": max(wait_times, default=0.0),
+                "avg_service_seconds": _mean(service_times),
+            }
+
+    def _worker_loop(self) -> None:
+        """Pull work items off the queue and execute them"""
+        if self.initializer is not None:
+            self.initializer()
+        while True:
+            item = self._next_item()
+            if item is None:
+                break
+            # Skip jobs whose caller went away while they were queued
+            if not item.future.set_running_or_notify_cancel():
+                with self._lock:
+                    self._cancelled += 1
+                continue
+
+            started = time.monotonic()
+            with self._lock:
+                self._running += 1
+                self._wait_times.append(started - item.enqueued_at)
+            if self.on_wait is not None:
+                self.on_wait(started - item.enqueued_at)
+            outcome = "completed"
+            try:
+                item.future.set_result(item.fn(*item.args, **item.kwargs))
+            except JobCancelled as e:
+                outcome = "cancelled"
+                item.future.set_exception(e)
+            except BaseException as e:
+                outcome = "failed"
+                item.future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._service_times.append(time.monotonic() - started)
+                    if outcome == "failed":
+                        self._failed += 1
+                    elif outcome == "cancelled":
+                        self._cancelled += 1
+                    else:
+                        self._completed += 1
+
+    def _next_item(self) -> Optional[_WorkItem]:
+        """Wait for queued work and take the job with the lowest score, or None on shutdown"""
+        with self._not_empty:
+            while not self._pending:
+                if self._stopping:
+                    return None
+                self._not_empty.wait()
+            now = time.monotonic()
+            item = min(self._pending, key=lambda queued: (self._score(queued, now), queued.seq))
+            self._pending.remove(item)
+            return item
+
+    def _drop_cancelled(self) -> None:
+        """Remove queued jobs whose caller went away; the lock must be held"""
+        cancelled = [item for item in self._pending if item.future.cancelled()]
+        for item in cancelled:
+            self._pending.remove(item)
+        self._cancelled += len(cancelled)
+
+    def _score(self, item: _WorkItem, now: float) -> float:
+        return item.cost * PRIORITY_WEIGHTS[item.priority] - self.aging_rate * (now - item.enqueued_at)
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
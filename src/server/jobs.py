@@ -0,0 +1,339 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+import numpy as np
+from loguru import logger
+from whisper.audio import SAMPLE_RATE
+from src.server.inference import QueueFullError
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+FINISHED = (COMPLETED, FAILED)
+
+
+class JobStore:
+    """Persistent queue of transcription jobs
+
+    Job metadata and results live in a sqlite database; the decoded audio
+    of pending jobs is kept next to it as `.npy` files and deleted once the
+    job finishes. Queued jobs, and jobs interrupted by a restart, are picked
+    up again when the server comes back.
+    """
+
+    def __init__(self, directory: Union[str, Path]):
+        """Initialize the store
+
+        Args:
+            directory: Directory holding the database and the pending audio
+        """
+        self.directory = Path(directory)
+        self.audio_dir = self.directory / "audio"
+        self.audio_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.directory / "jobs.db"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, model TEXT NOT NULL, params TEXT NOT NULL, "
+            "duration REAL NOT NULL, progress REAL NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+            "created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+        self._db.commit()
+
+    def create(self, audio: np.ndarray, model_name: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Queue a job
+
+        Args:
+            audio: Float32 mono audio at 16 kHz
+            model_name: Whisper model to use
+            params: Request flags the job is run with
+
+        Returns:
+            Dict[str, Any]: The new job
+        """
+        job_id = uuid.uuid4().hex
+        np.save(self._audio_path(job_id), np.asarray(audio, dtype=np.float32))
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, model, params, duration, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, model_name, json.dumps(params or {}), len(audio) / SAMPLE_RATE, time.time())
+            )
+            self._db.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a job, or None if it doesn't exist or has expired"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job as running and return it, or None if the queue is empty"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = ?, started = ? WHERE id = ?", (RUNNING, time.time(), row["id"])
+            )
+            self._db.commit()
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        return self._to_job(row)
+
+    def load_audio(self, job_id: str) -> np.ndarray:
+        """Load the audio of a pending job"""
+        return np.load(self._audio_path(job_id))
+
+    def set_progress(self, job_id: str, progress: float) -> None:
+        """Record how much of a running job's audio has been transcribed, from 0 to 1
+
+        Progress only moves forward, and only while the job runs, so late or
+        out-of-order updates are ignored.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET progress = MAX(progress, ?) WHERE id = ? AND status = ?",
+                (round(progress, 4), job_id, RUNNING)
+            )
+            self._db.commit()
+
+    def complete(self, job_id: str, result: Dict[str, Any]) -> None:
+        """Store a job's result"""
+        self._finish(job_id, COMPLETED, result=json.dumps(result, ensure_ascii=False))
+
+    def fail(self, job_id: str, error: str) -> None:
+        """Mark a job as failed"""
+        self._finish(job_id, FAILED, error=error)
+
+    def requeue_interrupted(self) -> int:
+        """Put jobs that were running when the server stopped back in the queue
+
+        Returns:
+            int: Number of requeued jobs
+        """
+        with self._lock:
+            count = self._db.execute(
+                "UPDATE jobs SET status = ?, started = NULL, progress = 0 WHERE status = ?", (QUEUED, RUNNING)
+            ).rowcount
+            self._db.commit()
+        return count
+
+    def purge(self, retention_seconds: Optional[float], max_finished: Optional[int]) -> int:
+        """Delete finished jobs that are too old, or beyond the newest `max_finished`
+
+        Returns:
+            int: Number of deleted jobs
+        """
+        placeholders = ", ".join("?" for _ in FINISHED)
+        deleted = 0
+        with self._lock:
+            if retention_seconds is not None:
+                deleted += self._db.execute(
+                    f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished < ?",
+                    (*FINISHED, time.time() - retention_seconds)
+                ).rowcount
+            if max_finished is not None:
+                deleted += self._db.execute(
+                    f"DELETE FROM jobs WHERE status IN ({placeholders}) AND id NOT IN ("
+                    f"SELECT id FROM jobs WHERE status IN ({placeholders}) ORDER BY finished DESC LIMIT ?)",
+                    (*FINISHED, *FINISHED, max_finished)
+                ).rowcount
+            self._db.commit()
+        return deleted
+
+    def count(self, status: str) -> int:
+        """Count jobs in a status"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        """Get the number of jobs in each status for monitoring"""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (QUEUED, RUNNING, COMPLETED, FAILED)}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def close(self) -> None:
+        """Close the database"""
+        with self._lock:
+            self._db.close()
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, "
+                "progress = CASE WHEN ? THEN 1 ELSE progress END WHERE id = ?",
+                (status, result, error, time.time(), status == COMPLETED, job_id)
+            )
+            self._db.commit()
+        self._audio_path(job_id).unlink(missing_ok=True)
+
+    def _audio_path(self, job_id: str) -> Path:
+        return self.audio_dir / f"{job_id}.npy"
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+
+class JobRunner:
+    """Drains the job store on the event loop
+
+    `concurrency` jobs run at a time. Each one is handed to `run`, which
+    typically submits it to the inference executor; when that queue is
+    full the job waits and tries again instead of failing. Finished jobs
+    are purged after each job and every `purge_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        run: Callable[[Dict[str, Any], np.ndarray, Callable[[float], None]], Awaitable[Dict[str, Any]]],
+        concurrency: int = 1,
+        retention_seconds: Optional[float] = 24 * 3600,
+        max_finished: Optional[int] = 1000,
+        poll_interval: float = 1.0,
+        purge_interval: float = 300.0
+    ):
+        """Initialize the runner
+
+        Args:
+            store: Job store to drain
+            run: Coroutine function taking a job, its audio and a progress callback,
+                returning the job's result
+            concurrency: Number of jobs run at the same time
+            retention_seconds: How long finished jobs are kept, or None to keep them
+            max_finished: Maximum number of finished jobs kept, or None for no limit
+            poll_interval: How often idle workers check the store
+            purge_interval: How often expired jobs are purged, even when no job finishes
+        """
+        self.store = store
+        self.run = run
+        self.concurrency = max(1, concurrency)
+        self.retention_seconds = retention_seconds
+        self.max_finished = max_finished
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._waiters: Dict[str, List[asyncio.Event]] = {}
+
+    def start(self) -> None:
+        """Requeue interrupted jobs and start the worker tasks; call from the event loop"""
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted transcription job(s)")
+        self.store.purge(self.retention_seconds, self.max_finished)
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._purge_periodically()))
+
+    async def stop(self) -> None:
+        """Stop the worker tasks; running jobs are requeued on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wake an idle worker after a job was queued"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to `timeout` seconds for a job to finish
+
+        Returns:
+            Optional[Dict[str, Any]]: The job in its latest state, or None if it doesn't exist
+        """
+        # Registered before the status is read, so a job finishing in between still wakes us
+        event = asyncio.Event()
+        self._waiters.setdefault(job_id, []).append(event)
+        try:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None or job["status"] in FINISHED or timeout <= 0:
+                return job
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return await asyncio.to_thread(self.store.get, job_id)
+        finally:
+            waiters = self._waiters.get(job_id)
+            if waiters is not None and event in waiters:
+                waiters.remove(event)
+                if not waiters:
+                    del self._waiters[job_id]
+
+    async def _work(self) -> None:
+        while True:
+            self._wake.clear()
+            job = await asyncio.to_thread(self.store.claim_next)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_job(job)
+
+    async def _purge_periodically(self) -> None:
+        # Finished jobs also expire while no new job finishes
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await asyncio.to_thread(self.store.purge, self.retention_seconds, self.max_finished)
+            except Exception as e:
+                logger.error(f"Purging finished jobs failed: {str(e)}")
+
+    def _progress_callback(self, job_id: str) -> Callable[[float], None]:
+        """Get a progress callback that never writes to the database on the event loop"""
+        loop = asyncio.get_running_loop()
+
+        def on_progress(progress: float) -> None:
+            try:
+                called_from_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                called_from_loop = False
+            if called_from_loop:
+                loop.run_in_executor(None, self.store.set_progress, job_id, progress)
+            else:
+                self.store.set_progress(job_id, progress)
+
+        return on_progress
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        logger.info(f"Running transcription job {job_id}")
+        try:
+            audio = await asyncio.to_thread(self.store.load_audio, job_id)
+            while True:
+                try:
+                    result = await self.run(job, audio, self._progress_callback(job_id))
+                    break
+                except QueueFullError as e:
+                    await asyncio.sleep(e.retry_after)
+            await asyncio.to_thread(self.store.complete, job_id, result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Transcription job {job_id} failed: {str(e)}")
+            await asyncio.to_thread(self.store.fail, job_id, str(e))
+
+        for event in self._waiters.pop(job_id, []):
+            event.set()
+        await asyncio.to_thread(self.store.purge, self.retention_seconds, self.max_finished)
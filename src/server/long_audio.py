@@ -0,0 +1,153 @@
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import Any, Awaitable, Callable, Dict, List
+import numpy as np
+from whisper.audio import HOP_LENGTH, SAMPLE_RATE
+from src.server.transcriber import TranscriptionOptions
+from src.utils.audio_utils import AudioUtils
+
+
+@dataclass
+class AudioChunk:
+    """A slice of long audio transcribed on its own
+
+    `start`/`end` delimit the samples handed to the model, including the
+    overlap with neighbouring chunks; `keep_start`/`keep_end` delimit the
+    part of the timeline whose segments this chunk contributes.
+    """
+
+    index: int
+    start: int
+    end: int
+    keep_start: int
+    keep_end: int
+
+
+def plan_chunks(
+    audio: np.ndarray,
+    chunk_seconds: float,
+    overlap_seconds: float = 1.0,
+    search_seconds: float = 10.0
+) -> List[AudioChunk]:
+    """Split audio into chunks at pauses
+
+    Args:
+        audio: Float32 mono audio at 16 kHz
+        chunk_seconds: Target chunk length
+        overlap_seconds: Audio shared with each neighbouring chunk
+        search_seconds: How far from the target length a split may move to find a pause
+
+    Returns:
+        List[AudioChunk]: Chunks covering the whole audio, in order
+    """
+    splits = AudioUtils.find_split_points(audio, chunk_seconds, search_seconds)
+    bounds = [0] + splits + [len(audio)]
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    return [
+        AudioChunk(
+            index=i,
+            start=max(0, keep_start - overlap),
+            end=min(len(audio), keep_end + overlap),
+            keep_start=keep_start,
+            keep_end=keep_end
+        )
+        for i, (keep_start, keep_end) in enumerate(zip(bounds[:-1], bounds[1:]))
+    ]
+
+
+def stitch_results(chunks: List[AudioChunk], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-chunk results into one result on the global timeline
+
+    Segment times are shifted by their chunk's offset. Each chunk keeps the
+    segments starting in its kept range, so of a segment decoded twice
+    because it crosses a split, only the copy of the chunk before the split
+    survives. Segments of the next chunk are trimmed to start where that
+    copy ends, and dropped if it covers them entirely.
+
+    Args:
+        chunks: Chunks that were transcribed
+        results: Transcription result of each chunk, in the same order
+
+    Returns:
+        Dict[str, Any]: Result with `text`, `segments`, `language`, and
+            the stage `timings` and `decoding` counts summed over all chunks
+    """
+    segments = []
+    languages: Counter = Counter()
+    timings: Counter = Counter()
+    decoding: Counter = Counter()
+    for chunk, result in zip(chunks, results):
+        timings.update(result.get("timings", {}))
+        decoding.update(result.get("decoding", {}))
+        offset = chunk.start / SAMPLE_RATE
+        keep_start = chunk.keep_start / SAMPLE_RATE
+        keep_end = chunk.keep_end / SAMPLE_RATE
+        chunk_end = chunk.end / SAMPLE_RATE
+        is_last = chunk.index == len(chunks) - 1
+        # End of the previous chunk's segments, which may cross the split into this chunk
+        covered = segments[-1]["end"] if segments else float("-inf")
+        languages[result["language"]] += chunk.keep_end - chunk.keep_start
+
+        for segment in result["segments"]:
+            start = segment["start"] + offset
+            end = min(segment["end"] + offset, chunk_end)
+            if start < keep_start or (start >= keep_end and not is_last) or end <= covered:
+                continue
+            start = max(start, covered)
+            segments.append({
+                **segment,
+                "seek": segment["seek"] + chunk.start // HOP_LENGTH,
+                "start": start,
+                "end": end,
+                "chunk": chunk.index,
+            })
+
+    for segment_id, segment in enumerate(segments):
+        segment["id"] = segment_id
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        # Chunks detect their language independently; report the one covering most audio
+        "language": languages.most_common(1)[0][0] if languages else None,
+        "timings": dict(timings),
+        "decoding": dict(decoding),
+    }
+
+
+async def transcribe_in_chunks(
+    audio: np.ndarray,
+    options: TranscriptionOptions,
+    run: Callable[[np.ndarray, TranscriptionOptions], Awaitable[Dict[str, Any]]],
+    chunk_seconds: float,
+    overlap_seconds: float = 1.0,
+    concurrency: int = 1
+) -> Dict[str, Any]:
+    """Transcribe long audio as concurrently decoded chunks
+
+    Args:
+        audio: Float32 mono audio at 16 kHz
+        options: Transcription options; each chunk gets its own copy
+        run: Coroutine function transcribing one chunk, e.g. on the inference executor
+        chunk_seconds: Target chunk length
+        overlap_seconds: Audio shared with each neighbouring chunk
+        concurrency: Maximum number of chunks in flight at once
+
+    Returns:
+        Dict[str, Any]: Stitched result with global timestamps
+    """
+    chunks = plan_chunks(audio, chunk_seconds, overlap_seconds)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_chunk(chunk: AudioChunk) -> Dict[str, Any]:
+        async with semaphore:
+            return await run(audio[chunk.start:chunk.end], replace(options))
+
+    tasks = [asyncio.ensure_future(run_chunk(chunk)) for chunk in chunks]
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        # If one chunk failed, don't leave the others queued
+        for task in tasks:
+            task.cancel()
+    return stitch_results(chunks, results)
@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import whisper
+from loguru import logger
+from src.server.batching import DecodeBatcher
+from src.server.quantization import model_size_bytes, quantize_model
+from src.server.transcriber import ModelDecoder
+
+
+class ModelHandle:
+    """A resident model with its decoder and usage counters"""
+
+    def __init__(self, name: str, model, decoder: ModelDecoder, load_seconds: float, quantization: str = "none"):
+        self.name = name
+        self.model = model
+        self.decoder = decoder
+        self.load_seconds = load_seconds
+        self.quantization = quantization
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.size_bytes = model_size_bytes(model)
+        self.requests = 0
+        self.in_use = 0
+
+
+class ModelRegistry:
+    """Loads Whisper models on first use and keeps the most recently used ones resident
+
+    At most `max_models` models, and at most `max_memory_gb` of weights, stay
+    loaded. When a limit is exceeded the least recently used model that no
+    request is currently using is evicted.
+    """
+
+    def __init__(
+        self,
+        default_model: str,
+        allowed_models: Optional[List[str]] = None,
+        max_models: int = 2,
+        max_memory_gb: Optional[float] = None,
+        batch_size: int = 1,
+        batch_max_wait_ms: float = 10,
+        quantize: Optional[Dict[str, str]] = None,
+        loader: Callable[[str], Any] = whisper.load_model
+    ):
+        """Initialize the registry
+
+        Args:
+            default_model: Model used when a request doesn't name one
+            allowed_models: Models requests may select; defaults to only the default model
+            max_models: Maximum number of resident models
+            max_memory_gb: Maximum total size of resident model weights
+            batch_size: Decode batch size per model; values above 1 enable batching
+            batch_max_wait_ms: Maximum time to wait for a batch to fill up
+            quantize: Quantization mode per model name, with `*` for all other
+                models, as returned by `parse_quantization`
+            loader: Function loading a model by name
+        """
+        self.default_model = default_model
+        self.allowed_models = list(allowed_models or [default_model])
+        if default_model not in self.allowed_models:
+            self.allowed_models.append(default_model)
+        self.max_models = max(1, max_models)
+        self.max_memory_bytes = max_memory_gb * 1024 ** 3 if max_memory_gb else None
+        self.batch_size = batch_size
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self.quantize = dict(quantize or {})
+        self.loader = loader
+
+        self._models: "OrderedDict[str, ModelHandle]" = OrderedDict()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, Any]] = {}
+
+    def resolve(self, name: Optional[str]) -> str:
+        """Get the model name a request will use
+
+        Raises:
+            ValueError: If the model is not allowed
+        """
+        name = name or self.default_model
+        if name not in self.allowed_models:
+            raise ValueError(f"Model '{name}' is not available, choose one of {self.allowed_models}")
+        return name
+
+    def quantization(self, name: str) -> str:
+        """Get the quantization mode a model is loaded with"""
+        return self.quantize.get(name, self.quantize.get("*", "none"))
+
+    def variant(self, name: str) -> str:
+        """Get a name identifying a model together with its quantization, e.g. for cache keys"""
+        mode = self.quantization(name)
+        return name if mode == "none" else f"{name}.{mode}"
+
+    @contextmanager
+    def acquire(self, name: Optional[str] = None, record: bool = True) -> Iterator[ModelHandle]:
+        """Get a model for the duration of a request, loading it if needed
+
+        The model cannot be evicted while it is acquired. Loading blocks, so
+        this should be called from an inference worker, not the event loop.
+        Pass `record=False` for internal use that shouldn't count as a request.
+        """
+        handle = self._checkout(self.resolve(name), record=record)
+        try:
+            yield handle
+        finally:
+            self._checkin(handle)
+
+    def preload(self, name: Optional[str] = None) -> None:
+        """Load a model without counting it as a request"""
+        self._checkin(self._checkout(self.resolve(name), record=False))
+
+    def loaded_models(self) -> List[str]:
+        """Get the names of resident models, least recently used first"""
+        with self._lock:
+            return list(self._models)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get resident models and per-model counters for monitoring"""
+        with self._lock:
+            resident = {
+                name: {
+                    "size_mb": round(handle.size_bytes / 1024 ** 2, 1),
+                    "load_seconds": round(handle.load_seconds, 3),
+                    "quantization": handle.quantization,
+                    "loaded_at": handle.loaded_at,
+                    "last_used": handle.last_used,
+                    "in_use": handle.in_use,
+                    "requests": handle.requests,
+                    "batching": handle.decoder.stats() if isinstance(handle.decoder, DecodeBatcher) else None,
+                }
+                for name, handle in self._models.items()
+            }
+            return {
+                "default": self.default_model,
+                "allowed": self.allowed_models,
+                "max_models": self.max_models,
+                "max_memory_gb": self.max_memory_bytes / 1024 ** 3 if self.max_memory_bytes else None,
+                "resident_mb": round(sum(h.size_bytes for h in self._models.values()) / 1024 ** 2, 1),
+                "resident": resident,
+                "counters": {name: dict(counters) for name, counters in self._counters.items()},
+            }
+
+    def shutdown(self) -> None:
+        """Unload all models"""
+        with self._lock:
+            handles = list(self._models.values())
+            self._models.clear()
+        self._release(handles)
+
+    def _checkout(self, name: str, record: bool = True) -> ModelHandle:
+        with self._lock:
+            handle = self._models.get(name)
+            if handle is not None:
+                return self._use(handle, record)
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Only one thread loads a given model; the others wait for it
+        with load_lock:
+            with self._lock:
+                handle = self._models.get(name)
+                if handle is not None:
+                    return self._use(handle, record)
+
+            handle = self._load(name)
+            with self._lock:
+                self._models[name] = handle
+                self._use(handle, record)
+                evicted = self._evict()
+        self._release(evicted)
+        return handle
+
+    def _checkin(self, handle: ModelHandle) -> None:
+        with self._lock:
+            handle.in_use -= 1
+            evicted = self._evict()
+        self._release(evicted)
+
+    def _use(self, handle: ModelHandle, record: bool) -> ModelHandle:
+        self._models.move_to_end(handle.name)
+        handle.in_use += 1
+        handle.last_used = time.time()
+        if record:
+            handle.requests += 1
+            self._counters[handle.name]["requests"] += 1
+        return handle
+
+    def _load(self, name: str) -> ModelHandle:
+        logger.info(f"Loading Whisper model: {name}")
+        started = time.monotonic()
+        model = self.loader(name)
+        model.eval()
+        quantization = self.quantization(name)
+        quantize_model(model, quantization)
+        load_seconds = time.monotonic() - started
+
+        if self.batch_size > 1:
+            decoder = DecodeBatcher(model, max_batch_size=self.batch_size, max_wait_ms=self.batch_max_wait_ms)
+            decoder.start()
+        else:
+            decoder = ModelDecoder(model)
+
+        handle = ModelHandle(name, model, decoder, load_seconds, quantization)
+        with self._lock:
+            counters = self._counters.setdefault(
+                name, {"requests": 0, "loads": 0, "evictions": 0, "total_load_seconds": 0.0}
+            )
+            counters["loads"] += 1
+            counters["total_load_seconds"] += load_seconds
+        logger.info(f"Loaded Whisper model {name} in {load_seconds:.1f}s "
+                    f"({handle.size_bytes / 1024 ** 2:.0f} MB, quantization: {quantization})")
+        return handle
+
+    def _evict(self) -> List[ModelHandle]:
+        """Drop least recently used idle models until the limits are met; call with the lock held"""
+        evicted = []
+        while self._over_limit():
+            idle = next((h for h in self._models.values() if h.in_use == 0), None)
+            if idle is None:
+                break
+            del self._models[idle.name]
+            self._counters[idle.name]["evictions"] += 1
+            evicted.append(idle)
+        return evicted
+
+    def _over_limit(self) -> bool:
+        if len(self._models) > self.max_models:
+            return True
+        if self.max_memory_bytes is not None and len(self._models) > 1:
+            return sum(h.size_bytes for h in self._models.values()) > self.max_memory_bytes
+        return False
+
+    def _release(self, handles: List[ModelHandle]) -> None:
+        for handle in handles:
+            logger.info(f"Unloading Whisper model: {handle.name}")
+            if isinstance(handle.decoder, DecodeBatcher):
+                handle.decoder.shutdown()
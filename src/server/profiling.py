@@ -0,0 +1,123 @@
+import cProfile
+import os
+import pstats
+import time
+from typing import Any, Callable, Dict, List, Tuple
+import numpy as np
+import torch
+from src.server.transcriber import ModelDecoder, TranscriptionOptions, transcribe
+
+# Profilers a request can ask for
+PROFILERS = ("cprofile", "torch")
+
+
+def profile_call(fn: Callable, *args, profiler: str = "cprofile", top: int = 30, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """Run a function under a profiler and summarize where its time went
+
+    cProfile only sees the calling thread, so the function should do its
+    work there (see `ModelDecoder.unbatched`). With `torch`, the torch
+    operators are profiled as well.
+
+    Args:
+        fn: Function to run
+        profiler: `cprofile`, or `torch` for cProfile plus `torch.profiler`
+        top: Number of functions and operators to report
+
+    Returns:
+        Tuple[Any, Dict[str, Any]]: The function's result, and a summary with
+            its wall time in `seconds`, the `functions` with the highest
+            cumulative time and, with `torch`, the `operators` with the
+            highest own CPU time
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler '{profiler}', choose one of {list(PROFILERS)}")
+    python_profiler = cProfile.Profile()
+    torch_profiler = None
+    if profiler == "torch":
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        torch_profiler = torch.profiler.profile(activities=activities)
+        torch_profiler.__enter__()
+
+    started = time.perf_counter()
+    python_profiler.enable()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        python_profiler.disable()
+        seconds = time.perf_counter() - started
+        if torch_profiler is not None:
+            torch_profiler.__exit__(None, None, None)
+
+    summary: Dict[str, Any] = {
+        "profiler": profiler,
+        "seconds": round(seconds, 6),
+        "functions": top_functions(pstats.Stats(python_profiler), top),
+    }
+    if torch_profiler is not None:
+        summary["operators"] = top_operators(torch_profiler, top)
+    return result, summary
+
+
+def profile_transcription(
+    decoder: ModelDecoder,
+    audio: np.ndarray,
+    options: TranscriptionOptions,
+    profiler: str = "cprofile",
+    **kwargs
+) -> Dict[str, Any]:
+    """Transcribe under a profiler, outside of decode batches
+
+    Takes the arguments of `transcriber.transcribe`; the summary of
+    `profile_call` is added to the result under `profile`.
+    """
+    result, summary = profile_call(transcribe, decoder.unbatched(), audio, options, profiler=profiler, **kwargs)
+    result["profile"] = summary
+    return result
+
+
+def top_functions(stats: pstats.Stats, top: int) -> List[Dict[str, Any]]:
+    """Get the functions with the highest cumulative time from cProfile stats"""
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": _function_label(filename, line, name),
+            "calls": calls,
+            "own_seconds": round(own, 6),
+            "cumulative_seconds": round(cumulative, 6),
+        })
+    rows.sort(key=lambda row: -row["cumulative_seconds"])
+    return rows[:top]
+
+
+def top_operators(profiler: "torch.profiler.profile", top: int) -> List[Dict[str, Any]]:
+    """Get the torch operators with the highest own CPU time"""
+    rows = []
+    for event in profiler.key_averages():
+        row = {
+            "operator": event.key,
+            "calls": event.count,
+            "own_cpu_seconds": round(event.self_cpu_time_total / 1e6, 6),
+            "cpu_seconds": round(event.cpu_time_total / 1e6, 6),
+        }
+        if torch.cuda.is_available():
+            row["cuda_seconds"] = round(getattr(event, "device_time_total", 0) / 1e6, 6)
+        rows.append(row)
+    rows.sort(key=lambda row: -row["own_cpu_seconds"])
+    return rows[:top]
+
+
+def _function_label(filename: str, line: int, name: str) -> str:
+    """Label a profiled function like pstats does, with the path shortened to the package"""
+    if filename == "~":
+        # Built-in functions have no file
+        return name
+    path = filename.replace(os.sep, "/")
+    if "/site-packages/" in path:
+        path = path.split("/site-packages/")[-1]
+    elif "/src/" in path:
+        path = "src/" + path.split("/src/")[-1]
+    else:
+        path = "/".join(path.split("/")[-2:])
+    return f"{path}:{line}({name})"
@@ -0,0 +1,82 @@
+from typing import Dict, Optional
+import torch
+from loguru import logger
+from torch import nn
+
+# Supported values of WHISPER_QUANTIZE
+QUANTIZATION_MODES = ("none", "int8")
+
+
+def parse_quantization(value: Optional[str]) -> Dict[str, str]:
+    """Parse a quantization setting into a mode per model
+
+    A bare mode (`int8`) applies to every model; a comma-separated list of
+    `model=mode` pairs (`base=int8,small=int8`) selects models individually.
+    Both forms can be mixed, e.g. `int8,large=none`.
+
+    Args:
+        value: Quantization setting, e.g. from WHISPER_QUANTIZE
+
+    Returns:
+        Dict[str, str]: Mode per model name, with `*` for the default
+
+    Raises:
+        ValueError: If a mode is not supported
+    """
+    modes = {}
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, mode = item.rpartition("=")
+        mode = mode.strip().lower()
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unsupported quantization '{mode}', choose one of {QUANTIZATION_MODES}")
+        modes[name.strip() or "*"] = mode
+    return modes
+
+
+def quantize_model(model: nn.Module, mode: str) -> nn.Module:
+    """Quantize a loaded Whisper model in place
+
+    `int8` applies dynamic quantization to the Linear layers: weights are
+    stored as int8 and activations are quantized on the fly, so the
+    attention and MLP matmuls run as int8 kernels on the CPU. Convolutions,
+    embeddings and layer norms stay in float32. Dynamic quantization only
+    exists for the CPU, so models on a GPU are left unchanged.
+
+    Args:
+        model: Whisper model in eval mode
+        mode: Quantization mode, one of QUANTIZATION_MODES
+
+    Returns:
+        nn.Module: The same model
+    """
+    if mode == "none":
+        return model
+    if mode != "int8":
+        raise ValueError(f"Unsupported quantization '{mode}', choose one of {QUANTIZATION_MODES}")
+    if next(model.parameters()).device.type != "cpu":
+        logger.warning("int8 quantization is only supported on the CPU, keeping the model in float")
+        return model
+
+    # whisper.model.Linear only casts its weights to the input dtype, which is
+    # a no-op in float32; quantize_dynamic matches exact module types, so
+    # turn them into plain nn.Linear first
+    for module in model.modules():
+        if isinstance(module, nn.Linear) and type(module) is not nn.Linear:
+            module.__class__ = nn.Linear
+    torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def model_size_bytes(model: nn.Module) -> int:
+    """Get the size of a model's weights, including packed quantized weights"""
+    def size(value) -> int:
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(size(item) for item in value)
+        return 0
+
+    return sum(size(value) for value in model.state_dict().values())
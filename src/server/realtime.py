@@ -0,0 +1,154 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from whisper.audio import SAMPLE_RATE
+
+
+def _normalize(word: str) -> str:
+    """Compare words without case and surrounding punctuation"""
+    return re.sub(r"^\W+|\W+$", "", word.lower())
+
+
+class RealtimeTranscriber:
+    """Incremental transcription of live audio with local agreement
+
+    Audio is appended to a rolling buffer that is re-transcribed from its
+    start every time enough new audio has arrived. The words after the
+    already committed ones form the hypothesis of each pass; the prefix on
+    which two consecutive hypotheses agree is committed, the rest is
+    reported as a partial result that may still change (LocalAgreement-2).
+    Once the buffer grows past `trim_seconds`, it is cut at the end of the
+    last segment whose words are all committed, so each pass only decodes
+    the recent, undecided audio.
+
+    The class only keeps state; the caller runs the transcriptions, e.g. on
+    the inference executor, and feeds the results to `update`.
+    """
+
+    def __init__(self, trim_seconds: float = 10.0, max_buffer_seconds: float = 25.0):
+        """Initialize the transcriber
+
+        Args:
+            trim_seconds: Buffer length above which committed audio is cut off
+            max_buffer_seconds: Buffer length at which the current hypothesis is
+                committed regardless of agreement, so the buffer stays within one
+                30-second decoding window
+        """
+        self.trim_seconds = trim_seconds
+        self.max_buffer_seconds = max_buffer_seconds
+        self.buffer = np.zeros(0, dtype=np.float32)
+        # Stream time of the first buffered sample, in seconds
+        self.buffer_offset = 0.0
+        self.language: Optional[str] = None
+        self.committed: List[str] = []
+        # Words of the current buffer that have been committed
+        self._buffer_committed = 0
+        self._previous: List[str] = []
+        self._segments: List[Tuple[float, float, int]] = []
+        self._pending_samples = 0
+
+    @property
+    def buffer_seconds(self) -> float:
+        return len(self.buffer) / SAMPLE_RATE
+
+    @property
+    def stream_seconds(self) -> float:
+        """Length of the audio received so far"""
+        return self.buffer_offset + self.buffer_seconds
+
+    @property
+    def pending_seconds(self) -> float:
+        """Audio received since the last transcription pass"""
+        return self._pending_samples / SAMPLE_RATE
+
+    def append(self, audio: np.ndarray) -> None:
+        """Add received samples to the buffer"""
+        self.buffer = np.concatenate([self.buffer, np.asarray(audio, dtype=np.float32)])
+        self._pending_samples += len(audio)
+
+    def snapshot(self) -> np.ndarray:
+        """Get the buffer to transcribe next, and mark its audio as processed"""
+        self._pending_samples = 0
+        return self.buffer.copy()
+
+    def update(self, result: Dict[str, Any], final: bool = False) -> Dict[str, Any]:
+        """Take the transcription of a snapshot and advance the committed text
+
+        Args:
+            result: Transcription result of the last snapshot
+            final: Commit the whole hypothesis, at the end of the stream
+
+        Returns:
+            Dict[str, Any]: `commit` with the newly committed text and its
+                approximate `start`/`end` stream time (None when nothing was
+                committed), and the `partial` text that is not committed yet
+        """
+        if self.language is None and result.get("language") and result["segments"]:
+            # Detecting the language again on every pass would cost time and could flip
+            self.language = result["language"]
+
+        words, segments = [], []
+        for segment in result["segments"]:
+            segment_words = segment["text"].split()
+            words.extend(segment_words)
+            segments.append((segment["start"], segment["end"], len(words)))
+        self._segments = segments
+
+        hypothesis = words[self._buffer_committed:]
+        if final or self.buffer_seconds >= self.max_buffer_seconds:
+            agreed = len(hypothesis)
+        else:
+            agreed = 0
+            for new, old in zip(hypothesis, self._previous):
+                if _normalize(new) != _normalize(old):
+                    break
+                agreed += 1
+
+        commit = None
+        if agreed:
+            first = self._buffer_committed
+            self._buffer_committed += agreed
+            self.committed.extend(hypothesis[:agreed])
+            commit = {
+                "text": " ".join(hypothesis[:agreed]),
+                "start": round(self.buffer_offset + self._segment_of(first)[0], 2),
+                "end": round(self.buffer_offset + self._segment_of(self._buffer_committed - 1)[1], 2),
+            }
+        self._previous = hypothesis[agreed:]
+        partial = " ".join(self._previous)
+
+        if self.buffer_seconds >= self.trim_seconds or self.buffer_seconds >= self.max_buffer_seconds:
+            self._trim()
+        return {"commit": commit, "partial": partial}
+
+    def text(self) -> str:
+        """Get all committed text"""
+        return " ".join(self.committed)
+
+    def _segment_of(self, word_index: int) -> Tuple[float, float]:
+        for start, end, words_until in self._segments:
+            if word_index < words_until:
+                return start, end
+        return (self._segments[-1][0], self._segments[-1][1]) if self._segments else (0.0, 0.0)
+
+    def _trim(self) -> None:
+        """Drop buffered audio up to the end of the last fully committed segment"""
+        cut, cut_words = None, 0
+        for _, end, words_until in self._segments:
+            if words_until > self._buffer_committed:
+                break
+            cut, cut_words = end, words_until
+        if cut is None and self.buffer_seconds >= self.max_buffer_seconds:
+            # Nothing recognizable in a full window (e.g. long silence): keep only the last seconds
+            cut, cut_words = self.buffer_seconds - self.trim_seconds / 2, self._buffer_committed
+        if cut is None or cut <= 0:
+            return
+
+        samples = min(len(self.buffer), int(cut * SAMPLE_RATE))
+        self.buffer = self.buffer[samples:]
+        self.buffer_offset += samples / SAMPLE_RATE
+        self._buffer_committed -= cut_words
+        self._segments = [
+            (start - cut, end - cut, words_until - cut_words)
+            for start, end, words_until in self._segments if words_until > cut_words
+        ]
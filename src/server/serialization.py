@@ -0,0 +1,152 @@
+import gzip
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+# Faster encoders and zstd are used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+# Names clients use for msgpack besides the registered one
+_MSGPACK_ALIASES = ("application/x-msgpack", "application/vnd.msgpack")
+
+# Segment fields returned by default, and with full segments
+SEGMENT_FIELDS = ("start", "end", "text")
+FULL_SEGMENT_FIELDS = (
+    "id", "seek", "start", "end", "text", "tokens", "temperature",
+    "avg_logprob", "compression_ratio", "no_speech_prob", "window", "chunk"
+)
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def media_types() -> List[str]:
+    """Get the response media types that can be produced, preferred first"""
+    return [JSON, MSGPACK] if msgpack is not None else [JSON]
+
+
+def encodings() -> List[str]:
+    """Get the content encodings that can be produced, preferred first"""
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def parse_accept(header: str) -> List[Tuple[str, float]]:
+    """Parse an `Accept` or `Accept-Encoding` header into values and their q-weights
+
+    Values come in order of preference: highest weight first, ties in header order.
+    """
+    entries = []
+    for index, part in enumerate(header.split(",")):
+        value, *params = [item.strip() for item in part.split(";")]
+        if not value:
+            continue
+        weight = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(number)
+                except ValueError:
+                    weight = 0.0
+        entries.append((-weight, index, value.lower()))
+    return [(value, -weight) for weight, _, value in sorted(entries)]
+
+
+def negotiate_media_type(accept: Optional[str]) -> Optional[str]:
+    """Pick the response media type for an `Accept` header
+
+    Each media type takes the weight of the most specific range matching
+    it, so `application/json;q=0, */*` rules out JSON. Among the types with
+    the highest weight, the one whose range comes first in the header wins,
+    and JSON is the default for a missing header and for bare wildcards.
+
+    Returns:
+        Optional[str]: The media type, or None if the client accepts none
+            that can be produced
+    """
+    if not accept:
+        return JSON
+    ranges: Dict[str, Tuple[float, int]] = {}
+    for index, (value, weight) in enumerate(parse_accept(accept)):
+        if value in _MSGPACK_ALIASES:
+            value = MSGPACK
+        ranges.setdefault(value, (weight, index))
+
+    best, best_rank = None, None
+    for media_type in media_types():
+        major = media_type.split("/")[0]
+        for value in (media_type, f"{major}/*", "*/*"):
+            if value in ranges:
+                weight, index = ranges[value]
+                rank = (-weight, index)
+                if weight > 0 and (best_rank is None or rank < best_rank):
+                    best, best_rank = media_type, rank
+                break
+    return best
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the content encoding for an `Accept-Encoding` header, or None to send the body as is"""
+    if not accept_encoding:
+        return None
+    weights = dict(parse_accept(accept_encoding))
+    for encoding in encodings():
+        if weights.get(encoding, weights.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def encode(payload: Any, media_type: str) -> bytes:
+    """Encode a response payload of plain dicts, lists and scalars
+
+    Payloads aren't validated against a schema, which is what makes this
+    cheaper than going through pydantic for results with many segments.
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode()
+    except ValueError:
+        # NaN and infinity aren't JSON; write null for them, as orjson does
+        return json.dumps(
+            _finite(payload), ensure_ascii=False, separators=(",", ":"), allow_nan=False
+        ).encode()
+
+
+def _finite(value: Any) -> Any:
+    """Copy a payload with its non-finite floats replaced by None"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a response body with `gzip` or `zstd`"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def segment_view(segment: Dict[str, Any], full: bool = False) -> Dict[str, Any]:
+    """Get the fields of a segment returned to clients"""
+    return {field: segment[field] for field in (FULL_SEGMENT_FIELDS if full else SEGMENT_FIELDS) if field in segment}
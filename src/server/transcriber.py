@@ -0,0 +1,565 @@
+import math
+import threading
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import torch
+from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram, pad_or_trim
+from whisper.decoding import DecodingOptions, DecodingResult, DecodingTask
+from whisper.model import Whisper
+from whisper.tokenizer import LANGUAGES, TO_LANGUAGE_CODE, get_tokenizer
+
+# Mel frames per output token, and seconds per timestamp token
+INPUT_STRIDE = 2
+TIME_PRECISION = INPUT_STRIDE * HOP_LENGTH / SAMPLE_RATE
+
+TASKS = ("transcribe", "translate")
+
+# Named trade-offs between decoding speed and accuracy, as TranscriptionOptions
+# fields. `balanced` is whisper.transcribe's defaults. `fast` decodes every
+# window once, greedily and without the previous text as prompt, so its
+# latency doesn't depend on how hard the audio is. `accurate` uses beam
+# search, and samples several candidates when it falls back.
+DECODING_PRESETS: Dict[str, Dict[str, Any]] = {
+    "fast": {"temperature": (0.0,), "condition_on_previous_text": False},
+    "balanced": {},
+    "accurate": {"beam_size": 5, "best_of": 5, "patience": 1.0},
+}
+# Options a request may set on top of its preset
+DECODING_OVERRIDES = (
+    "temperature", "beam_size", "best_of", "patience", "condition_on_previous_text",
+    "compression_ratio_threshold", "logprob_threshold", "no_speech_threshold"
+)
+# Most beams or sampled candidates per window; each one costs about a window's decoding
+MAX_DECODING_CANDIDATES = 10
+
+
+@dataclass
+class TranscriptionOptions:
+    """Options for the windowed transcription loop
+
+    Defaults mirror `whisper.transcribe`.
+    """
+
+    language: Optional[str] = None
+    task: str = "transcribe"
+    temperature: Tuple[float, ...] = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+    compression_ratio_threshold: Optional[float] = 2.4
+    logprob_threshold: Optional[float] = -1.0
+    no_speech_threshold: Optional[float] = 0.6
+    condition_on_previous_text: bool = True
+    beam_size: Optional[int] = None
+    best_of: Optional[int] = None
+    patience: Optional[float] = None
+    fp16: bool = False
+
+    def __post_init__(self):
+        # Temperatures may be given as a single value or a list, e.g. from JSON
+        if isinstance(self.temperature, (int, float)):
+            self.temperature = (float(self.temperature),)
+        self.temperature = tuple(self.temperature)
+
+    def decoding_options(self, temperature: float, prompt: List[int]) -> DecodingOptions:
+        """Build the whisper decoding options for one attempt at one window"""
+        return DecodingOptions(
+            task=self.task,
+            language=self.language,
+            temperature=temperature,
+            # beam search only applies to greedy decoding, best_of only to sampling
+            beam_size=self.beam_size if temperature == 0 else None,
+            patience=self.patience if temperature == 0 else None,
+            best_of=self.best_of if temperature > 0 else None,
+            prompt=prompt,
+            fp16=self.fp16
+        )
+
+
+class ModelDecoder:
+    """Runs whisper decoding on a single model
+
+    Whisper installs its kv-cache hooks on the shared decoder modules for
+    the duration of a decode, so concurrent calls on the same model would
+    corrupt each other's caches. All model calls are serialized by a lock.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+
+    def decode(
+        self,
+        mel: torch.Tensor,
+        options: DecodingOptions,
+        timings: Optional[Dict[str, float]] = None
+    ) -> DecodingResult:
+        """Decode one 30-second mel window
+
+        Args:
+            mel: Mel spectrogram of the window
+            options: Decoding options
+            timings: Optional dict accumulating `encoder` and `decoder` seconds
+        """
+        with self._lock:
+            return self._encode_and_decode(mel.unsqueeze(0), options, timings)[0]
+
+    def detect_language(
+        self,
+        mel: torch.Tensor,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, float]:
+        """Get language probabilities for one 30-second mel window"""
+        with self._lock:
+            started = time.perf_counter()
+            with torch.no_grad():
+                audio_features = self.model.embed_audio(mel.unsqueeze(0))
+            encoded = time.perf_counter()
+            _, probs = self.model.detect_language(audio_features)
+        add_time(timings, "encoder", encoded - started)
+        add_time(timings, "decoder", time.perf_counter() - encoded)
+        return probs[0]
+
+    def _encode_and_decode(
+        self,
+        mel: torch.Tensor,
+        options: DecodingOptions,
+        timings: Optional[Dict[str, float]] = None
+    ) -> List[DecodingResult]:
+        """Run the encoder and then the decoder on a batch of windows; call with the lock held
+
+        `model.decode` skips its own encoder pass when given audio features,
+        which lets the two stages be timed separately.
+        """
+        started = time.perf_counter()
+        with torch.no_grad():
+            audio_features = self.model.embed_audio(mel)
+        encoded = time.perf_counter()
+        results = self.model.decode(audio_features, options)
+        add_time(timings, "encoder", encoded - started)
+        add_time(timings, "decoder", time.perf_counter() - encoded)
+        return results
+
+    def session(self) -> ContextManager:
+        """Context manager wrapping one request's transcription"""
+        return nullcontext()
+
+    def unbatched(self) -> "ModelDecoder":
+        """Get a decoder running the model on the calling thread
+
+        Used when a request is profiled, so its model calls show up in the
+        profile of the thread that transcribes it.
+        """
+        return self
+
+
+def decode_windows(model, audio_features: torch.Tensor, options: List[DecodingOptions]) -> List[DecodingResult]:
+    """Decode encoded windows in one batch, each with its own decoding options
+
+    The options may differ only in the prompt and the language, and the
+    prompts must have the same length after whisper truncates them, so
+    every window starts with as many tokens.
+
+    Args:
+        model: Whisper model, or a stand-in implementing `decode_windows`
+        audio_features: Encoder output of the windows
+        options: Decoding options of each window
+    """
+    if all(window_options == options[0] for window_options in options):
+        return model.decode(audio_features, options[0])
+    if not isinstance(model, Whisper):
+        return model.decode_windows(audio_features, options)
+    return _WindowsDecodingTask(model, options).run(audio_features)
+
+
+class _WindowsDecodingTask(DecodingTask):
+    """Whisper decoding task giving every window its own initial tokens
+
+    `DecodingTask` starts all windows from the same prompt and language.
+    The initial tokens are written per window where the task would write
+    detected language tokens, right before the decoding loop starts.
+    """
+
+    def __init__(self, model: Whisper, options: List[DecodingOptions]):
+        super().__init__(model, options[0])
+        self.window_options = options
+        # Built by whisper itself, so truncation and special tokens match an unbatched decode
+        self.window_tokens = [DecodingTask(model, window_options).initial_tokens for window_options in options]
+        if len({len(tokens) for tokens in self.window_tokens}) != 1:
+            raise ValueError("Windows decoded together need prompts of the same length")
+
+    def _detect_language(self, audio_features: torch.Tensor, tokens: torch.Tensor):
+        tokens[:] = torch.tensor(self.window_tokens, device=tokens.device)
+        languages, language_probs = super()._detect_language(audio_features, tokens)
+        if self.options.language is not None:
+            languages = [window_options.language for window_options in self.window_options]
+        return languages, language_probs
+
+
+def add_time(timings: Optional[Dict[str, float]], stage: str, seconds: float) -> None:
+    """Add `seconds` to a stage in an optional timings dict"""
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def iter_segments(
+    decoder: ModelDecoder,
+    audio: np.ndarray,
+    options: TranscriptionOptions,
+    timings: Optional[Dict[str, float]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None,
+    counts: Optional[Dict[str, int]] = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """Transcribe audio window by window
+
+    This follows the seek logic of `whisper.transcribe`, but hands every
+    30-second window to `decoder`, which may batch it with windows from
+    other requests.
+
+    Args:
+        decoder: Decoder wrapping the model
+        audio: Float32 mono audio at 16 kHz
+        options: Transcription options; `language` is filled in when detected
+        timings: Optional dict accumulating `mel`, `encoder` and `decoder` seconds
+        check_cancelled: Optional callable run before each window, which
+            raises to abandon the transcription
+        counts: Optional dict accumulating the decoded `windows` and the
+            temperature `fallbacks` (windows decoded again)
+
+    Yields:
+        List[Dict[str, Any]]: Segments decoded from each window
+    """
+    with decoder.session():
+        yield from _iter_windows(decoder, audio, options, timings, check_cancelled, counts)
+
+
+def _iter_windows(
+    decoder: ModelDecoder,
+    audio: np.ndarray,
+    options: TranscriptionOptions,
+    timings: Optional[Dict[str, float]],
+    check_cancelled: Optional[Callable[[], None]],
+    counts: Optional[Dict[str, int]]
+) -> Iterator[List[Dict[str, Any]]]:
+    model = decoder.model
+    dtype = torch.float16 if options.fp16 else torch.float32
+
+    # Pad 30 seconds of silence to the input audio, for slicing
+    started = time.perf_counter()
+    mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+    add_time(timings, "mel", time.perf_counter() - started)
+    content_frames = mel.shape[-1] - N_FRAMES
+
+    if options.language is None:
+        if not model.is_multilingual:
+            options.language = "en"
+        else:
+            mel_segment = pad_or_trim(mel, N_FRAMES).to(model.device).to(dtype)
+            probs = decoder.detect_language(mel_segment, timings)
+            options.language = max(probs, key=probs.get)
+
+    tokenizer = get_tokenizer(
+        model.is_multilingual,
+        num_languages=model.num_languages,
+        language=options.language,
+        task=options.task
+    )
+
+    seek = 0
+    window = 0
+    segment_id = 0
+    all_tokens: List[int] = []
+    prompt_reset_since = 0
+
+    while seek < content_frames:
+        if check_cancelled is not None:
+            check_cancelled()
+        time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+        segment_size = min(N_FRAMES, content_frames - seek)
+        mel_segment = mel[:, seek:seek + segment_size]
+        mel_segment = pad_or_trim(mel_segment, N_FRAMES).to(model.device).to(dtype)
+
+        result = _decode_with_fallback(
+            decoder, mel_segment, options, all_tokens[prompt_reset_since:], timings, counts
+        )
+        tokens = torch.tensor(result.tokens)
+
+        if options.no_speech_threshold is not None:
+            # No voice activity check
+            should_skip = result.no_speech_prob > options.no_speech_threshold
+            if (options.logprob_threshold is not None
+                    and result.avg_logprob > options.logprob_threshold):
+                should_skip = False
+            if should_skip:
+                seek += segment_size
+                continue
+
+        current_segments = []
+        timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+        single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+        consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0] + 1
+
+        if len(consecutive) > 0:
+            # The output contains two consecutive timestamp tokens
+            slices = consecutive.tolist()
+            if single_timestamp_ending:
+                slices.append(len(tokens))
+
+            last_slice = 0
+            for current_slice in slices:
+                sliced_tokens = tokens[last_slice:current_slice]
+                start_pos = sliced_tokens[0].item() - tokenizer.timestamp_begin
+                end_pos = sliced_tokens[-1].item() - tokenizer.timestamp_begin
+                current_segments.append(_new_segment(
+                    tokenizer, seek, result, sliced_tokens,
+                    start=time_offset + start_pos * TIME_PRECISION,
+                    end=time_offset + end_pos * TIME_PRECISION
+                ))
+                last_slice = current_slice
+
+            if single_timestamp_ending:
+                # No speech after the last timestamp
+                seek += segment_size
+            else:
+                # Ignore the unfinished segment and seek to the last timestamp
+                last_pos = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+                seek += last_pos * INPUT_STRIDE
+        else:
+            duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+                # No consecutive timestamps but it has a timestamp; use the last one
+                duration = (timestamps[-1].item() - tokenizer.timestamp_begin) * TIME_PRECISION
+            current_segments.append(_new_segment(
+                tokenizer, seek, result, tokens,
+                start=time_offset,
+                end=time_offset + duration
+            ))
+            seek += segment_size
+
+        # Clear instantaneous or empty segments
+        for segment in current_segments:
+            if segment["start"] == segment["end"] or segment["text"].strip() == "":
+                segment["text"] = ""
+                segment["tokens"] = []
+
+        for segment in current_segments:
+            segment["id"] = segment_id
+            segment["window"] = window
+            segment_id += 1
+            all_tokens.extend(segment["tokens"])
+
+        if not options.condition_on_previous_text or result.temperature > 0.5:
+            # Do not feed the prompt tokens if a high temperature was used
+            prompt_reset_since = len(all_tokens)
+
+        window += 1
+        yield current_segments
+
+
+def transcribe(
+    decoder: ModelDecoder,
+    audio: np.ndarray,
+    options: Optional[TranscriptionOptions] = None,
+    on_window: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    check_cancelled: Optional[Callable[[], None]] = None
+) -> Dict[str, Any]:
+    """Transcribe audio and collect the result
+
+    Args:
+        decoder: Decoder wrapping the model
+        audio: Float32 mono audio at 16 kHz
+        options: Transcription options
+        on_window: Optional callback receiving each window's segments as soon as it is decoded
+        check_cancelled: Optional callable run before each window, which
+            raises to abandon the transcription
+
+    Returns:
+        Dict[str, Any]: Result with `text`, `segments` and `language`,
+            shaped like the output of `whisper.transcribe`, the seconds
+            spent in each stage under `timings`, and the number of decoded
+            `windows` and temperature `fallbacks` under `decoding`
+    """
+    options = options or TranscriptionOptions()
+    segments = []
+    timings = {"mel": 0.0, "encoder": 0.0, "decoder": 0.0}
+    counts = {"windows": 0, "fallbacks": 0}
+    for window_segments in iter_segments(decoder, audio, options, timings, check_cancelled, counts):
+        if on_window is not None:
+            on_window(window_segments)
+        segments.extend(window_segments)
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": options.language,
+        "timings": timings,
+        "decoding": counts
+    }
+
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """Get the Whisper code of a language given by code or English name
+
+    Raises:
+        ValueError: If the language is not supported
+    """
+    if not language:
+        return None
+    language = language.strip().lower()
+    if language in LANGUAGES:
+        return language
+    if language in TO_LANGUAGE_CODE:
+        return TO_LANGUAGE_CODE[language]
+    raise ValueError(f"Unsupported language '{language}'")
+
+
+def decoding_settings(preset: str = "balanced", **overrides: Optional[str]) -> Dict[str, Any]:
+    """Resolve a decoding preset and individual overrides into TranscriptionOptions fields
+
+    Overrides are given as text, the way they come from form fields and
+    query parameters, and None keeps the preset's value. `temperature` is a
+    comma-separated fallback ladder, and thresholds can be `none` to disable
+    them.
+
+    Args:
+        preset: Name of a preset from DECODING_PRESETS
+        **overrides: Values of the options in DECODING_OVERRIDES
+
+    Returns:
+        Dict[str, Any]: Every option of DECODING_OVERRIDES, with its value
+
+    Raises:
+        ValueError: If the preset, an option or a value is invalid
+    """
+    preset = (preset or "balanced").strip().lower()
+    if preset not in DECODING_PRESETS:
+        raise ValueError(f"Unknown decoding preset '{preset}', choose one of {list(DECODING_PRESETS)}")
+    defaults = TranscriptionOptions(**DECODING_PRESETS[preset])
+    settings = {name: getattr(defaults, name) for name in DECODING_OVERRIDES}
+
+    for name, value in overrides.items():
+        if name not in DECODING_OVERRIDES:
+            raise ValueError(f"Unknown decoding option '{name}', choose from {list(DECODING_OVERRIDES)}")
+        if value is None or not str(value).strip():
+            continue
+        value = str(value).strip().lower()
+        try:
+            settings[name] = _parse_decoding_option(name, value)
+        except ValueError as e:
+            raise ValueError(f"Invalid {name} '{value}': {e}") from None
+
+    if settings["patience"] is not None and settings["beam_size"] is None:
+        raise ValueError("patience requires beam_size")
+    return settings
+
+
+def _parse_decoding_option(name: str, value: str) -> Any:
+    """Parse and validate the text value of one decoding option"""
+    if name == "temperature":
+        ladder = tuple(float(t) for t in value.split(",") if t.strip())
+        if not ladder or any(not 0 <= t <= 1 for t in ladder):
+            raise ValueError("temperatures must be between 0 and 1")
+        if list(ladder) != sorted(set(ladder)):
+            raise ValueError("temperatures must increase")
+        return ladder
+    if name == "condition_on_previous_text":
+        if value in ("1", "true", "yes"):
+            return True
+        if value in ("0", "false", "no"):
+            return False
+        raise ValueError("expected true or false")
+    if value == "none":
+        return None
+    if name in ("beam_size", "best_of"):
+        number = int(value)
+        if not 1 <= number <= MAX_DECODING_CANDIDATES:
+            raise ValueError(f"must be between 1 and {MAX_DECODING_CANDIDATES}")
+        return number
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError("must be a finite number")
+    if name in ("patience", "compression_ratio_threshold") and number <= 0:
+        raise ValueError("must be positive")
+    if name == "no_speech_threshold" and not 0 <= number <= 1:
+        raise ValueError("must be between 0 and 1")
+    return number
+
+
+def detect_language(decoder: ModelDecoder, audio: np.ndarray, fp16: bool = False) -> Dict[str, Any]:
+    """Detect the spoken language from the first 30 seconds of audio
+
+    Runs the encoder and a single decoder step instead of a transcription.
+
+    Args:
+        decoder: Decoder wrapping the model
+        audio: Float32 mono audio at 16 kHz
+        fp16: Whether to run the model in half precision
+
+    Returns:
+        Dict[str, Any]: The most likely `language`, the `probabilities` of
+            all languages (highest first) and the stage `timings`
+    """
+    model = decoder.model
+    timings = {"mel": 0.0, "encoder": 0.0, "decoder": 0.0}
+    if not model.is_multilingual:
+        return {"language": "en", "probabilities": {"en": 1.0}, "timings": timings}
+
+    started = time.perf_counter()
+    mel = log_mel_spectrogram(audio[:N_SAMPLES], model.dims.n_mels, padding=N_SAMPLES)
+    mel = pad_or_trim(mel, N_FRAMES).to(model.device).to(torch.float16 if fp16 else torch.float32)
+    add_time(timings, "mel", time.perf_counter() - started)
+
+    probs = decoder.detect_language(mel, timings)
+    ranked = dict(sorted(((code, float(p)) for code, p in probs.items()), key=lambda item: -item[1]))
+    return {"language": next(iter(ranked)), "probabilities": ranked, "timings": timings}
+
+
+def _decode_with_fallback(
+    decoder: ModelDecoder,
+    mel_segment: torch.Tensor,
+    options: TranscriptionOptions,
+    prompt: List[int],
+    timings: Optional[Dict[str, float]] = None,
+    counts: Optional[Dict[str, int]] = None
+) -> DecodingResult:
+    """Decode a window, retrying at higher temperatures when the output looks degenerate"""
+    result = None
+    for attempt, temperature in enumerate(options.temperature):
+        result = decoder.decode(mel_segment, options.decoding_options(temperature, prompt), timings)
+        if counts is not None:
+            # Every attempt after the first one is a fallback
+            count = "fallbacks" if attempt else "windows"
+            counts[count] = counts.get(count, 0) + 1
+
+        needs_fallback = False
+        if (options.compression_ratio_threshold is not None
+                and result.compression_ratio > options.compression_ratio_threshold):
+            needs_fallback = True  # Too repetitive
+        if (options.logprob_threshold is not None
+                and result.avg_logprob < options.logprob_threshold):
+            needs_fallback = True  # Average log probability is too low
+        if (options.no_speech_threshold is not None
+                and result.no_speech_prob > options.no_speech_threshold
+                and options.logprob_threshold is not None
+                and result.avg_logprob < options.logprob_threshold):
+            needs_fallback = False  # Silence
+        if not needs_fallback:
+            break
+    return result
+
+
+def _new_segment(tokenizer, seek: int, result: DecodingResult, tokens: torch.Tensor,
+                 start: float, end: float) -> Dict[str, Any]:
+    tokens = tokens.tolist()
+    text_tokens = [token for token in tokens if token < tokenizer.eot]
+    return {
+        "seek": seek,
+        "start": start,
+        "end": end,
+        "text": tokenizer.decode(text_tokens),
+        "tokens": tokens,
+        "temperature": result.temperature,
+        "avg_logprob": result.avg_logprob,
+        "compression_ratio": result.compression_ratio,
+        "no_speech_prob": result.no_speech_prob,
+    }
@@ -0,0 +1,132 @@
+import threading
+from typing import Any, Dict, Optional, Sequence
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+
+class UploadBudget:
+    """Cap on the request body bytes held by all in-flight uploads together"""
+
+    def __init__(self, max_bytes: Optional[int]):
+        """Initialize the budget
+
+        Args:
+            max_bytes: Maximum bytes of all in-flight uploads, or None for no cap
+        """
+        self.max_bytes = max_bytes
+        self._used = 0
+        self._peak = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self, size: int) -> bool:
+        """Reserve `size` bytes; False, and nothing reserved, if that would exceed the cap"""
+        with self._lock:
+            if size > 0 and self.max_bytes is not None and self._used + size > self.max_bytes:
+                self._rejected += 1
+                return False
+            self._used += size
+            self._peak = max(self._peak, self._used)
+            return True
+
+    def release(self, size: int) -> None:
+        """Return reserved bytes"""
+        with self._lock:
+            self._used -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """Get budget usage for monitoring"""
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "in_flight_bytes": self._used,
+                "peak_bytes": self._peak,
+                "rejected": self._rejected,
+            }
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware enforcing a maximum body size and the upload budget
+
+    A request declaring a larger `Content-Length` than `max_body_bytes` is
+    answered with 413 before its body is read, and one the budget can't hold
+    with 429. Bodies without a length (chunked uploads) are counted as they
+    arrive and fail the same way once they cross a limit. The reservation is
+    held until the response is sent, since the handler keeps the audio until then.
+    """
+
+    def __init__(
+        self,
+        app,
+        budget: UploadBudget,
+        max_body_bytes: Optional[int] = None,
+        retry_after: int = 1,
+        exclude_paths: Sequence[str] = ()
+    ):
+        self.app = app
+        self.budget = budget
+        self.max_body_bytes = max_body_bytes
+        self.retry_after = retry_after
+        self.exclude_paths = set(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("path") in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        declared = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    pass
+                break
+
+        if declared is not None:
+            if self.max_body_bytes is not None and declared > self.max_body_bytes:
+                await self._reject(scope, receive, send, self._too_large())
+                return
+            if not self.budget.try_acquire(declared):
+                await self._reject(scope, receive, send, self._busy())
+                return
+        reserved = declared or 0
+        received = 0
+
+        async def limited_receive():
+            nonlocal reserved, received
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            received += len(message.get("body", b""))
+            if self.max_body_bytes is not None and received > self.max_body_bytes:
+                raise self._too_large()
+            if received > reserved:
+                # Chunked upload, or more than declared: reserve as it arrives
+                if not self.budget.try_acquire(received - reserved):
+                    raise self._busy()
+                reserved = received
+            return message
+
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            self.budget.release(reserved)
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(
+            status_code=413,
+            detail=f"Request body exceeds {self.max_body_bytes / 1024 ** 2:g} MB"
+        )
+
+    def _busy(self) -> HTTPException:
+        return HTTPException(
+            status_code=429,
+            detail="Too many uploads in flight, please retry later",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    @staticmethod
+    async def _reject(scope, receive, send, error: HTTPException) -> None:
+        response = JSONResponse({"detail": error.detail}, status_code=error.status_code, headers=error.headers)
+        await response(scope, receive, send)
@@ -0,0 +1,71 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from src.utils.audio_utils import AudioUtils
+
+
+class SpeechMap:
+    """Maps between a recording and the concatenation of its speech regions
+
+    Only the speech is transcribed; segment times, which refer to the
+    concatenated audio, are mapped back onto the original timeline.
+    """
+
+    def __init__(self, regions: List[Tuple[int, int]], total_samples: int):
+        """Initialize the map
+
+        Args:
+            regions: Sorted, non-overlapping (start, end) sample ranges of speech
+            total_samples: Length of the original audio
+        """
+        self.regions = regions
+        self.total_samples = total_samples
+        lengths = np.array([end - start for start, end in regions], dtype=np.int64)
+        # Where each region starts in the concatenated and in the original audio, in seconds
+        self._speech_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])) / AudioUtils.WHISPER_SAMPLE_RATE \
+            if regions else np.zeros(0)
+        self._original_starts = np.array([start for start, _ in regions]) / AudioUtils.WHISPER_SAMPLE_RATE
+        self.speech_samples = int(lengths.sum())
+
+    @classmethod
+    def detect(cls, audio: np.ndarray, flatness_threshold: Optional[float] = None) -> "SpeechMap":
+        """Build the map of a recording with `AudioUtils.detect_speech`"""
+        return cls(AudioUtils.detect_speech(audio, flatness_threshold=flatness_threshold), len(audio))
+
+    def speech_audio(self, audio: np.ndarray) -> np.ndarray:
+        """Get the speech regions of `audio` joined end to end"""
+        if len(self.regions) == 1 and self.regions[0] == (0, len(audio)):
+            return audio
+        if not self.regions:
+            return audio[:0]
+        return np.concatenate([audio[start:end] for start, end in self.regions])
+
+    def to_original(self, seconds: float, is_end: bool = False) -> float:
+        """Map a time in the concatenated audio onto the original timeline
+
+        A time exactly on the boundary of two regions is placed at the end
+        of the earlier region when it ends a segment, and at the start of
+        the later one otherwise.
+        """
+        if not self.regions:
+            return seconds
+        side = "left" if is_end else "right"
+        index = max(0, int(np.searchsorted(self._speech_starts, seconds, side=side)) - 1)
+        return float(self._original_starts[index] + seconds - self._speech_starts[index])
+
+    def remap_segments(self, segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Move segment times onto the original timeline, in place"""
+        for segment in segments:
+            segment["start"] = self.to_original(segment["start"])
+            segment["end"] = self.to_original(segment["end"], is_end=True)
+        return segments
+
+    def stats(self) -> Dict[str, Any]:
+        """Get how much audio was skipped, for the response"""
+        total = self.total_samples / AudioUtils.WHISPER_SAMPLE_RATE
+        speech = self.speech_samples / AudioUtils.WHISPER_SAMPLE_RATE
+        return {
+            "speech_seconds": round(speech, 3),
+            "skipped_seconds": round(total - speech, 3),
+            "skipped_fraction": round(1 - speech / total, 4) if total else 0.0,
+            "regions": len(self.regions),
+        }
@@ -0,0 +1,309 @@
+import multiprocessing as mp
+import os
+import queue
+import threading
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from loguru import logger
+from whisper.audio import N_SAMPLES
+from src.server.cpu import WorkerSlot
+from src.server.inference import CancelToken, JobCancelled
+from src.server.transcriber import TranscriptionOptions
+
+
+# How often a dispatcher checks the cancel token of its job while the worker decodes
+CANCEL_POLL_SECONDS = 0.2
+
+
+class WorkerCrashedError(RuntimeError):
+    """Raised when an inference worker process dies while running a job"""
+
+
+class _WorkerProcess:
+    """Handle of one inference worker process, owned by the API process"""
+
+    def __init__(self, worker_id: int, context, slot: WorkerSlot, registry_kwargs: Dict[str, Any]):
+        self.worker_id = worker_id
+        self.slot = slot
+        self.conn, child_conn = context.Pipe()
+        # Set by the dispatcher to stop the current job after its window
+        self.cancel_flag = context.Event()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.cancel_flag, worker_id, slot, registry_kwargs),
+            name=f"inference-process-{worker_id}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.models: List[str] = []
+
+
+class ProcessWorkerPool:
+    """Pool of inference worker processes, each owning its own model replicas
+
+    The API process keeps the single dispatch queue (the `InferenceExecutor`
+    running one dispatcher thread per worker process). Decoded audio is
+    copied once into a shared memory block that the worker maps directly,
+    so audio is never pickled; only small job descriptors, segments and
+    results cross the process boundary.
+    """
+
+    def __init__(
+        self,
+        processes: int,
+        threads_per_process: int,
+        registry_kwargs: Dict[str, Any],
+        slots: Optional[List[WorkerSlot]] = None
+    ):
+        """Initialize the pool
+
+        Args:
+            processes: Number of worker processes
+            threads_per_process: torch intra-op thread budget of each worker
+            registry_kwargs: Arguments of the `ModelRegistry` each worker creates
+            slots: Cores and thread counts of each worker, from `plan_layout`;
+                by default workers aren't pinned and get `threads_per_process`
+        """
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+        if slots is not None and len(slots) != processes:
+            raise ValueError("slots must describe every worker process")
+        self.processes = processes
+        self.threads_per_process = max(1, threads_per_process)
+        self.slots = slots or [WorkerSlot(i, None, self.threads_per_process, 0) for i in range(processes)]
+        self.registry_kwargs = registry_kwargs
+        self._context = mp.get_context("spawn")
+        self._idle: "queue.Queue[_WorkerProcess]" = queue.Queue()
+        self._workers: List[_WorkerProcess] = []
+        self._lock = threading.Lock()
+        self._restarts = 0
+
+    def start(self) -> None:
+        """Spawn the worker processes"""
+        if self._workers:
+            return
+        for worker_id in range(self.processes):
+            worker = self._spawn(worker_id)
+            self._workers.append(worker)
+            self._idle.put(worker)
+        logger.info(f"Started {self.processes} inference process(es) with "
+                    f"{', '.join(str(slot.threads) for slot in self.slots)} thread(s)")
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._workers = []
+
+    def transcribe(
+        self,
+        audio: np.ndarray,
+        model_name: str,
+        options: TranscriptionOptions,
+        on_window: Optional[Callable[[List[dict]], None]] = None,
+        cancel: Optional[CancelToken] = None,
+        profiler: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Transcribe audio on an idle worker process; blocks until done
+
+        Args:
+            audio: Float32 mono audio at 16 kHz
+            model_name: Whisper model to use
+            options: Transcription options; `language` is filled in from the result
+            on_window: Optional callback receiving each window's segments
+            cancel: Optional token; once cancelled, the worker stops before its next window
+            profiler: Optional profiler to run the job under in the worker, see `profiling.profile_call`
+
+        Returns:
+            Dict[str, Any]: Transcription result
+
+        Raises:
+            WorkerCrashedError: If the worker process died during the job
+            JobCancelled: If the token was cancelled before the job finished
+        """
+        result = self._run("transcribe", audio, model_name, options, on_window, cancel, profiler)
+        options.language = result["language"]
+        return result
+
+    def detect_language(self, audio: np.ndarray, model_name: str, options: TranscriptionOptions) -> Dict[str, Any]:
+        """Detect the language of audio on an idle worker process; blocks until done
+
+        Only the first 30 seconds are sent to the worker. See `transcriber.detect_language`.
+        """
+        return self._run("detect_language", audio[:N_SAMPLES], model_name, options)
+
+    def _run(
+        self,
+        action: str,
+        audio: np.ndarray,
+        model_name: str,
+        options: TranscriptionOptions,
+        on_window: Optional[Callable[[List[dict]], None]] = None,
+        cancel: Optional[CancelToken] = None,
+        profiler: Optional[str] = None
+    ) -> Dict[str, Any]:
+        audio = np.ascontiguousarray(audio, dtype=np.float32)
+        shm = SharedMemory(create=True, size=max(audio.nbytes, 1))
+        worker = self._idle.get()
+        # Whether the worker is done with the job, or never got it
+        finished = True
+        try:
+            np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+            self._send(worker, (action, shm.name, len(audio), model_name, options, profiler))
+            finished = False
+            while True:
+                kind, payload = self._receive(worker, cancel)
+                finished = kind != "window"
+                if kind == "window":
+                    if on_window is not None:
+                        on_window(payload)
+                elif kind == "result":
+                    result, worker.models = payload
+                    return result
+                elif kind == "cancelled":
+                    raise JobCancelled(cancel.reason if cancel is not None and cancel.reason else payload)
+                else:
+                    raise RuntimeError(payload)
+        except WorkerCrashedError as e:
+            logger.error(f"Inference process {worker.worker_id} died: {e.__cause__}")
+            worker = self._replace(worker)
+            finished = True
+            raise
+        finally:
+            if not finished:
+                # The job failed in this process (e.g. in `on_window`) while the worker still
+                # runs it; its remaining messages must not reach the next job
+                worker = self._stop_job(worker)
+            # A cancellation arriving after the job finished must not stop the next one
+            worker.cancel_flag.clear()
+            worker.jobs += 1
+            self._idle.put(worker)
+            shm.close()
+            shm.unlink()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get worker process state for monitoring"""
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "threads_per_process": self.threads_per_process,
+                "idle": self._idle.qsize(),
+                "restarts": self._restarts,
+                "workers": [
+                    {
+                        "id": worker.worker_id,
+                        "pid": worker.process.pid,
+                        "alive": worker.process.is_alive(),
+                        "jobs": worker.jobs,
+                        "models": worker.models,
+                        "cores": worker.slot.cores,
+                        "threads": worker.slot.threads,
+                    }
+                    for worker in self._workers
+                ],
+            }
+
+    def _spawn(self, worker_id: int) -> _WorkerProcess:
+        return _WorkerProcess(worker_id, self._context, self.slots[worker_id], self.registry_kwargs)
+
+    def _send(self, worker: _WorkerProcess, message: Any) -> None:
+        try:
+            worker.conn.send(message)
+        except (EOFError, ConnectionError) as e:
+            raise WorkerCrashedError(f"Inference worker crashed: {e}") from e
+
+    def _receive(self, worker: _WorkerProcess, cancel: Optional[CancelToken] = None) -> tuple:
+        """Wait for the next message of the worker's job"""
+        try:
+            # The worker can't see the token, so it is relayed through the worker's flag
+            while cancel is not None:
+                if cancel.cancelled():
+                    worker.cancel_flag.set()
+                if worker.conn.poll(CANCEL_POLL_SECONDS):
+                    break
+            return worker.conn.recv()
+        except (EOFError, ConnectionError) as e:
+            raise WorkerCrashedError(f"Inference worker crashed: {e}") from e
+
+    def _stop_job(self, worker: _WorkerProcess) -> _WorkerProcess:
+        """Cancel the worker's current job and discard its messages until the final one"""
+        worker.cancel_flag.set()
+        try:
+            while self._receive(worker)[0] == "window":
+                pass
+        except WorkerCrashedError as e:
+            logger.error(f"Inference process {worker.worker_id} died: {e.__cause__}")
+            worker = self._replace(worker)
+        return worker
+
+    def _replace(self, worker: _WorkerProcess) -> _WorkerProcess:
+        """Respawn a dead worker process in place"""
+        worker.process.join(timeout=1)
+        replacement = self._spawn(worker.worker_id)
+        with self._lock:
+            self._workers[self._workers.index(worker)] = replacement
+            self._restarts += 1
+        return replacement
+
+
+def _worker_main(conn, cancel_flag, worker_id: int, slot: WorkerSlot, registry_kwargs: Dict[str, Any]) -> None:
+    """Entry point of an inference worker process"""
+    from src.server.cpu import apply_slot
+    from src.server.models import ModelRegistry
+    from src.server.profiling import profile_transcription
+    from src.server.transcriber import detect_language, transcribe
+
+    # Before any torch work, so the thread pools start on the worker's cores
+    apply_slot(slot)
+    registry = ModelRegistry(**registry_kwargs)
+    registry.preload()
+    logger.info(f"Inference process {worker_id} (pid {os.getpid()}) ready"
+                + (f" on cores {slot.cores}" if slot.cores else ""))
+
+    def check_cancelled() -> None:
+        if cancel_flag.is_set():
+            raise JobCancelled("cancelled")
+
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        action, shm_name, length, model_name, options, profiler = job
+        # Spawned workers share the API process's resource tracker, which
+        # forgets the block when the API process unlinks it
+        shm = SharedMemory(name=shm_name)
+        audio = np.ndarray((length,), dtype=np.float32, buffer=shm.buf)
+        try:
+            with registry.acquire(model_name) as handle:
+                if action == "detect_language":
+                    result = detect_language(handle.decoder, audio, fp16=options.fp16)
+                else:
+                    run = partial(profile_transcription, profiler=profiler) if profiler else transcribe
+                    result = run(
+                        handle.decoder, audio, options,
+                        on_window=lambda segments: conn.send(("window", segments)),
+                        check_cancelled=check_cancelled
+                    )
+            conn.send(("result", (result, registry.loaded_models())))
+        except JobCancelled as e:
+            conn.send(("cancelled", e.reason))
+        except Exception as e:
+            logger.error(f"Inference process {worker_id} failed: {e}")
+            conn.send(("error", str(e)))
+        finally:
+            # The mapping can only be closed once no array views it
+            del audio
+            shm.close()
+    registry.shutdown()
+
@@ -1,9 +1,13 @@
+import io
 import os
+import shutil
 import subprocess
+import tempfile
+import threading
 import numpy as np
 import soundfile as sf
 from pathlib import Path
-from typing import Union, Tuple, Optional
+from typing import BinaryIO, Union, Tuple, Optional
 from loguru import logger
 
 class AudioUtils:
@@ -12,6 +16,8 @@ class AudioUtils:
     WHISPER_SAMPLE_RATE = 16000
     WHISPER_CHANNELS = 1
     WHISPER_BIT_DEPTH = 16
+    # Raw PCM sample formats accepted by pcm_from_bytes (little-endian)
+    PCM_DTYPES = {'int16': '<i2', 'float32': '<f4'}
     
     @staticmethod
     def convert_to_whisper_format(
@@ -142,6 +148,361 @@ class AudioUtils:
             logger.error(f"Failed to load audio file: {str(e)}")
             raise
     
+    @staticmethod
+    def decode_audio_bytes(data: bytes, max_samples: Optional[int] = None) -> np.ndarray:
+        """Decode an in-memory audio file to Whisper's input format
+
+        WAV, FLAC and OGG files already at 16kHz are decoded with soundfile.
+        Everything else is piped through ffmpeg's stdin/stdout, so no
+        temporary file is written. Containers that ffmpeg cannot read from a
+        pipe (e.g. MP4/M4A with the index at the end of the file) fall back
+        to decoding from a temporary file.
+
+        Args:
+            data: Encoded audio file contents
+            max_samples: Optional number of samples to stop decoding after
+
+        Returns:
+            np.ndarray: Float32 mono audio at 16kHz in the range [-1, 1]
+
+        Raises:
+            RuntimeError: If the audio cannot be decoded
+        """
+        audio = AudioUtils._read_native(io.BytesIO(data), max_samples)
+        if audio is not None:
+            return audio
+
+        cmd = AudioUtils._limit_command(AudioUtils.ffmpeg_decode_command(), max_samples)
+        result = subprocess.run(cmd, input=data, capture_output=True)
+        if result.returncode != 0 or not result.stdout:
+            logger.debug("FFmpeg could not decode audio from a pipe, retrying from a temporary file")
+            result = AudioUtils._decode_via_temp_file(cmd, data)
+
+        return np.frombuffer(result.stdout, np.int16)[:max_samples].astype(np.float32) / 32768.0
+
+    @staticmethod
+    def decode_audio_file(
+        file: BinaryIO,
+        chunk_size: int = 1024 * 1024,
+        max_samples: Optional[int] = None
+    ) -> np.ndarray:
+        """Decode an audio file object without reading it into memory at once
+
+        Like `decode_audio_bytes`, but the file is read and piped to ffmpeg
+        in chunks of `chunk_size` bytes, so only the decoded samples are held
+        in memory. Used for uploads that were spooled to disk.
+
+        Args:
+            file: Seekable binary file positioned at the start of the audio
+            chunk_size: Bytes read and written at a time
+            max_samples: Optional number of samples to stop decoding, and reading, after
+
+        Returns:
+            np.ndarray: Float32 mono audio at 16kHz in the range [-1, 1]
+
+        Raises:
+            RuntimeError: If the audio cannot be decoded
+        """
+        audio = AudioUtils._read_native(file, max_samples)
+        if audio is not None:
+            return audio
+
+        file.seek(0)
+        # The file itself can be decoded again if piping fails, so it needn't be spooled
+        decoder = FFmpegStreamDecoder(spool=False, max_samples=max_samples)
+        try:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                decoder.write(chunk)
+                if decoder.done:
+                    break
+            file.seek(0)
+            return decoder.finish(fallback=file)
+        finally:
+            decoder.close()
+
+    @staticmethod
+    def ffmpeg_decode_command() -> list:
+        """Get the ffmpeg command decoding stdin to 16kHz mono 16-bit PCM on stdout"""
+        return [
+            'ffmpeg',
+            '-threads', '0',
+            '-i', 'pipe:0',
+            '-f', 's16le',                               # Raw 16-bit PCM output
+            '-ac', str(AudioUtils.WHISPER_CHANNELS),     # Channels
+            '-ar', str(AudioUtils.WHISPER_SAMPLE_RATE),  # Sample rate
+            'pipe:1'
+        ]
+
+    @staticmethod
+    def pcm_from_bytes(
+        data: Union[bytes, bytearray],
+        dtype: str = 'float32',
+        channels: int = 1
+    ) -> np.ndarray:
+        """Wrap raw little-endian PCM samples as Whisper input
+
+        Mono float32 data is wrapped without copying; int16 data is scaled
+        to float32 and multi-channel data is downmixed.
+
+        Args:
+            data: Raw interleaved PCM samples
+            dtype: Sample format, 'int16' or 'float32'
+            channels: Number of interleaved channels
+
+        Returns:
+            np.ndarray: Float32 mono audio in the range [-1, 1]
+
+        Raises:
+            ValueError: If the format is unsupported or the data is truncated
+        """
+        if dtype not in AudioUtils.PCM_DTYPES:
+            raise ValueError(f"Unsupported PCM dtype: {dtype}, expected one of {list(AudioUtils.PCM_DTYPES)}")
+        if channels < 1:
+            raise ValueError(f"Invalid channel count: {channels}")
+        sample_dtype = np.dtype(AudioUtils.PCM_DTYPES[dtype])
+        if len(data) % (sample_dtype.itemsize * channels) != 0:
+            raise ValueError("PCM data length is not a whole number of frames")
+
+        audio = np.frombuffer(data, dtype=sample_dtype)
+        if dtype == 'int16':
+            audio = audio.astype(np.float32) / 32768.0
+        if channels > 1:
+            audio = audio.reshape(-1, channels).mean(axis=1, dtype=np.float32)
+        return audio
+
+    @staticmethod
+    def frame_energies(
+        audio: np.ndarray,
+        frame_length: int = 400,
+        hop_length: int = 160
+    ) -> np.ndarray:
+        """Compute the RMS energy of each frame in decibels
+
+        Uses a running sum of squares, so memory stays linear in the audio
+        length regardless of the frame overlap.
+
+        Args:
+            audio: Float32 mono audio
+            frame_length: Frame size in samples (25 ms at 16 kHz by default)
+            hop_length: Frame step in samples (10 ms at 16 kHz by default)
+
+        Returns:
+            np.ndarray: Energy of each frame in dB relative to full scale
+        """
+        if len(audio) < frame_length:
+            audio = np.pad(audio, (0, frame_length - len(audio)))
+        squares = np.empty(len(audio) + 1, dtype=np.float64)
+        squares[0] = 0.0
+        np.cumsum(np.square(audio, dtype=np.float64), out=squares[1:])
+        starts = np.arange(0, len(audio) - frame_length + 1, hop_length)
+        power = (squares[starts + frame_length] - squares[starts]) / frame_length
+        return 10.0 * np.log10(np.maximum(power, 1e-10))
+
+    @staticmethod
+    def frame_features(
+        audio: np.ndarray,
+        frame_length: int = 400,
+        hop_length: int = 160,
+        spectral_flatness: bool = False,
+        block_frames: int = 4096
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Compute per-frame energy and, optionally, spectral flatness in one pass
+
+        Spectral flatness is the ratio of the geometric to the arithmetic mean
+        of a frame's power spectrum: close to 1 for noise, close to 0 for
+        voiced speech. Frames are transformed in blocks to bound memory.
+
+        Args:
+            audio: Float32 mono audio
+            frame_length: Frame size in samples
+            hop_length: Frame step in samples
+            spectral_flatness: Whether to compute spectral flatness too
+            block_frames: Number of frames transformed at once
+
+        Returns:
+            Tuple[np.ndarray, Optional[np.ndarray]]: Energy in dB of each frame,
+                and spectral flatness of each frame or None
+        """
+        if not spectral_flatness:
+            return AudioUtils.frame_energies(audio, frame_length, hop_length), None
+
+        if len(audio) < frame_length:
+            audio = np.pad(audio, (0, frame_length - len(audio)))
+        frames = np.lib.stride_tricks.sliding_window_view(audio, frame_length)[::hop_length]
+        window = np.hanning(frame_length).astype(np.float32)
+        window_power = np.sum(window ** 2)
+        energies = np.empty(len(frames), dtype=np.float64)
+        flatness = np.empty(len(frames), dtype=np.float64)
+        for start in range(0, len(frames), block_frames):
+            block = frames[start:start + block_frames]
+            power = np.abs(np.fft.rfft(block * window, axis=1)) ** 2 + 1e-12
+            # Parseval: the mean power of the windowed frame, from its spectrum
+            mean_power = (2 * power[:, 1:-1].sum(axis=1) + power[:, 0] + power[:, -1]) \
+                / (frame_length * window_power)
+            energies[start:start + len(block)] = 10.0 * np.log10(np.maximum(mean_power, 1e-10))
+            flatness[start:start + len(block)] = \
+                np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+        return energies, flatness
+
+    @staticmethod
+    def detect_speech(
+        audio: np.ndarray,
+        energy_threshold_db: Optional[float] = None,
+        flatness_threshold: Optional[float] = None,
+        min_speech_seconds: float = 0.25,
+        min_silence_seconds: float = 0.5,
+        padding_seconds: float = 0.2
+    ) -> list:
+        """Find the regions of audio that contain speech
+
+        A frame counts as speech when its energy is above the threshold and,
+        if `flatness_threshold` is set, its spectral flatness is below it.
+        Pauses shorter than `min_silence_seconds` are bridged, bursts shorter
+        than `min_speech_seconds` are dropped, and regions are padded so word
+        onsets and endings are kept.
+
+        Args:
+            audio: Float32 mono audio at 16 kHz
+            energy_threshold_db: Energy threshold in dBFS; by default derived
+                from the noise floor of the recording
+            flatness_threshold: Maximum spectral flatness of speech frames, or None to skip the check
+            min_speech_seconds: Shortest speech region kept
+            min_silence_seconds: Shortest pause that splits speech regions
+            padding_seconds: Audio kept around each speech region
+
+        Returns:
+            list: Sorted, non-overlapping (start, end) sample ranges of speech
+        """
+        sr = AudioUtils.WHISPER_SAMPLE_RATE
+        frame_length, hop_length = 400, 160
+        if len(audio) == 0:
+            return []
+        energies, flatness = AudioUtils.frame_features(
+            audio, frame_length, hop_length, spectral_flatness=flatness_threshold is not None
+        )
+
+        if energy_threshold_db is None:
+            # Well above the noise floor, but never so high that a recording
+            # without pauses loses its quieter speech
+            noise_floor = np.percentile(energies, 10)
+            loud = np.percentile(energies, 90)
+            energy_threshold_db = max(-60.0, min(noise_floor + 10.0, loud - 20.0))
+        speech = energies > energy_threshold_db
+        if flatness is not None:
+            speech &= flatness < flatness_threshold
+
+        # Run boundaries: starts and ends of consecutive speech frames
+        edges = np.diff(np.concatenate(([0], speech.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        if len(starts) == 0:
+            return []
+
+        # Bridge short pauses
+        gaps = starts[1:] - ends[:-1]
+        keep = np.concatenate(([True], gaps * hop_length >= min_silence_seconds * sr))
+        starts = starts[keep]
+        ends = ends[np.concatenate((keep[1:], [True]))]
+
+        # Drop short bursts
+        long_enough = (ends - starts) * hop_length >= min_speech_seconds * sr
+        starts, ends = starts[long_enough], ends[long_enough]
+
+        padding = int(padding_seconds * sr)
+        regions = []
+        for start, end in zip(starts * hop_length - padding, ends * hop_length + frame_length + padding):
+            start, end = max(0, int(start)), min(len(audio), int(end))
+            if regions and start <= regions[-1][1]:
+                regions[-1] = (regions[-1][0], end)
+            else:
+                regions.append((start, end))
+        return regions
+
+    @staticmethod
+    def find_split_points(
+        audio: np.ndarray,
+        chunk_seconds: float,
+        search_seconds: float = 10.0,
+        pause_seconds: float = 0.3
+    ) -> list:
+        """Find sample positions splitting audio into chunks at quiet moments
+
+        Each split is placed at the quietest pause within `search_seconds`
+        of the point where the current chunk reaches `chunk_seconds`.
+
+        Args:
+            audio: Float32 mono audio at 16 kHz
+            chunk_seconds: Target chunk length
+            search_seconds: How far around the target to look for a pause
+            pause_seconds: Length of the quiet stretch a split is centered in
+
+        Returns:
+            list: Increasing split positions in samples, excluding 0 and the end
+        """
+        sr = AudioUtils.WHISPER_SAMPLE_RATE
+        hop_length = 160
+        chunk = int(chunk_seconds * sr)
+        if chunk <= 0 or len(audio) <= chunk * 1.5:
+            return []
+
+        # Smooth frame energies so a split lands in a pause, not in a gap between two syllables
+        energies = AudioUtils.frame_energies(audio, hop_length=hop_length)
+        width = max(1, int(pause_seconds * sr / hop_length))
+        smoothed = np.convolve(energies, np.ones(width) / width, mode='same')
+        search = int(search_seconds * sr / hop_length)
+
+        splits = []
+        last = 0
+        # Don't leave a final chunk much shorter than the others
+        while len(audio) - last > chunk * 1.5:
+            target = (last + chunk) // hop_length
+            lo = max(target - search, last // hop_length + 1)
+            hi = min(target + search, len(smoothed) - 1)
+            frame = lo + int(np.argmin(smoothed[lo:hi + 1]))
+            last = frame * hop_length + 200
+            splits.append(last)
+        return splits
+
+    @staticmethod
+    def _read_native(file: BinaryIO, max_samples: Optional[int] = None) -> Optional[np.ndarray]:
+        """Read a file soundfile can open if it is already at 16kHz, else return None
+
+        The header is checked first, so files at other rates are not decoded just to be thrown away.
+        """
+        try:
+            with sf.SoundFile(file) as sound_file:
+                if sound_file.samplerate != AudioUtils.WHISPER_SAMPLE_RATE:
+                    return None
+                audio = sound_file.read(frames=-1 if max_samples is None else max_samples, dtype='float32')
+        except Exception:
+            return None
+        if audio.ndim > 1:
+            audio = audio.mean(axis=1)
+        return np.ascontiguousarray(audio, dtype=np.float32)
+
+    @staticmethod
+    def _limit_command(cmd: list, max_samples: Optional[int]) -> list:
+        """Make an ffmpeg decode command stop, and stop reading its input, after `max_samples` samples"""
+        if max_samples is None:
+            return cmd
+        # An output option, so it goes right before the output
+        return cmd[:-1] + ['-t', f'{max_samples / AudioUtils.WHISPER_SAMPLE_RATE:g}'] + cmd[-1:]
+
+    @staticmethod
+    def _decode_via_temp_file(cmd: list, data: Union[bytes, BinaryIO]) -> subprocess.CompletedProcess:
+        """Run the ffmpeg decode command on a temporary copy of the data, given as bytes or a file"""
+        with tempfile.NamedTemporaryFile() as temp_file:
+            if isinstance(data, (bytes, bytearray)):
+                temp_file.write(data)
+            else:
+                shutil.copyfileobj(data, temp_file)
+            temp_file.flush()
+            file_cmd = [temp_file.name if arg == 'pipe:0' else arg for arg in cmd]
+            result = subprocess.run(file_cmd, capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg decoding failed: {result.stderr.decode(errors='replace')}")
+        return result
+
     @staticmethod
     def get_audio_info(file_path: Union[str, Path]) -> dict:
         """Get audio file information using ffprobe
@@ -187,4 +548,269 @@ class AudioUtils:
             
         except Exception as e:
             logger.error(f"Failed to get audio info: {str(e)}")
-            raise 
\ No newline at end of file
+            raise 
+
+
+class FFmpegStreamDecoder:
+    """Decode audio with ffmpeg while its encoded bytes are still arriving
+
+    The first bytes of the input decide how it is decoded:
+
+    - WAV and FLAC files already at 16kHz are collected and read with
+      soundfile at the end, without starting ffmpeg.
+    - MP4/MOV files whose index (`moov` box) comes after the media data
+      can't be decoded from a pipe. Unless `spool` is off, they are copied
+      to a temporary file (in memory up to `spool_memory_bytes`) and
+      decoded from it at the end.
+    - Everything else goes straight to ffmpeg's stdin, and its output is
+      collected by a reader thread. Decoding overlaps with receiving the
+      upload, and the encoded file is never held in memory as a whole.
+
+    With `max_samples`, decoding stops after that many samples: ffmpeg is
+    told to stop, and WAV and FLAC input is collected only as far as its
+    header says those samples go. `done` tells when more input is useless.
+    """
+
+    # Bytes of the input examined before a container is treated as non-streamable
+    MAX_HEAD_BYTES = 64 * 1024
+
+    def __init__(
+        self,
+        spool: bool = True,
+        spool_memory_bytes: int = 1024 * 1024,
+        max_samples: Optional[int] = None
+    ):
+        """Initialize the decoder
+
+        Args:
+            spool: Whether to copy non-streamable input to a temporary file;
+                when off, `finish` needs a fallback file for such input
+            spool_memory_bytes: Size up to which the copy is kept in memory
+            max_samples: Optional number of samples to stop decoding after
+        """
+        self.spool = spool
+        self.spool_memory_bytes = spool_memory_bytes
+        self.max_samples = max_samples
+        self.mode: Optional[str] = None
+        self._head = bytearray()
+        self._native: Optional[bytearray] = None
+        self._native_limit: Optional[int] = None
+        self._spool: Optional[BinaryIO] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._output = bytearray()
+        self._errors = bytearray()
+        self._readers: list = []
+        self._pipe_closed = False
+        self.bytes_written = 0
+
+    def write(self, chunk: bytes) -> None:
+        """Feed the next bytes of the file; blocks while ffmpeg catches up
+
+        Raises:
+            FileNotFoundError: If the input needs ffmpeg and it is not installed
+        """
+        self.bytes_written += len(chunk)
+        if self.mode is None:
+            self._head.extend(chunk)
+            mode = _input_mode(self._head)
+            if mode is None and len(self._head) < self.MAX_HEAD_BYTES:
+                return
+            # Boxes that run on past the examined bytes may hide an index at the end
+            self._start(mode or "spool")
+            return
+        self._feed(chunk)
+
+    @property
+    def done(self) -> bool:
+        """Whether the decoder ignores further input, because it has enough or ffmpeg exited"""
+        if self.mode == "native":
+            return self._native_limit is not None and len(self._native) >= self._native_limit
+        return self._pipe_closed
+
+    def finish(self, fallback: Optional[BinaryIO] = None) -> np.ndarray:
+        """Wait for ffmpeg to decode everything written, and get the samples
+
+        Args:
+            fallback: Seekable copy of the input to decode from a temporary
+                file if it can't be decoded from the pipe
+
+        Returns:
+            np.ndarray: Float32 mono audio at 16kHz in the range [-1, 1]
+
+        Raises:
+            RuntimeError: If the audio cannot be decoded
+            FileNotFoundError: If the input needs ffmpeg and it is not installed
+        """
+        if self.mode is None:
+            # Input shorter than what it takes to tell
+            self._start(_input_mode(self._head) or "spool")
+
+        if self.mode == "native":
+            return AudioUtils.decode_audio_bytes(bytes(self._native), self.max_samples)
+        if self._spool is not None:
+            self._spool.seek(0)
+            fallback = self._spool
+        elif self._process is not None:
+            self._close_stdin()
+            self._process.wait()
+            for reader in self._readers:
+                reader.join()
+            if self._process.returncode == 0 and self._output:
+                return np.frombuffer(self._output, np.int16)[:self.max_samples].astype(np.float32) / 32768.0
+        if fallback is None:
+            raise RuntimeError(f"FFmpeg decoding failed: {self._errors.decode(errors='replace')}")
+        logger.debug("Decoding audio from a temporary file")
+        output = AudioUtils._decode_via_temp_file(self._command(), fallback).stdout
+        return np.frombuffer(output, np.int16)[:self.max_samples].astype(np.float32) / 32768.0
+
+    def close(self) -> None:
+        """Stop ffmpeg if it is still running and drop the buffered input"""
+        if self._process is not None:
+            self._close_stdin()
+            if self._process.poll() is None:
+                self._process.kill()
+                self._process.wait()
+        if self._spool is not None:
+            self._spool.close()
+        self._native = None
+
+    def _start(self, mode: str) -> None:
+        if mode == "spool" and not self.spool:
+            # The caller has the file to fall back on, so nothing is copied or piped
+            mode = "fallback"
+        self.mode = mode
+        if mode == "native":
+            self._native = bytearray()
+            if self.max_samples is not None:
+                self._native_limit = _native_byte_limit(self._head, self.max_samples)
+        elif mode == "spool":
+            self._spool = tempfile.SpooledTemporaryFile(max_size=self.spool_memory_bytes)
+        elif mode == "pipe":
+            self._process = subprocess.Popen(
+                self._command(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            # Both pipes are drained continuously, or ffmpeg would block on a full one
+            self._readers = [
+                threading.Thread(target=self._drain, args=(self._process.stdout, self._output), daemon=True),
+                threading.Thread(target=self._drain, args=(self._process.stderr, self._errors), daemon=True),
+            ]
+            for reader in self._readers:
+                reader.start()
+        head = bytes(self._head)
+        self._head = bytearray()
+        self._feed(head)
+
+    def _command(self) -> list:
+        return AudioUtils._limit_command(AudioUtils.ffmpeg_decode_command(), self.max_samples)
+
+    def _feed(self, chunk: bytes) -> None:
+        if self.mode == "native":
+            if self._native_limit is not None:
+                chunk = chunk[:max(0, self._native_limit - len(self._native))]
+            self._native.extend(chunk)
+        elif self._spool is not None:
+            self._spool.write(chunk)
+        elif not self._pipe_closed and self._process is not None:
+            try:
+                self._process.stdin.write(chunk)
+            except (BrokenPipeError, OSError):
+                # ffmpeg gave up on the input; finish() reports its error
+                self._pipe_closed = True
+
+    def _close_stdin(self) -> None:
+        if not self._pipe_closed:
+            self._pipe_closed = True
+            try:
+                self._process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    @staticmethod
+    def _drain(pipe, buffer: bytearray) -> None:
+        for chunk in iter(lambda: pipe.read(64 * 1024), b''):
+            buffer.extend(chunk)
+        pipe.close()
+
+
+def _input_mode(head: bytes) -> Optional[str]:
+    """Tell from the first bytes of a file how `FFmpegStreamDecoder` decodes it
+
+    Returns:
+        Optional[str]: `native` for WAV and FLAC at 16kHz, `spool` for MP4
+            with its index after the media data, `pipe` for anything else,
+            or None if more bytes are needed to tell
+    """
+    if len(head) < 12:
+        return None
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        # Chunks follow the header; the sample rate is in `fmt `
+        offset = 12
+        while offset + 8 <= len(head):
+            chunk_id, size = head[offset:offset + 4], int.from_bytes(head[offset + 4:offset + 8], 'little')
+            if chunk_id == b'fmt ':
+                if offset + 16 > len(head):
+                    return None
+                sample_rate = int.from_bytes(head[offset + 12:offset + 16], 'little')
+                return "native" if sample_rate == AudioUtils.WHISPER_SAMPLE_RATE else "pipe"
+            offset += 8 + size + size % 2
+        return None
+    if head[:4] == b'fLaC':
+        # STREAMINFO is the first metadata block; its sample rate is 20 bits at byte 10
+        if len(head) < 21:
+            return None
+        sample_rate = (head[18] << 12) | (head[19] << 4) | (head[20] >> 4)
+        return "native" if sample_rate == AudioUtils.WHISPER_SAMPLE_RATE else "pipe"
+    if head[4:8] == b'ftyp':
+        # Top-level boxes, until the index or the media data shows up
+        offset = 0
+        while offset + 8 <= len(head):
+            size, box = int.from_bytes(head[offset:offset + 4], 'big'), head[offset + 4:offset + 8]
+            if box == b'moov':
+                return "pipe"
+            if box == b'mdat':
+                return "spool"
+            if size == 1:
+                if offset + 16 > len(head):
+                    return None
+                size = int.from_bytes(head[offset + 8:offset + 16], 'big')
+            if size < 8:
+                return "spool"
+            offset += size
+        return None
+    return "pipe"
+
+
+def _native_byte_limit(head: bytes, samples: int) -> Optional[int]:
+    """Get how many bytes of a WAV or FLAC file hold its first `samples` samples
+
+    Returns:
+        Optional[int]: A byte count that is enough, or None if the header
+            in `head` doesn't tell
+    """
+    if head[:4] == b'RIFF':
+        offset, block_align = 12, None
+        while offset + 8 <= len(head):
+            chunk_id, size = head[offset:offset + 4], int.from_bytes(head[offset + 4:offset + 8], 'little')
+            if chunk_id == b'fmt ' and offset + 22 <= len(head):
+                block_align = int.from_bytes(head[offset + 20:offset + 22], 'little')
+            if chunk_id == b'data':
+                return None if not block_align else offset + 8 + samples * block_align
+            offset += 8 + size + size % 2
+        return None
+    if head[:4] == b'fLaC' and len(head) >= 22:
+        # STREAMINFO holds the largest block and the sample format; audio frames follow the last metadata block
+        max_block = int.from_bytes(head[10:12], 'big')
+        channels = ((head[20] >> 1) & 0x7) + 1
+        sample_bytes = ((((head[20] & 0x1) << 4) | (head[21] >> 4)) + 8) // 8
+        offset = 4
+        while offset + 4 <= len(head):
+            last, length = head[offset] & 0x80, int.from_bytes(head[offset + 1:offset + 4], 'big')
+            offset += 4 + length
+            if last:
+                # A frame is never much larger than its samples stored verbatim; allow twice that, plus a block
+                return offset + 2 * (samples + max_block) * channels * sample_bytes
+        return None
+    return None
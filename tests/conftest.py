@@ -0,0 +1,58 @@
+import os
+from unittest import mock
+import pytest
+import torch
+from whisper.model import ModelDimensions, Whisper
+
+
+def load_random_model(name=None, n_state=64, n_vocab=51865):
+    """Loads a randomly initialized Whisper model; no weights are downloaded.
+
+    Module level so it can serve as a ModelRegistry loader in spawned worker processes.
+    """
+    torch.manual_seed(0)
+    model = Whisper(ModelDimensions(
+        n_mels=80, n_audio_ctx=1500, n_audio_state=n_state, n_audio_head=2, n_audio_layer=1,
+        n_vocab=n_vocab, n_text_ctx=448, n_text_state=n_state, n_text_head=2, n_text_layer=1
+    ))
+    # Whisper leaves the decoder's positional embedding uninitialized, which can hold NaNs
+    torch.nn.init.normal_(model.decoder.positional_embedding, std=0.02)
+    return model
+
+
+def load_small_random_model(name=None):
+    """Random model big enough for its Linear layers to dominate the parameter count"""
+    return load_random_model(name, n_state=256, n_vocab=512)
+
+
+@pytest.fixture
+def tiny_random_model():
+    return load_random_model().eval()
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """`src.app` serving `StubWhisper` for every model
+
+    The server reads its settings when imported, so they are set up for the
+    tests just for the import.
+    """
+    from benchmarks.stub_model import stub_loader
+    settings = {
+        "JOBS_DIR": str(tmp_path_factory.mktemp("jobs")),
+        "WARMUP_AUDIO_SECONDS": "0",
+        "CACHE_ENABLED": "false",
+        "PROFILING_TOKEN": "test-token",
+        "DISCONNECT_POLL_SECONDS": "0.05",
+    }
+    with mock.patch.dict(os.environ, settings):
+        import src.app as app_module
+    app_module.model_registry.loader = stub_loader(encoder_ms=1, decoder_ms=5)
+    return app_module
+
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    from fastapi.testclient import TestClient
+    with TestClient(app_module.app) as client:
+        yield client
@@ -0,0 +1,232 @@
+import asyncio
+import io
+import json
+import zipfile
+import numpy as np
+import soundfile as sf
+from benchmarks.synthetic_audio import generate
+from src.server import serialization
+from src.server.serialization import JSON, MSGPACK
+from src.utils.audio_utils import AudioUtils
+
+
+def _wav_bytes(audio: np.ndarray, sample_rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+def test_streamed_16khz_wav_is_transcribed_without_ffmpeg(client, monkeypatch):
+    monkeypatch.setattr(AudioUtils, 'ffmpeg_decode_command', staticmethod(lambda: ['missing-ffmpeg', 'pipe:0']))
+    response = client.post(
+        "/transcribe", content=_wav_bytes(generate("speech", 3)),
+        headers={"content-type": "audio/wav"}, params={"language": "en"}
+    )
+    assert response.status_code == 200
+    assert response.json()["segments"][-1]["end"] == 3.0
+
+
+def test_streamed_audio_errors_are_client_or_service_errors(client, monkeypatch):
+    resampled = _wav_bytes(np.zeros(44100), sample_rate=44100)
+
+    monkeypatch.setattr(AudioUtils, 'ffmpeg_decode_command', staticmethod(lambda: ['missing-ffmpeg', 'pipe:0']))
+    response = client.post("/transcribe", content=resampled, headers={"content-type": "audio/wav"})
+    assert response.status_code == 503
+
+    # A decoder that rejects everything, like ffmpeg does for garbage
+    monkeypatch.setattr(AudioUtils, 'ffmpeg_decode_command', staticmethod(lambda: ['false', 'pipe:0']))
+    response = client.post("/transcribe", content=b"x" * 5000, headers={"content-type": "audio/mpeg"})
+    assert response.status_code == 400
+    assert client.post("/transcribe", content=b"", headers={"content-type": "audio/mpeg"}).status_code == 400
+
+
+def _events(body: str) -> list:
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+def test_stream_sends_an_event_per_decoded_window(client):
+    audio = _wav_bytes(generate("speech", 65, seed=3))
+    response = client.post("/transcribe/stream", files={"audio": ("a.wav", audio)}, data={"language": "en"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _events(response.text)
+    assert [event["window"] for event in events] == [0, 1, 2]
+    assert events[-1]["end"] == 65.0
+    transcript = client.post("/transcribe", files={"audio": ("a.wav", audio)}, data={"language": "en"}).json()
+    assert "".join(event["text"] for event in events) == transcript["text"]
+
+
+def test_jobs_are_queued_and_long_polled(client):
+    response = client.post("/jobs", files={"audio": ("a.wav", _wav_bytes(generate("speech", 5)))},
+                           data={"language": "en"})
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["location"] == f"/jobs/{job['id']}"
+    assert job["status"] in ("queued", "running") and job["duration"] == 5.0
+
+    finished = client.get(f"/jobs/{job['id']}", params={"wait": 10}).json()
+    assert finished["status"] == "completed" and finished["progress"] == 1
+    assert finished["result"]["segments"][-1]["end"] == 5.0
+    assert client.get("/jobs/does-not-exist").status_code == 404
+
+
+def test_websocket_sends_partials_and_a_final_transcript(client):
+    audio = (generate("speech", 3, seed=5) * 32767).astype('<i2').tobytes()
+    with client.websocket_connect("/ws/transcribe?language=en&dtype=int16") as websocket:
+        websocket.send_bytes(audio[:32000])
+        messages = [websocket.receive_json()]
+        websocket.send_bytes(audio[32000:])
+        websocket.send_text("stop")
+        while not messages or messages[-1]["type"] != "final":
+            messages.append(websocket.receive_json())
+
+    # The first second is decoded while the rest is still to come
+    assert messages[0] == {"type": "partial", "text": messages[0]["text"], "audio_seconds": 1.0}
+    assert {message["type"] for message in messages} <= {"partial", "commit", "final"}
+    assert messages[-1]["text"] and messages[-1]["audio_seconds"] == 3.0
+
+    with client.websocket_connect("/ws/transcribe?dtype=int24") as websocket:
+        assert websocket.receive_json()["type"] == "error"
+
+
+def _cancelled(client, reason: str) -> float:
+    for line in client.get("/metrics").text.splitlines():
+        if line.startswith(f'whisper_cancelled_total{{reason="{reason}"}}'):
+            return float(line.split()[-1])
+    return 0.0
+
+
+def test_expired_deadline_returns_504(client):
+    before = _cancelled(client, "deadline")
+    response = client.post(
+        "/transcribe", files={"audio": ("a.wav", _wav_bytes(generate("speech", 60)))},
+        headers={"X-Deadline-Ms": "1"}
+    )
+    assert response.status_code == 504
+    assert _cancelled(client, "deadline") == before + 1
+
+
+def test_client_disconnect_cancels_the_transcription(client, app_module):
+    body = generate("speech", 60).astype('<f4').tobytes()
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        # The whole body, then the client is gone
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/transcribe", "raw_path": b"/transcribe", "query_string": b"dtype=float32",
+        "root_path": "", "server": ("testserver", 80), "client": ("testclient", 50000),
+        "headers": [(b"host", b"testserver"), (b"content-type", b"application/octet-stream"),
+                    (b"content-length", str(len(body)).encode())],
+    }
+    before = _cancelled(client, "disconnect")
+    asyncio.run(app_module.app(scope, receive, send))
+
+    assert sent[0]["status"] == 499
+    assert _cancelled(client, "disconnect") == before + 1
+
+
+def test_batch_reports_a_status_per_file_as_json_and_ndjson(client, monkeypatch):
+    monkeypatch.setattr(AudioUtils, 'ffmpeg_decode_command', staticmethod(lambda: ['false', 'pipe:0']))
+    files = [
+        ("files", ("first.wav", _wav_bytes(generate("speech", 4, seed=1)))),
+        ("files", ("broken.mp3", b"x" * 2000)),
+        ("files", ("second.wav", _wav_bytes(generate("tone", 2, seed=2)))),
+    ]
+
+    results = client.post("/transcribe/batch", files=files, data={"language": "en"}).json()
+    assert [(result["filename"], result["status"]) for result in results] == [
+        ("first.wav", 200), ("broken.mp3", 400), ("second.wav", 200)
+    ]
+    assert results[0]["duration"] == 4.0 and results[0]["segments"][-1]["end"] == 4.0
+    assert "error" in results[1] and "text" not in results[1]
+
+    response = client.post("/transcribe/batch", files=files, data={"language": "en", "format": "ndjson"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted((line["index"], line["status"]) for line in lines) == [(0, 200), (1, 400), (2, 200)]
+    assert {line["index"]: line.get("text") for line in lines} == {
+        result["index"]: result.get("text") for result in results
+    }
+
+
+def test_batch_archives_are_expanded_within_the_upload_budget(client, app_module, monkeypatch):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("clips/a.wav", _wav_bytes(generate("speech", 3, seed=1)))
+        zip_file.writestr("clips/b.wav", _wav_bytes(generate("tone", 2, seed=2)))
+    files = [("files", ("clips.zip", archive.getvalue()))]
+
+    results = client.post("/transcribe/batch", files=files, data={"language": "en"}).json()
+    assert [(result["filename"], result["status"], result["duration"]) for result in results] == [
+        ("clips/a.wav", 200, 3.0), ("clips/b.wav", 200, 2.0)
+    ]
+    assert app_module.upload_budget.stats()["in_flight_bytes"] == 0
+
+    # The entries don't fit in the budget next to the request body
+    monkeypatch.setattr(app_module.upload_budget, "max_bytes", len(archive.getvalue()) + 1000)
+    response = client.post("/transcribe/batch", files=files, data={"language": "en"})
+    assert response.status_code == 429 and "Retry-After" in response.headers
+    assert app_module.upload_budget.stats()["in_flight_bytes"] == 0
+
+
+def test_language_detection_decodes_only_the_first_30_seconds(client, app_module, monkeypatch):
+    lengths = []
+
+    def detect(audio, model_name, options):
+        lengths.append(len(audio))
+        return {"language": "en", "probabilities": {"en": 1.0}, "timings": {}}
+
+    monkeypatch.setattr(app_module, "detect_language_pcm", detect)
+    monkeypatch.setattr(AudioUtils, 'ffmpeg_decode_command', staticmethod(lambda: ['missing-ffmpeg', 'pipe:0']))
+    audio = generate("speech", 90, seed=1)
+
+    requests = [
+        {"content": _wav_bytes(audio), "headers": {"content-type": "audio/wav"}},
+        {"content": audio.tobytes(), "headers": {"content-type": "application/octet-stream"}},
+        {"files": {"audio": ("a.wav", _wav_bytes(audio))}},
+    ]
+    for kwargs in requests:
+        response = client.post("/detect-language", **kwargs)
+        assert response.status_code == 200 and response.json()["language"] == "en"
+    assert lengths == [30 * 16000] * 3
+
+
+def test_profiling_needs_the_admin_token(client):
+    audio = {"audio": ("a.wav", _wav_bytes(generate("speech", 2)))}
+    assert client.post("/transcribe?profile=1", files=audio).status_code == 403
+    assert client.post("/transcribe?profile=1", files=audio, headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    response = client.post("/transcribe?profile=1", files=audio, headers={"X-Admin-Token": "test-token"})
+    assert response.status_code == 200
+    profile = response.json()["profile"]
+    assert profile["profiler"] == "cprofile" and profile["windows"] == 1
+    assert "profile" not in client.post("/transcribe", files=audio).json()
+
+
+def test_unacceptable_response_types_get_406(client):
+    audio = {"audio": ("a.wav", _wav_bytes(generate("speech", 2)))}
+    assert client.post("/transcribe", files=audio, headers={"Accept": "text/html"}).status_code == 406
+    response = client.post("/transcribe", files=audio, headers={"Accept": "application/json;q=0, */*"})
+    if serialization.msgpack is None:
+        assert response.status_code == 406
+    else:
+        assert response.headers["content-type"] == MSGPACK
+    response = client.post("/transcribe", files=audio, headers={"Accept": "text/html, */*;q=0.1"})
+    assert response.status_code == 200 and response.headers["content-type"].startswith(JSON)
+
+
+def test_full_inference_queue_returns_429_with_retry_after(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.inference_executor, "max_queue_size", 0)
+    audio = {"audio": ("a.wav", _wav_bytes(generate("speech", 2, seed=9)))}
+    for path in ("/transcribe", "/transcribe/stream"):
+        response = client.post(path, files=audio, headers={"Cache-Control": "no-store"})
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
@@ -0,0 +1,64 @@
+import io
+import tarfile
+import zipfile
+import pytest
+from src.server.archives import extract_files, is_archive
+
+
+def zip_bytes(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def read_all(files):
+    return [(name, file.read()) for name, file in files]
+
+
+def test_zip_and_tar_files_are_extracted_without_metadata():
+    data = zip_bytes([("clips/a.wav", b"aaa"), ("__MACOSX/clips/._a.wav", b"x"), ("clips/._b.wav", b"x"),
+                      ("clips/b.wav", b"bb")])
+    assert is_archive(data)
+    assert read_all(extract_files(data, max_files=10, max_bytes=100)) == [("clips/a.wav", b"aaa"), ("clips/b.wav", b"bb")]
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        info = tarfile.TarInfo("c.wav")
+        info.size = 3
+        archive.addfile(info, io.BytesIO(b"ccc"))
+    assert is_archive(buffer)
+    assert buffer.tell() == 0
+    assert read_all(extract_files(buffer, max_files=10, max_bytes=100)) == [("c.wav", b"ccc")]
+
+    assert not is_archive(b"RIFF\x00\x00\x00\x00WAVEfmt ")
+
+
+def test_archive_limits_are_enforced_before_inflating():
+    data = zip_bytes([("a.wav", b"a"), ("b.wav", b"b")])
+    with pytest.raises(ValueError, match="more than 1 files"):
+        extract_files(data, max_files=1, max_bytes=100)
+
+    bomb = zip_bytes([("big.wav", b"\0" * 10_000)])
+    assert len(bomb) < 1000
+    with pytest.raises(ValueError, match="exceed"):
+        extract_files(bomb, max_files=10, max_bytes=1000)
+
+
+def test_files_are_copied_out_of_the_archive_as_they_are_reserved():
+    data = zip_bytes([("a.wav", b"a" * 2000), ("b.wav", b"b" * 10)])
+    reserved = []
+
+    files = extract_files(io.BytesIO(data), max_files=10, max_bytes=10_000, reserve=reserved.append,
+                          spool_memory_bytes=1000)
+    assert reserved == [2000, 10]
+    # Copies larger than the memory limit are moved to disk
+    assert [file._rolled for _, file in files] == [True, False]
+    assert read_all(files) == [("a.wav", b"a" * 2000), ("b.wav", b"b" * 10)]
+
+    def refuse(size):
+        raise RuntimeError("budget exhausted")
+
+    with pytest.raises(RuntimeError, match="budget"):
+        extract_files(data, max_files=10, max_bytes=10_000, reserve=refuse)
@@ -0,0 +1,161 @@
+import io
+import shutil
+import tempfile
+import pytest
+import numpy as np
+import soundfile as sf
+from src.utils.audio_utils import AudioUtils, FFmpegStreamDecoder, _input_mode
+
+
+def _wav_bytes(audio: np.ndarray, sample_rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format='WAV', subtype='PCM_16')
+    return buffer.getvalue()
+
+
+def test_decode_wav_bytes_without_temp_file():
+    tone = 0.5 * np.sin(2 * np.pi * 440 * np.arange(16000) / 16000)
+    audio = AudioUtils.decode_audio_bytes(_wav_bytes(tone))
+
+    assert audio.dtype == np.float32
+    assert audio.shape == (16000,)
+    assert np.allclose(audio, tone, atol=1e-3)
+
+
+def test_decode_stereo_wav_bytes_downmixes_to_mono():
+    left = np.full(1600, 0.25)
+    right = np.full(1600, -0.75)
+    audio = AudioUtils.decode_audio_bytes(_wav_bytes(np.stack([left, right], axis=1)))
+
+    assert audio.shape == (1600,)
+    assert np.allclose(audio, -0.25, atol=1e-3)
+
+
+def test_decode_skips_reading_samples_at_other_rates(monkeypatch):
+    reads = []
+    monkeypatch.setattr(sf.SoundFile, 'read', lambda self, *args, **kwargs: reads.append(self.samplerate))
+    assert AudioUtils._read_native(io.BytesIO(_wav_bytes(np.zeros(4410), sample_rate=44100))) is None
+    assert reads == []
+
+def test_decode_spooled_wav_file():
+    tone = 0.5 * np.sin(2 * np.pi * 440 * np.arange(32000) / 16000)
+    with tempfile.SpooledTemporaryFile(max_size=1024) as file:
+        file.write(_wav_bytes(tone))
+        file.seek(0)
+        audio = AudioUtils.decode_audio_file(file)
+
+    assert audio.shape == (32000,)
+    assert np.allclose(audio, tone, atol=1e-3)
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg is not installed")
+def test_stream_decoder_resamples_chunks_as_they_arrive():
+    tone = 0.5 * np.sin(2 * np.pi * 440 * np.arange(44100) / 44100)
+    data = _wav_bytes(tone, sample_rate=44100)
+    decoder = FFmpegStreamDecoder()
+    try:
+        for start in range(0, len(data), 4096):
+            decoder.write(data[start:start + 4096])
+        audio = decoder.finish()
+    finally:
+        decoder.close()
+
+    assert abs(len(audio) - 16000) <= 160
+    assert 0.4 < np.abs(audio).max() < 0.6
+
+
+def _flac_bytes(audio: np.ndarray, sample_rate: int) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, sample_rate, format='FLAC')
+    return buffer.getvalue()
+
+
+def _mp4_head(*boxes: bytes) -> bytes:
+    ftyp = (16).to_bytes(4, 'big') + b'ftypisom' + b'\x00' * 4
+    return ftyp + b''.join((1024).to_bytes(4, 'big') + box for box in boxes)
+
+
+def test_input_mode_is_told_from_the_first_bytes():
+    wav = _wav_bytes(np.zeros(1600))
+    assert _input_mode(wav[:8]) is None
+    assert _input_mode(wav[:44]) == "native"
+    assert _input_mode(_wav_bytes(np.zeros(4410), sample_rate=44100)[:44]) == "pipe"
+    assert _input_mode(_flac_bytes(np.zeros(1600), 16000)) == "native"
+    assert _input_mode(_flac_bytes(np.zeros(4800), 48000)) == "pipe"
+    # MP4 streams from a pipe only with its index first
+    assert _input_mode(_mp4_head(b'moov')[:32]) == "pipe"
+    assert _input_mode(_mp4_head(b'mdat')[:32]) == "spool"
+    assert _input_mode(_mp4_head()) is None
+    assert _input_mode(b'ID3\x04' + b'\x00' * 20) == "pipe"
+
+
+def test_stream_decoder_reads_16khz_wav_without_ffmpeg(monkeypatch):
+    monkeypatch.setattr(AudioUtils, 'ffmpeg_decode_command', staticmethod(lambda: ['missing-ffmpeg', 'pipe:0']))
+    tone = 0.5 * np.sin(2 * np.pi * 440 * np.arange(16000) / 16000)
+    data = _wav_bytes(tone)
+    decoder = FFmpegStreamDecoder()
+    try:
+        for start in range(0, len(data), 5):
+            decoder.write(data[start:start + 5])
+        audio = decoder.finish()
+    finally:
+        decoder.close()
+
+    assert decoder.mode == "native" and decoder.bytes_written == len(data)
+    assert np.allclose(audio, tone, atol=1e-3)
+
+
+@pytest.mark.parametrize("encode", [_wav_bytes, lambda audio: _flac_bytes(audio, 16000)])
+def test_stream_decoder_stops_collecting_after_max_samples(encode, monkeypatch):
+    monkeypatch.setattr(AudioUtils, 'ffmpeg_decode_command', staticmethod(lambda: ['missing-ffmpeg', 'pipe:0']))
+    audio = (np.random.default_rng(0).standard_normal(16000 * 60) * 0.1).clip(-1, 1)
+    data = encode(audio)
+    decoder = FFmpegStreamDecoder(max_samples=16000 * 5)
+    try:
+        written = 0
+        while not decoder.done:
+            decoder.write(data[written:written + 64 * 1024])
+            written += 64 * 1024
+        decoded = decoder.finish()
+    finally:
+        decoder.close()
+
+    assert written < len(data) / 2
+    assert np.allclose(decoded, audio[:16000 * 5], atol=1e-3)
+    # ffmpeg is told to stop too
+    assert AudioUtils._limit_command(AudioUtils.ffmpeg_decode_command(), 16000 * 30) == [
+        'missing-ffmpeg', '-t', '30', 'pipe:0'
+    ]
+
+
+def test_stream_decoder_reports_a_missing_ffmpeg(monkeypatch):
+    monkeypatch.setattr(AudioUtils, 'ffmpeg_decode_command', staticmethod(lambda: ['missing-ffmpeg', 'pipe:0']))
+    decoder = FFmpegStreamDecoder()
+    try:
+        with pytest.raises(FileNotFoundError):
+            decoder.write(_wav_bytes(np.zeros(4410), sample_rate=44100))
+    finally:
+        decoder.close()
+
+def test_pcm_from_bytes_wraps_float32_without_copy():
+    samples = np.linspace(-1, 1, 320, dtype='<f4')
+    body = bytearray(samples.tobytes())
+    audio = AudioUtils.pcm_from_bytes(body, dtype='float32')
+
+    assert np.shares_memory(audio, np.frombuffer(body, dtype='<f4'))
+    assert np.array_equal(audio, samples)
+
+
+def test_pcm_from_bytes_scales_int16_and_downmixes():
+    frames = np.array([[16384, -16384], [32767, 32767]], dtype='<i2')
+    audio = AudioUtils.pcm_from_bytes(frames.tobytes(), dtype='int16', channels=2)
+
+    assert audio.dtype == np.float32
+    assert np.allclose(audio, [0.0, 32767 / 32768])
+
+
+def test_pcm_from_bytes_rejects_truncated_data():
+    with pytest.raises(ValueError):
+        AudioUtils.pcm_from_bytes(b'\x00' * 7, dtype='float32')
+    with pytest.raises(ValueError):
+        AudioUtils.pcm_from_bytes(b'\x00' * 8, dtype='float64')
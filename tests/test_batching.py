@@ -0,0 +1,133 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+import torch
+from whisper.decoding import DecodingOptions
+from benchmarks.stub_model import StubWhisper
+from benchmarks.synthetic_audio import generate
+from src.server.batching import DecodeBatcher
+from src.server.transcriber import TranscriptionOptions, decode_windows, transcribe
+
+
+class RecordingModel:
+    """Stand-in model that records the batch sizes it was asked to encode and decode"""
+
+    dims = SimpleNamespace(n_text_ctx=448)
+
+    def __init__(self):
+        self.encoder_batch_sizes = []
+        self.batch_sizes = []
+        self.prompts = []
+
+    def embed_audio(self, mel):
+        self.encoder_batch_sizes.append(mel.shape[0])
+        return mel
+
+    def decode(self, mel, options):
+        return self.decode_windows(mel, [options] * mel.shape[0])
+
+    def decode_windows(self, mel, options):
+        self.batch_sizes.append(mel.shape[0])
+        self.prompts.append([window_options.prompt for window_options in options])
+        return [(window_options.language, mel[i, 0, 0].item()) for i, window_options in enumerate(options)]
+
+
+def _decode_concurrently(batcher, requests):
+    results = [None] * len(requests)
+    # Every request is active before the first window is submitted
+    started = threading.Barrier(len(requests))
+
+    def run(i, value, options):
+        with batcher.session():
+            started.wait()
+            mel = torch.full((80, 3000), float(value))
+            results[i] = batcher.decode(mel, options)
+
+    sessions = [threading.Thread(target=run, args=(i, *request)) for i, request in enumerate(requests)]
+    for thread in sessions:
+        thread.start()
+    for thread in sessions:
+        thread.join()
+    return results
+
+
+def test_concurrent_windows_are_decoded_as_one_batch():
+    model = RecordingModel()
+    batcher = DecodeBatcher(model, max_batch_size=8, max_wait_ms=500)
+    batcher.start()
+    try:
+        results = _decode_concurrently(batcher, [(i, DecodingOptions(language="en")) for i in range(4)])
+    finally:
+        batcher.shutdown()
+
+    # Each request gets its own window back
+    assert results == [("en", float(i)) for i in range(4)]
+    assert sum(model.batch_sizes) == 4
+    assert max(model.batch_sizes) > 1
+    assert batcher.stats()["windows"] == 4
+
+
+def test_windows_with_different_prompts_and_languages_share_the_decoder():
+    model = RecordingModel()
+    batcher = DecodeBatcher(model, max_batch_size=8, max_wait_ms=500)
+    batcher.start()
+    try:
+        results = _decode_concurrently(batcher, [
+            (0, DecodingOptions(language="en", prompt=[1, 2, 3])),
+            (1, DecodingOptions(language="de", prompt=[4, 5])),
+            (2, DecodingOptions(language="en", prompt=[6, 7], temperature=0.2)),
+        ])
+    finally:
+        batcher.shutdown()
+
+    assert results == [("en", 0.0), ("de", 1.0), ("en", 2.0)]
+    # One encoder pass; the decoder runs once per temperature
+    assert model.encoder_batch_sizes == [3]
+    assert sorted(model.batch_sizes) == [1, 2]
+    # Prompts are trimmed to their most recent 2^k tokens
+    assert sorted(sorted(prompts) for prompts in model.prompts) == [[[2, 3], [4, 5]], [[6, 7]]]
+    assert batcher.stats()["encoder_batches"] == 1
+
+
+def test_concurrent_long_clips_keep_batching_after_the_first_window():
+    model = StubWhisper(encoder_ms=0, decoder_ms=20, words_per_window=120)
+    batcher = DecodeBatcher(model, max_batch_size=8, max_wait_ms=500)
+    batcher.start()
+    try:
+        clips = [generate("speech", 95, seed=i) for i in range(2)]
+        options = TranscriptionOptions(language="en", temperature=(0.0,), condition_on_previous_text=True)
+        with ThreadPoolExecutor(2) as pool:
+            results = list(pool.map(lambda clip: transcribe(batcher, clip, options), clips))
+    finally:
+        batcher.shutdown()
+
+    assert all(result["segments"][-1]["end"] == 95.0 for result in results)
+    stats = batcher.stats()
+    # Four windows per clip, each decoded alongside the other clip's window despite their prompts
+    assert stats["windows"] == 8
+    assert stats["batches"] == 4
+    assert stats["largest_batch"] == 2
+
+
+def test_windows_decoded_together_match_one_by_one(tiny_random_model):
+    torch.manual_seed(1)
+    mel = torch.randn(2, 80, 3000)
+    options = [
+        DecodingOptions(language="en", prompt=[440, 441, 442, 443], sample_len=8, without_timestamps=True),
+        DecodingOptions(language="de", prompt=[1000, 1001, 1002, 1003], sample_len=8, without_timestamps=True),
+    ]
+    with torch.no_grad():
+        audio_features = tiny_random_model.embed_audio(mel)
+        batched = decode_windows(tiny_random_model, audio_features, options)
+        single = [tiny_random_model.decode(audio_features[i:i + 1], options[i])[0] for i in range(2)]
+
+    assert [result.tokens for result in batched] == [result.tokens for result in single]
+    assert [result.language for result in batched] == ["en", "de"]
+    assert [result.avg_logprob for result in batched] == pytest.approx([result.avg_logprob for result in single], abs=1e-4)
+
+
+def test_windows_decoded_together_need_prompts_of_the_same_length(tiny_random_model):
+    options = [DecodingOptions(language="en", prompt=[1, 2]), DecodingOptions(language="en", prompt=[1, 2, 3])]
+    with pytest.raises(ValueError):
+        decode_windows(tiny_random_model, torch.zeros(2, 1500, 64), options)
@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from benchmarks.stub_model import StubWhisper
+from benchmarks.synthetic_audio import GENERATORS, generate
+from src.server.batching import DecodeBatcher
+from src.server.transcriber import ModelDecoder, TranscriptionOptions, decoding_settings, transcribe
+
+
+@pytest.mark.parametrize("kind", list(GENERATORS))
+def test_synthetic_audio_is_reproducible(kind):
+    audio = generate(kind, 3.5, seed=7)
+    assert audio.dtype == np.float32 and len(audio) == 3.5 * 16000
+    assert 0 < np.abs(audio).max() <= 1
+    assert np.array_equal(audio, generate(kind, 3.5, seed=7))
+    assert not np.array_equal(audio, generate(kind, 3.5, seed=8))
+
+
+def test_stub_model_transcribes_deterministically_with_its_latency():
+    decoder = ModelDecoder(StubWhisper(encoder_ms=20, decoder_ms=30).eval())
+    audio = generate("speech", 45, seed=1)
+
+    started = time.perf_counter()
+    result = transcribe(decoder, audio, TranscriptionOptions(language="en", temperature=(0.0,)))
+    elapsed = time.perf_counter() - started
+
+    assert [(s["start"], s["end"]) for s in result["segments"]] == [(0.0, 30.0), (30.0, 45.0)]
+    assert result["text"].split()
+    assert transcribe(decoder, audio, TranscriptionOptions(language="en"))["text"] == result["text"]
+    # Two windows of 20 ms encoding and 30 ms decoding
+    assert elapsed >= 0.1
+
+
+def test_stub_model_batches_concurrent_requests():
+    model = StubWhisper(encoder_ms=0, decoder_ms=100, batch_overhead=0.25)
+    batcher = DecodeBatcher(model, max_batch_size=4, max_wait_ms=500)
+    batcher.start()
+    clips = [generate("tone", 5, seed=i) for i in range(4)]
+    options = TranscriptionOptions(language="en", temperature=(0.0,))
+    # Every request is active before the first window is submitted
+    started = threading.Barrier(len(clips))
+
+    def run(clip):
+        with batcher.session():
+            started.wait()
+            return transcribe(batcher, clip, options)
+
+    try:
+        with ThreadPoolExecutor(len(clips)) as pool:
+            results = list(pool.map(run, clips))
+    finally:
+        batcher.shutdown()
+
+    assert all(result["segments"][0]["end"] == 5.0 for result in results)
+    stats = batcher.stats()
+    assert stats["windows"] == len(clips)
+    assert stats["largest_batch"] > 1 and stats["batches"] < len(clips)
+
+
+def test_stub_model_reflects_the_cost_of_decoding_presets():
+    decoder = ModelDecoder(StubWhisper(encoder_ms=0, decoder_ms=20, fallback_rate=1.0).eval())
+    audio = generate("speech", 10, seed=1)
+
+    def run(preset):
+        started = time.perf_counter()
+        result = transcribe(decoder, audio, TranscriptionOptions(language="en", **decoding_settings(preset)))
+        return result, time.perf_counter() - started
+
+    fast, fast_seconds = run("fast")
+    balanced, _ = run("balanced")
+    accurate, accurate_seconds = run("accurate")
+
+    assert fast["decoding"] == {"windows": 1, "fallbacks": 0} and len(set(fast["text"].split())) == 1
+    # Every window falls back once, and the retry at temperature 0.2 isn't degenerate
+    assert balanced["decoding"] == {"windows": 1, "fallbacks": 1}
+    assert len(set(balanced["text"].split())) > 1 and accurate["text"] == balanced["text"]
+    # Five beams and five samples cost like two batches of five windows
+    assert accurate_seconds > 2 * fast_seconds
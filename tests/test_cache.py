@@ -0,0 +1,51 @@
+import numpy as np
+from src.server.cache import TranscriptionCache
+from src.server.transcriber import TranscriptionOptions
+
+
+def _result(text):
+    return {"text": text, "segments": [{"start": 0.0, "end": 1.0, "text": text}], "language": "en"}
+
+
+def test_key_depends_on_audio_model_and_options():
+    audio = np.zeros(1600, dtype=np.float32)
+    key = TranscriptionCache.make_key(audio, "base", TranscriptionOptions())
+
+    assert key == TranscriptionCache.make_key(audio.copy(), "base", TranscriptionOptions())
+    assert key != TranscriptionCache.make_key(audio + 0.1, "base", TranscriptionOptions())
+    assert key != TranscriptionCache.make_key(audio, "small", TranscriptionOptions())
+    assert key != TranscriptionCache.make_key(audio, "base", TranscriptionOptions(language="de"))
+
+
+def test_memory_tier_evicts_least_recently_used():
+    entry_size = len('{"text": "a", "segments": [{"start": 0.0, "end": 1.0, "text": "a"}], "language": "en"}')
+    cache = TranscriptionCache(max_memory_bytes=2 * entry_size)
+    cache.put("a", _result("a"))
+    cache.put("b", _result("b"))
+    assert cache.get("a")["text"] == "a"
+
+    # "b" is now the least recently used entry
+    cache.put("c", _result("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+    stats = cache.stats()
+    assert stats["memory_hits"] == 3
+    assert stats["misses"] == 1
+
+
+def test_disk_tier_survives_restart_and_expires(tmp_path):
+    db_path = tmp_path / "cache.db"
+    cache = TranscriptionCache(disk_path=db_path)
+    cache.put("key", _result("persisted"))
+    cache.close()
+
+    reopened = TranscriptionCache(disk_path=db_path)
+    assert reopened.get("key")["text"] == "persisted"
+    assert reopened.stats()["disk_hits"] == 1
+    reopened.close()
+
+    expired = TranscriptionCache(disk_path=db_path, ttl_seconds=-1)
+    assert expired.get("key") is None
+    expired.close()
@@ -0,0 +1,54 @@
+import os
+import threading
+import pytest
+from src.server.cpu import available_cores, parse_cores, pin_current_thread, plan_layout
+
+
+def test_auto_layout_reserves_cores_and_partitions_the_rest():
+    layout = plan_layout(workers=3, affinity="auto", reserved_cores=1, cores=list(range(8)))
+
+    assert layout.api_cores == [0]
+    assert [slot.cores for slot in layout.workers] == [[1, 2, 3], [4, 5], [6, 7]]
+    assert [slot.threads for slot in layout.workers] == [3, 2, 2]
+
+    # More workers than cores: nothing reserved, cores are shared
+    crowded = plan_layout(workers=3, affinity="auto", cores=[0, 1])
+    assert crowded.api_cores is None
+    assert [slot.cores for slot in crowded.workers] == [[0], [1], [0]]
+
+
+def test_manual_layout_is_validated():
+    assert parse_cores("0-2, 5") == [0, 1, 2, 5]
+
+    layout = plan_layout(workers=2, affinity="0-1;2-3", threads_per_worker=1, cores=list(range(6)))
+    assert layout.mode == "manual"
+    assert [slot.cores for slot in layout.workers] == [[0, 1], [2, 3]]
+    assert [slot.threads for slot in layout.workers] == [1, 1]
+    assert layout.api_cores == [4, 5]
+
+    with pytest.raises(ValueError):
+        plan_layout(workers=3, affinity="0-1;2-3", cores=list(range(6)))
+    with pytest.raises(ValueError):
+        plan_layout(workers=1, affinity="8", cores=list(range(6)))
+
+
+def test_off_layout_only_budgets_threads():
+    layout = plan_layout(workers=2, affinity="off", cores=list(range(8)))
+    assert layout.api_cores is None
+    assert [(slot.cores, slot.threads) for slot in layout.workers] == [(None, 4), (None, 4)]
+
+
+@pytest.mark.skipif(not hasattr(os, "sched_setaffinity"), reason="CPU affinity is Linux only")
+def test_pinning_applies_to_the_calling_thread():
+    core = available_cores()[-1]
+    seen = []
+
+    def run():
+        pin_current_thread([core])
+        seen.append(os.sched_getaffinity(0))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+    assert seen == [{core}]
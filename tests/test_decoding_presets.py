@@ -0,0 +1,34 @@
+import pytest
+from src.server.transcriber import DECODING_PRESETS, TranscriptionOptions, decoding_settings
+
+
+def test_presets_resolve_to_options_with_overrides():
+    assert TranscriptionOptions(**decoding_settings("balanced")) == TranscriptionOptions()
+    fast = decoding_settings("fast")
+    assert fast["temperature"] == (0.0,) and fast["condition_on_previous_text"] is False
+
+    settings = decoding_settings(
+        "accurate", beam_size="3", temperature="0, 0.5", logprob_threshold="none", condition_on_previous_text="false"
+    )
+    assert settings["beam_size"] == 3 and settings["best_of"] == DECODING_PRESETS["accurate"]["best_of"]
+    assert settings["temperature"] == (0.0, 0.5)
+    assert settings["logprob_threshold"] is None and settings["condition_on_previous_text"] is False
+    # Jobs store the settings as JSON, with the temperatures as a list
+    assert TranscriptionOptions(**{**settings, "temperature": [0.0, 0.5]}).temperature == (0.0, 0.5)
+
+
+@pytest.mark.parametrize("preset, overrides", [
+    ("turbo", {}),
+    ("balanced", {"beam_size": "0"}),
+    ("balanced", {"best_of": "11"}),
+    ("balanced", {"patience": "1.5"}),
+    ("balanced", {"temperature": "0.4,0.2"}),
+    ("balanced", {"temperature": "1.5"}),
+    ("balanced", {"no_speech_threshold": "2"}),
+    ("balanced", {"compression_ratio_threshold": "nan"}),
+    ("balanced", {"condition_on_previous_text": "maybe"}),
+    ("balanced", {"fp16": "true"}),
+])
+def test_invalid_settings_are_rejected(preset, overrides):
+    with pytest.raises(ValueError):
+        decoding_settings(preset, **overrides)
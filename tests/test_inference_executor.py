@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.server.inference import CancelToken, InferenceExecutor, JobCancelled, QueueFullError
+
+
+def test_run_executes_off_event_loop():
+    executor = InferenceExecutor(workers=1, max_queue_size=2)
+    executor.start()
+    try:
+        loop_thread = threading.get_ident()
+        worker_thread = asyncio.run(executor.run(threading.get_ident))
+        assert worker_thread != loop_thread
+        assert executor.stats()["completed"] == 1
+    finally:
+        executor.shutdown()
+
+
+def test_submit_rejects_when_queue_is_full():
+    executor = InferenceExecutor(workers=1, max_queue_size=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_job():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    executor.start()
+    try:
+        running = executor.submit(blocking_job)
+        assert started.wait(5)
+        queued = executor.submit(blocking_job)
+
+        with pytest.raises(QueueFullError) as exc_info:
+            executor.submit(blocking_job)
+        assert exc_info.value.retry_after >= 1
+
+        stats = executor.stats()
+        assert stats["queue_depth"] == 1
+        assert stats["running"] == 1
+        assert stats["rejected"] == 1
+
+        release.set()
+        assert running.result(5) == "done"
+        assert queued.result(5) == "done"
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_exceptions_propagate_to_caller():
+    executor = InferenceExecutor(workers=1, max_queue_size=1)
+    executor.start()
+
+    def failing_job():
+        raise RuntimeError("boom")
+
+    try:
+        with pytest.raises(RuntimeError, match="boom"):
+            asyncio.run(executor.run(failing_job))
+        assert executor.stats()["failed"] == 1
+    finally:
+        executor.shutdown()
+
+
+def _run_in_order(executor, jobs, gap=0.0):
+    """Block the only worker, queue `jobs` as (name, cost, priority) and return the order they ran in"""
+    release = threading.Event()
+    started = threading.Event()
+    order = []
+
+    def blocking_job():
+        started.set()
+        release.wait(5)
+
+    executor.start()
+    try:
+        futures = [executor.submit(blocking_job)]
+        assert started.wait(5)
+        for name, cost, priority in jobs:
+            futures.append(executor.submit(order.append, name, cost=cost, priority=priority))
+            time.sleep(gap)
+        release.set()
+        for future in futures:
+            future.result(5)
+    finally:
+        release.set()
+        executor.shutdown()
+    return order
+
+
+def test_shortest_job_runs_first_within_its_priority():
+    executor = InferenceExecutor(workers=1, max_queue_size=8, aging_rate=0)
+    order = _run_in_order(executor, [
+        ("podcast", 5400, "normal"),
+        ("dictation", 3, "normal"),
+        ("urgent", 60, "interactive"),
+        ("nightly", 10, "batch"),
+        ("same length", 3, "normal"),
+    ])
+    # interactive 60s weighs 15, batch 10s weighs 40; equal scores keep submission order
+    assert order == ["dictation", "same length", "urgent", "nightly", "podcast"]
+
+
+def test_waiting_jobs_age_past_newer_short_ones():
+    executor = InferenceExecutor(workers=1, max_queue_size=4, aging_rate=10000)
+    order = _run_in_order(executor, [("long", 100, "normal"), ("short", 1, "normal")], gap=0.05)
+    # The 50 ms "long" waited longer are worth 500 cost units, more than its head start
+    assert order == ["long", "short"]
+
+    with pytest.raises(ValueError):
+        InferenceExecutor(workers=1).submit(print, priority="urgent")
+
+
+def test_cancelled_work_is_counted_apart_from_failures():
+    executor = InferenceExecutor(workers=1, max_queue_size=2)
+    cancel = CancelToken(deadline=time.monotonic() + 0.05)
+    assert not cancel.cancelled()
+    time.sleep(0.06)
+
+    executor.start()
+    try:
+        with pytest.raises(JobCancelled, match="deadline"):
+            asyncio.run(executor.run(cancel.raise_if_cancelled))
+        stats = executor.stats()
+        assert (stats["cancelled"], stats["failed"]) == (1, 0)
+    finally:
+        executor.shutdown()
+
+
+def test_cancelled_queued_jobs_free_their_queue_slots():
+    executor = InferenceExecutor(workers=1, max_queue_size=1)
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_job():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    executor.start()
+    try:
+        running = executor.submit(blocking_job)
+        assert started.wait(5)
+        abandoned = executor.submit(blocking_job)
+        assert abandoned.cancel()
+
+        # The abandoned job neither fills the queue nor adds to the backlog
+        assert executor.stats()["queue_depth"] == 0
+        queued = executor.submit(blocking_job)
+        assert executor.stats()["cancelled"] == 1
+
+        release.set()
+        assert running.result(5) == queued.result(5) == "done"
+    finally:
+        release.set()
+        executor.shutdown()
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+import numpy as np
+from src.server.inference import QueueFullError
+from src.server.jobs import COMPLETED, FAILED, QUEUED, RUNNING, JobRunner, JobStore
+
+
+def test_jobs_survive_a_restart(tmp_path):
+    store = JobStore(tmp_path)
+    queued = store.create(np.zeros(16000, dtype=np.float32), "base", {"vad": True})
+    interrupted = store.create(np.ones(8000, dtype=np.float32), "base")
+    assert store.claim_next()["id"] == queued["id"]
+    store.close()
+
+    store = JobStore(tmp_path)
+    assert store.get(queued["id"])["status"] == RUNNING
+    assert store.requeue_interrupted() == 1
+    assert store.stats()[QUEUED] == 2
+    assert store.get(queued["id"])["params"] == {"vad": True}
+    assert store.get(interrupted["id"])["duration"] == 0.5
+    assert len(store.load_audio(interrupted["id"])) == 8000
+    store.close()
+
+
+def test_finished_jobs_beyond_the_limit_are_purged(tmp_path):
+    store = JobStore(tmp_path)
+    ids = []
+    for _ in range(3):
+        job = store.create(np.zeros(160, dtype=np.float32), "base")
+        store.claim_next()
+        store.complete(job["id"], {"text": ""})
+        ids.append(job["id"])
+        time.sleep(0.01)
+
+    assert store.purge(retention_seconds=None, max_finished=2) == 1
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2])["result"] == {"text": ""}
+    # Audio is only kept while the job is pending
+    assert list(store.audio_dir.iterdir()) == []
+    store.close()
+
+
+def test_runner_drains_the_queue_and_wakes_long_polls(tmp_path):
+    store = JobStore(tmp_path)
+    attempts = []
+
+    async def run(job, audio, on_progress):
+        attempts.append(job["id"])
+        if job["params"].get("fail"):
+            raise RuntimeError("boom")
+        if attempts.count(job["id"]) == 1:
+            # The inference queue is full at first; the job is retried, not failed
+            raise QueueFullError(retry_after=0)
+        on_progress(0.5)
+        return {"text": f"{len(audio)} samples"}
+
+    async def scenario():
+        runner = JobRunner(store, run, concurrency=2, poll_interval=0.05)
+        runner.start()
+        ok = store.create(np.zeros(320, dtype=np.float32), "base")
+        failing = store.create(np.zeros(320, dtype=np.float32), "base", {"fail": True})
+        runner.notify()
+        finished = [await runner.wait(ok["id"], timeout=5), await runner.wait(failing["id"], timeout=5)]
+        await runner.stop()
+        return finished
+
+    ok, failing = asyncio.run(scenario())
+    assert ok["status"] == COMPLETED
+    assert ok["result"] == {"text": "320 samples"}
+    assert ok["progress"] == 1
+    assert failing["status"] == FAILED
+    assert failing["error"] == "boom"
+    assert attempts.count(ok["id"]) == 2
+    store.close()
+
+
+def test_long_poll_registered_while_the_job_finishes_is_woken(tmp_path):
+    store = JobStore(tmp_path)
+    release = asyncio.Event()
+
+    async def run(job, audio, on_progress):
+        await release.wait()
+        return {"text": ""}
+
+    async def scenario():
+        runner = JobRunner(store, run, poll_interval=0.05)
+        runner.start()
+        job = store.create(np.zeros(160, dtype=np.float32), "base")
+        runner.notify()
+        get = store.get
+        loop = asyncio.get_running_loop()
+
+        def get_while_finishing(job_id):
+            # The job finishes right after its status was read as running
+            found = get(job_id)
+            loop.call_soon_threadsafe(release.set)
+            time.sleep(0.3)
+            return found
+
+        store.get = get_while_finishing
+        started = time.monotonic()
+        waited = await runner.wait(job["id"], timeout=5)
+        elapsed = time.monotonic() - started
+        store.get = get
+        await runner.stop()
+        return waited, elapsed, runner
+
+    waited, elapsed, runner = asyncio.run(scenario())
+    assert waited["status"] == COMPLETED
+    assert elapsed < 2
+    assert runner._waiters == {}
+    store.close()
+
+
+def test_progress_is_written_off_the_event_loop_and_only_moves_forward(tmp_path):
+    store = JobStore(tmp_path)
+    writers = []
+    set_progress = store.set_progress
+
+    def recording_set_progress(job_id, progress):
+        writers.append(threading.current_thread() is threading.main_thread())
+        set_progress(job_id, progress)
+
+    store.set_progress = recording_set_progress
+    seen = []
+
+    async def run(job, audio, on_progress):
+        on_progress(0.5)
+        on_progress(0.25)
+        await asyncio.sleep(0.1)
+        seen.append(store.get(job["id"])["progress"])
+        # Inference threads report progress directly
+        await asyncio.to_thread(on_progress, 0.75)
+        seen.append(store.get(job["id"])["progress"])
+        return {"text": ""}
+
+    async def scenario():
+        runner = JobRunner(store, run, poll_interval=0.05)
+        runner.start()
+        job = store.create(np.zeros(160, dtype=np.float32), "base")
+        runner.notify()
+        finished = await runner.wait(job["id"], timeout=5)
+        await runner.stop()
+        return finished
+
+    finished = asyncio.run(scenario())
+    assert writers == [False, False, False]
+    assert seen == [0.5, 0.75]
+    assert finished["progress"] == 1
+    store.close()
+
+
+def test_expired_jobs_are_purged_while_idle(tmp_path):
+    store = JobStore(tmp_path)
+    job = store.create(np.zeros(160, dtype=np.float32), "base")
+    store.claim_next()
+    store.complete(job["id"], {"text": ""})
+
+    async def run(job, audio, on_progress):
+        return {"text": ""}
+
+    async def scenario():
+        runner = JobRunner(store, run, retention_seconds=0.2, poll_interval=0.05, purge_interval=0.05)
+        runner.start()
+        assert store.get(job["id"]) is not None
+        await asyncio.sleep(0.5)
+        await runner.stop()
+
+    asyncio.run(scenario())
+    assert store.get(job["id"]) is None
+    store.close()
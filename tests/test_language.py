@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from src.server.transcriber import ModelDecoder, TranscriptionOptions, detect_language, normalize_language, transcribe
+
+
+class CountingDecoder(ModelDecoder):
+    """Decoder counting how often language detection runs"""
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.detections = 0
+
+    def detect_language(self, mel, timings=None):
+        self.detections += 1
+        return super().detect_language(mel, timings)
+
+
+def test_languages_are_normalized():
+    assert normalize_language(None) is None
+    assert normalize_language("EN") == "en"
+    assert normalize_language("German") == "de"
+    assert normalize_language("mandarin") == "zh"
+    with pytest.raises(ValueError):
+        normalize_language("klingon")
+
+
+def test_detection_is_skipped_when_the_language_is_given(tiny_random_model):
+    decoder = CountingDecoder(tiny_random_model)
+    audio = np.random.default_rng(0).standard_normal(16000 * 2).astype(np.float32) * 0.1
+
+    result = transcribe(decoder, audio, TranscriptionOptions(language="fr", temperature=(0.0,)))
+    assert result["language"] == "fr"
+    assert decoder.detections == 0
+
+    detected = detect_language(decoder, audio)
+    assert decoder.detections == 1
+    probabilities = list(detected["probabilities"].values())
+    assert detected["language"] == next(iter(detected["probabilities"]))
+    assert probabilities == sorted(probabilities, reverse=True)
+    assert sum(probabilities) == pytest.approx(1.0, abs=1e-3)
+    assert detected["timings"]["encoder"] > 0
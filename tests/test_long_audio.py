@@ -0,0 +1,107 @@
+import asyncio
+import numpy as np
+from src.server.long_audio import AudioChunk, plan_chunks, stitch_results, transcribe_in_chunks
+from src.server.transcriber import TranscriptionOptions
+
+SAMPLE_RATE = 16000
+
+
+def _speech_with_pauses(seconds: int, pause_every: int) -> np.ndarray:
+    """Noise with a half-second pause every `pause_every` seconds"""
+    rng = np.random.default_rng(0)
+    audio = (rng.standard_normal(seconds * SAMPLE_RATE) * 0.1).astype(np.float32)
+    for t in range(pause_every, seconds, pause_every):
+        audio[t * SAMPLE_RATE - SAMPLE_RATE // 4:t * SAMPLE_RATE + SAMPLE_RATE // 4] = 0.0
+    return audio
+
+
+def test_chunks_are_split_in_pauses_and_cover_the_audio():
+    audio = _speech_with_pauses(600, pause_every=25)
+    chunks = plan_chunks(audio, chunk_seconds=120, overlap_seconds=1.0)
+
+    assert len(chunks) == 5
+    assert chunks[0].keep_start == 0 and chunks[-1].keep_end == len(audio)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.keep_end == chunk.keep_start
+        # The split lies inside one of the pauses
+        assert np.all(audio[chunk.keep_start - 1000:chunk.keep_start + 1000] == 0.0)
+        assert chunk.start == chunk.keep_start - SAMPLE_RATE
+
+
+def test_short_audio_is_a_single_chunk():
+    audio = np.zeros(60 * SAMPLE_RATE, dtype=np.float32)
+    assert plan_chunks(audio, chunk_seconds=120) == [AudioChunk(0, 0, len(audio), 0, len(audio))]
+
+
+def test_stitching_shifts_timestamps_and_drops_overlap_duplicates():
+    chunks = [
+        AudioChunk(0, 0, 11 * SAMPLE_RATE, 0, 10 * SAMPLE_RATE),
+        AudioChunk(1, 9 * SAMPLE_RATE, 20 * SAMPLE_RATE, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE),
+    ]
+
+    def segment(start, end, text):
+        return {"seek": 0, "start": start, "end": end, "text": text, "id": 0}
+
+    results = [
+        {"language": "en", "segments": [segment(0.0, 5.0, " a"), segment(9.5, 11.0, " b")]},
+        # " b" is decoded again from the overlap; " c" starts right after it
+        {"language": "en", "segments": [segment(0.5, 2.0, " b"), segment(2.0, 6.0, " c")]},
+    ]
+    result = stitch_results(chunks, results)
+
+    assert result["text"] == " a b c"
+    assert [(s["start"], s["end"]) for s in result["segments"]] == [(0.0, 5.0), (9.5, 11.0), (11.0, 15.0)]
+    assert [s["id"] for s in result["segments"]] == [0, 1, 2]
+    assert result["language"] == "en"
+
+
+def test_stitching_keeps_one_copy_of_segments_crossing_a_split():
+    chunks = [
+        AudioChunk(0, 0, 11 * SAMPLE_RATE, 0, 10 * SAMPLE_RATE),
+        AudioChunk(1, 9 * SAMPLE_RATE, 21 * SAMPLE_RATE, 10 * SAMPLE_RATE, 20 * SAMPLE_RATE),
+        AudioChunk(2, 19 * SAMPLE_RATE, 30 * SAMPLE_RATE, 20 * SAMPLE_RATE, 30 * SAMPLE_RATE),
+    ]
+
+    def segment(start, end, text):
+        return {"seek": 0, "start": start, "end": end, "text": text, "id": 0}
+
+    results = [
+        # Both copies of " b" have their midpoint on the other side of the split at 10 s
+        {"language": "en", "segments": [segment(0.0, 9.8, " a"), segment(9.8, 11.0, " b")]},
+        {"language": "en", "segments": [
+            segment(0.2, 1.6, " b"), segment(2.0, 10.0, " c"), segment(10.0, 11.4, " d"),
+        ]},
+        # The copy of " d" starts after the split at 20 s but inside the previous copy
+        {"language": "en", "segments": [segment(1.05, 1.4, " d"), segment(1.4, 6.0, " e")]},
+    ]
+    result = stitch_results(chunks, results)
+
+    assert result["text"] == " a b c d e"
+    assert [(s["start"], s["end"]) for s in result["segments"]] == [
+        (0.0, 9.8), (9.8, 11.0), (11.0, 19.0), (19.0, 20.4), (20.4, 25.0),
+    ]
+    assert [s["chunk"] for s in result["segments"]] == [0, 0, 1, 1, 2]
+
+
+def test_chunks_run_concurrently_with_their_own_options():
+    audio = _speech_with_pauses(400, pause_every=20)
+    in_flight = []
+    peak = []
+
+    async def run(chunk, options):
+        in_flight.append(chunk)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(chunk)
+        options.language = "en"
+        return {"language": "en", "segments": [
+            {"seek": 0, "start": 1.0, "end": 2.0, "text": " x", "id": 0}
+        ]}
+
+    options = TranscriptionOptions()
+    result = asyncio.run(transcribe_in_chunks(audio, options, run, chunk_seconds=100, concurrency=2))
+
+    assert len(result["segments"]) == 4
+    assert max(peak) == 2
+    # Language detection in one chunk doesn't leak into the caller's options
+    assert options.language is None
@@ -0,0 +1,43 @@
+import pytest
+from src.server.metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets_per_label():
+    metrics = MetricsRegistry()
+    stages = metrics.histogram("stage_seconds", "Stage time", labelnames=("stage",), buckets=(0.1, 1.0))
+    stages.observe(0.05, stage="mel")
+    stages.observe(0.5, stage="mel")
+    stages.observe(3.0, stage="mel")
+    stages.observe(0.1, stage="decoder")
+
+    lines = metrics.render().splitlines()
+
+    assert lines[:2] == ["# HELP stage_seconds Stage time", "# TYPE stage_seconds histogram"]
+    assert 'stage_seconds_bucket{stage="mel",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="mel",le="1.0"} 2' in lines
+    assert 'stage_seconds_bucket{stage="mel",le="+Inf"} 3' in lines
+    assert 'stage_seconds_sum{stage="mel"} 3.55' in lines
+    assert 'stage_seconds_count{stage="mel"} 3' in lines
+    # Bucket bounds are inclusive
+    assert 'stage_seconds_bucket{stage="decoder",le="0.1"} 1' in lines
+
+
+def test_counters_and_gauges():
+    metrics = MetricsRegistry()
+    requests = metrics.counter("requests_total", "Requests", labelnames=("model", "status"))
+    in_flight = metrics.gauge("in_flight", "In flight")
+    requests.inc(model="base", status="ok")
+    requests.inc(2, model='we"ird', status="ok")
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+
+    text = metrics.render()
+
+    assert 'requests_total{model="base",status="ok"} 1.0' in text
+    assert 'requests_total{model="we\\"ird",status="ok"} 2.0' in text
+    assert "in_flight 1.0" in text
+    with pytest.raises(ValueError):
+        requests.inc(model="base")
+    with pytest.raises(ValueError):
+        metrics.counter("requests_total", "Duplicate")
@@ -0,0 +1,83 @@
+import threading
+import pytest
+import torch
+from src.server.models import ModelRegistry
+
+
+class CountingLoader:
+    """Loads small stand-in modules and counts how often each name was loaded"""
+
+    def __init__(self):
+        self.loads = []
+
+    def __call__(self, name):
+        self.loads.append(name)
+        return torch.nn.Linear(16, 16)
+
+
+def test_models_load_lazily_and_once():
+    loader = CountingLoader()
+    registry = ModelRegistry("base", allowed_models=["tiny", "base"], loader=loader)
+    assert loader.loads == []
+
+    threads = [threading.Thread(target=lambda: registry.preload("tiny")) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.loads == ["tiny"]
+    assert registry.loaded_models() == ["tiny"]
+
+
+def test_least_recently_used_model_is_evicted():
+    loader = CountingLoader()
+    registry = ModelRegistry("base", allowed_models=["tiny", "base", "small"], max_models=2, loader=loader)
+
+    with registry.acquire("tiny"):
+        pass
+    with registry.acquire("base"):
+        pass
+    with registry.acquire("tiny"):
+        pass
+    with registry.acquire("small"):
+        pass
+
+    assert registry.loaded_models() == ["tiny", "small"]
+    counters = registry.stats()["counters"]
+    assert counters["base"]["evictions"] == 1
+    assert counters["tiny"]["requests"] == 2
+
+
+def test_models_in_use_are_not_evicted():
+    registry = ModelRegistry("base", allowed_models=["tiny", "base"], max_models=1, loader=CountingLoader())
+
+    with registry.acquire("tiny"):
+        with registry.acquire("base"):
+            assert registry.loaded_models() == ["tiny", "base"]
+        assert registry.loaded_models() == ["tiny"]
+    assert registry.loaded_models() == ["tiny"]
+
+
+def test_unknown_models_are_rejected():
+    registry = ModelRegistry("base", allowed_models=["base"], loader=CountingLoader())
+    with pytest.raises(ValueError):
+        registry.resolve("large")
+    assert registry.resolve(None) == "base"
+
+
+def test_only_the_default_model_is_allowed_unless_others_are_listed():
+    registry = ModelRegistry("base", loader=CountingLoader())
+    assert registry.allowed_models == ["base"]
+    with pytest.raises(ValueError):
+        registry.resolve("large")
+
+
+def test_unrecorded_acquire_is_not_counted():
+    registry = ModelRegistry("base", allowed_models=["base"], loader=CountingLoader())
+
+    with registry.acquire(record=False):
+        pass
+
+    assert registry.loaded_models() == ["base"]
+    assert registry.stats()["counters"]["base"]["requests"] == 0
@@ -0,0 +1,26 @@
+from benchmarks.stub_model import StubWhisper
+from benchmarks.synthetic_audio import generate
+from src.server.batching import DecodeBatcher
+from src.server.profiling import profile_transcription
+from src.server.transcriber import TranscriptionOptions, transcribe
+
+
+def test_fallbacks_are_counted():
+    audio = generate("speech", 45)
+    # The stub's average log probability of -0.2 is below this threshold, so every window falls back once
+    options = TranscriptionOptions(language="en", temperature=(0.0, 0.5), logprob_threshold=0.0)
+    result = transcribe(DecodeBatcher(StubWhisper(encoder_ms=0, decoder_ms=0)).unbatched(), audio, options)
+    assert result["decoding"] == {"windows": 2, "fallbacks": 2}
+
+
+def test_profiled_transcription_runs_outside_the_batcher():
+    # Never started, so decoding through the batcher would block
+    batcher = DecodeBatcher(StubWhisper(encoder_ms=10, decoder_ms=10))
+    audio = generate("tone", 5)
+    result = profile_transcription(batcher, audio, TranscriptionOptions(language="en"))
+
+    profile = result["profile"]
+    assert profile["profiler"] == "cprofile" and profile["seconds"] >= 0.02
+    functions = [row["function"] for row in profile["functions"]]
+    assert any("stub_model.py" in function and "(decode)" in function for function in functions)
+    assert result["text"] == transcribe(batcher.unbatched(), audio, TranscriptionOptions(language="en"))["text"]
@@ -0,0 +1,45 @@
+import pytest
+import torch
+from conftest import load_small_random_model
+from src.server.models import ModelRegistry
+from src.server.quantization import model_size_bytes, parse_quantization, quantize_model
+
+
+def test_quantization_is_parsed_per_model():
+    assert parse_quantization("") == {}
+    assert parse_quantization("int8") == {"*": "int8"}
+    assert parse_quantization("INT8, large=none") == {"*": "int8", "large": "none"}
+    with pytest.raises(ValueError):
+        parse_quantization("base=int4")
+
+
+def test_int8_model_is_smaller_and_close_to_float():
+    model = load_small_random_model().eval()
+    mel = torch.randn(1, 80, 3000)
+    with torch.no_grad():
+        expected = model.encoder(mel)
+    size = model_size_bytes(model)
+
+    quantize_model(model, "int8")
+    with torch.no_grad():
+        actual = model.encoder(mel)
+
+    assert model_size_bytes(model) < size * 0.6
+    assert not any(type(m) is torch.nn.Linear for m in model.modules())
+    assert torch.nn.functional.cosine_similarity(actual.flatten(), expected.flatten(), dim=0) > 0.98
+
+
+def test_registry_quantizes_selected_models():
+    registry = ModelRegistry(
+        "base", allowed_models=["tiny", "base"], quantize={"base": "int8"}, loader=load_small_random_model
+    )
+
+    with registry.acquire("base"), registry.acquire("tiny"):
+        pass
+
+    resident = registry.stats()["resident"]
+    assert resident["base"]["quantization"] == "int8"
+    assert resident["tiny"]["quantization"] == "none"
+    assert resident["base"]["size_mb"] < resident["tiny"]["size_mb"]
+    assert registry.variant("base") == "base.int8"
+    assert registry.variant("tiny") == "tiny"
@@ -0,0 +1,48 @@
+import numpy as np
+from src.server.realtime import RealtimeTranscriber
+
+
+def result(*segments):
+    """Build a transcription result from (start, end, text) tuples"""
+    return {
+        "text": "".join(text for _, _, text in segments),
+        "segments": [{"start": start, "end": end, "text": text} for start, end, text in segments],
+        "language": "en",
+    }
+
+
+def test_only_text_agreed_on_by_two_passes_is_committed():
+    stream = RealtimeTranscriber()
+    stream.append(np.zeros(16000, dtype=np.float32))
+
+    update = stream.update(result((0.0, 1.0, " Hello word")))
+    assert update == {"commit": None, "partial": "Hello word"}
+
+    update = stream.update(result((0.0, 1.5, " hello, world again")))
+    assert update["commit"]["text"] == "hello,"
+    assert update["partial"] == "world again"
+
+    update = stream.update(result((0.0, 2.0, " Hello world again and")), final=True)
+    assert update["commit"]["text"] == "world again and"
+    assert stream.text() == "hello, world again and"
+    assert stream.language == "en"
+
+
+def test_buffer_is_trimmed_after_committed_segments():
+    stream = RealtimeTranscriber(trim_seconds=4.0)
+    stream.append(np.zeros(16000 * 5, dtype=np.float32))
+    passes = result((0.0, 2.0, " one two"), (2.0, 4.0, " three four"), (4.0, 5.0, " five"))
+
+    stream.update(passes)
+    update = stream.update(passes)
+
+    assert update["commit"] == {"text": "one two three four five", "start": 0.0, "end": 5.0}
+    # Every segment is committed, so the buffer is cut after the last one
+    assert stream.buffer_offset == 5.0
+    assert stream.buffer_seconds == 0.0
+
+    stream.append(np.zeros(16000 * 2, dtype=np.float32))
+    stream.update(result((0.0, 2.0, " six seven")))
+    update = stream.update(result((0.0, 2.0, " six seven")))
+    assert update["commit"] == {"text": "six seven", "start": 5.0, "end": 7.0}
+    assert stream.text() == "one two three four five six seven"
@@ -0,0 +1,67 @@
+import gzip
+import json
+import pytest
+from src.server import serialization
+from src.server.serialization import (
+    JSON, MSGPACK, compress, encode, negotiate_encoding, negotiate_media_type, parse_accept, segment_view
+)
+
+
+def test_accept_headers_are_negotiated_by_weight(monkeypatch):
+    assert parse_accept("text/html;q=0.5, application/json, */*;q=0.1") == [
+        ("application/json", 1.0), ("text/html", 0.5), ("*/*", 0.1)
+    ]
+    assert negotiate_media_type(None) == JSON
+    assert negotiate_media_type("text/html, */*;q=0.8") == JSON
+    assert negotiate_media_type("text/html") is None
+
+    # msgpack is only offered when it is installed
+    monkeypatch.setattr(serialization, "msgpack", None)
+    assert negotiate_media_type("application/msgpack") is None
+    assert negotiate_media_type("application/msgpack, application/json;q=0.5") == JSON
+    monkeypatch.setattr(serialization, "msgpack", object())
+    assert negotiate_media_type("application/x-msgpack, application/json;q=0.5") == MSGPACK
+    # Wildcards don't override an explicit refusal
+    assert negotiate_media_type("application/json;q=0, */*") == MSGPACK
+    assert negotiate_media_type("*/*;q=0.5, application/msgpack;q=0.4") == JSON
+    monkeypatch.setattr(serialization, "msgpack", None)
+    assert negotiate_media_type("application/json;q=0, */*") is None
+
+    monkeypatch.setattr(serialization, "zstandard", None)
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("gzip;q=0, zstd") is None
+    assert negotiate_encoding("*") == "gzip"
+    assert negotiate_encoding(None) is None
+
+
+def test_payloads_round_trip():
+    payload = {"text": " Grüße", "segments": [{"start": 0.0, "end": 1.5, "text": " Grüße", "tokens": [1, 2]}]}
+    body = encode(payload, JSON)
+    assert json.loads(body) == payload
+    assert gzip.decompress(compress(body, "gzip")) == body
+    if serialization.zstandard is not None:
+        assert serialization.zstandard.ZstdDecompressor().decompress(compress(body, "zstd")) == body
+    if serialization.msgpack is not None:
+        assert serialization.msgpack.unpackb(encode(payload, MSGPACK)) == payload
+
+
+def test_segment_views():
+    segment = {"id": 3, "seek": 0, "start": 1.0, "end": 2.0, "text": " hi", "tokens": [50365, 2011, 50415],
+               "temperature": 0.0, "avg_logprob": -0.3, "compression_ratio": 1.1, "no_speech_prob": 0.01, "window": 0}
+    assert segment_view(segment) == {"start": 1.0, "end": 2.0, "text": " hi"}
+    assert segment_view(segment, full=True) == segment
+
+
+@pytest.mark.parametrize("orjson_installed", [True, False])
+def test_json_encoding_with_and_without_orjson(monkeypatch, orjson_installed):
+    if not orjson_installed:
+        monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(encode({"a": [1.25, "ü"]}, JSON)) == {"a": [1.25, "ü"]}
+
+
+@pytest.mark.parametrize("orjson_installed", [True, False])
+def test_non_finite_floats_are_encoded_as_null(monkeypatch, orjson_installed):
+    if not orjson_installed:
+        monkeypatch.setattr(serialization, "orjson", None)
+    body = encode({"segments": [{"avg_logprob": float("nan"), "compression_ratio": float("inf")}]}, JSON)
+    assert json.loads(body) == {"segments": [{"avg_logprob": None, "compression_ratio": None}]}
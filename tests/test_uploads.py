@@ -0,0 +1,43 @@
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+from src.server.uploads import UploadBudget, UploadLimitMiddleware
+
+
+def _client(budget: UploadBudget, max_body_bytes: int) -> TestClient:
+    async def upload(request: Request):
+        body = await request.body()
+        return JSONResponse({"bytes": len(body), "in_flight": budget.stats()["in_flight_bytes"]})
+
+    app = Starlette(routes=[Route("/upload", upload, methods=["POST"])])
+    app.add_middleware(UploadLimitMiddleware, budget=budget, max_body_bytes=max_body_bytes)
+    return TestClient(app)
+
+
+def test_body_size_limit_applies_with_and_without_content_length():
+    client = _client(UploadBudget(None), max_body_bytes=1000)
+
+    assert client.post("/upload", content=b"x" * 1000).json() == {"bytes": 1000, "in_flight": 1000}
+    response = client.post("/upload", content=b"x" * 1001)
+    assert response.status_code == 413
+    # Chunked, so only counting the received bytes catches it
+    response = client.post("/upload", content=iter([b"x" * 600, b"x" * 600]))
+    assert response.status_code == 413
+
+
+def test_uploads_beyond_the_budget_are_turned_away():
+    budget = UploadBudget(1500)
+    client = _client(budget, max_body_bytes=10000)
+
+    assert client.post("/upload", content=iter([b"x" * 700, b"x" * 700])).json()["in_flight"] == 1400
+    # Another upload holds most of the budget
+    assert budget.try_acquire(1000)
+    response = client.post("/upload", content=b"x" * 600)
+    assert response.status_code == 429 and response.headers["retry-after"] == "1"
+    assert client.post("/upload", content=iter([b"x" * 400, b"x" * 400])).status_code == 429
+    budget.release(1000)
+
+    assert client.post("/upload", content=b"x" * 600).status_code == 200
+    assert budget.stats()["in_flight_bytes"] == 0 and budget.stats()["rejected"] == 2
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from src.server.vad import SpeechMap
+from src.utils.audio_utils import AudioUtils
+
+SAMPLE_RATE = 16000
+
+
+def _tone(seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def _silence(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 1e-4).astype(np.float32)
+
+
+def test_speech_regions_skip_silence():
+    audio = np.concatenate([_silence(3), _tone(2), _silence(4), _tone(1), _silence(2)])
+    regions = AudioUtils.detect_speech(audio, padding_seconds=0.0)
+
+    assert len(regions) == 2
+    assert regions[0][0] == pytest.approx(3 * SAMPLE_RATE, abs=800)
+    assert regions[0][1] == pytest.approx(5 * SAMPLE_RATE, abs=800)
+    assert regions[1][0] == pytest.approx(9 * SAMPLE_RATE, abs=800)
+    assert regions[1][1] == pytest.approx(10 * SAMPLE_RATE, abs=800)
+
+
+def test_spectral_flatness_rejects_loud_noise():
+    noise = (np.random.default_rng(1).standard_normal(3 * SAMPLE_RATE) * 0.3).astype(np.float32)
+    audio = np.concatenate([noise, _tone(2)])
+
+    energy_only = AudioUtils.detect_speech(audio, energy_threshold_db=-40, padding_seconds=0.0)
+    with_flatness = AudioUtils.detect_speech(
+        audio, energy_threshold_db=-40, flatness_threshold=0.3, padding_seconds=0.0
+    )
+
+    assert energy_only == [(0, len(audio))]
+    assert len(with_flatness) == 1
+    assert with_flatness[0][0] == pytest.approx(3 * SAMPLE_RATE, abs=800)
+
+
+def test_flatness_pass_energies_match_direct_energies():
+    audio = np.concatenate([_silence(1), _tone(1)])
+    direct, _ = AudioUtils.frame_features(audio)
+    spectral, flatness = AudioUtils.frame_features(audio, spectral_flatness=True)
+
+    assert flatness is not None and len(flatness) == len(direct)
+    # The Hann window weights the frame centre, so allow a small difference
+    assert np.allclose(spectral[-50:], direct[-50:], atol=1.0)
+
+
+def test_segment_times_map_back_to_the_original_timeline():
+    regions = [(2 * SAMPLE_RATE, 4 * SAMPLE_RATE), (10 * SAMPLE_RATE, 13 * SAMPLE_RATE)]
+    speech_map = SpeechMap(regions, total_samples=20 * SAMPLE_RATE)
+
+    assert len(speech_map.speech_audio(np.zeros(20 * SAMPLE_RATE, dtype=np.float32))) == 5 * SAMPLE_RATE
+    segments = speech_map.remap_segments([
+        {"start": 0.5, "end": 2.0},
+        {"start": 2.0, "end": 4.5},
+    ])
+    assert segments == [{"start": 2.5, "end": 4.0}, {"start": 10.0, "end": 12.5}]
+    assert speech_map.stats()["skipped_fraction"] == 0.75
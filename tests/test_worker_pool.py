@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from conftest import load_random_model
+from src.server.inference import CancelToken, JobCancelled
+from src.server.transcriber import TranscriptionOptions
+from src.server.workers import ProcessWorkerPool
+
+
+@pytest.fixture
+def pool():
+    pool = ProcessWorkerPool(
+        processes=1,
+        threads_per_process=1,
+        registry_kwargs={"default_model": "base", "allowed_models": ["base"], "loader": load_random_model}
+    )
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def test_audio_is_transcribed_in_a_worker_process(pool):
+    audio = np.random.default_rng(0).standard_normal(16000 * 2).astype(np.float32) * 0.1
+    windows = []
+    options = TranscriptionOptions(language="en", temperature=(0.0,), no_speech_threshold=None)
+
+    result = pool.transcribe(audio, "base", options, on_window=windows.append)
+
+    assert result["language"] == "en"
+    assert windows
+    assert result["segments"] == [segment for window in windows for segment in window]
+
+    stats = pool.stats()
+    assert stats["workers"][0]["jobs"] == 1
+    assert stats["workers"][0]["models"] == ["base"]
+
+
+def test_language_is_detected_in_a_worker_process(pool):
+    audio = np.random.default_rng(0).standard_normal(16000 * 40).astype(np.float32) * 0.1
+
+    result = pool.detect_language(audio, "base", TranscriptionOptions())
+
+    assert result["language"] in result["probabilities"]
+    assert set(result["timings"]) == {"mel", "encoder", "decoder"}
+
+
+def test_cancelled_job_stops_and_the_worker_stays_usable(pool):
+    audio = np.random.default_rng(0).standard_normal(16000 * 120).astype(np.float32) * 0.1
+    options = TranscriptionOptions(language="en", temperature=(0.0,), no_speech_threshold=None)
+    cancel = CancelToken()
+    windows = []
+
+    def on_window(segments):
+        windows.append(segments)
+        cancel.cancel("disconnect")
+
+    with pytest.raises(JobCancelled) as exc_info:
+        pool.transcribe(audio, "base", options, on_window=on_window, cancel=cancel)
+    assert exc_info.value.reason == "disconnect"
+    assert len(windows) < 4
+
+    result = pool.transcribe(audio[:16000], "base", options, cancel=CancelToken())
+    assert "segments" in result
+
+
+def test_failing_window_callback_does_not_leak_into_the_next_job(pool):
+    audio = np.random.default_rng(0).standard_normal(16000 * 120).astype(np.float32) * 0.1
+    options = TranscriptionOptions(language="en", temperature=(0.0,), no_speech_threshold=None)
+
+    def on_window(segments):
+        raise ConnectionResetError("client went away")
+
+    with pytest.raises(ConnectionResetError):
+        pool.transcribe(audio, "base", options, on_window=on_window)
+
+    windows = []
+    result = pool.transcribe(audio[:16000 * 2], "base", options, on_window=windows.append)
+    # The next job gets its own windows and result, not the rest of the failed job
+    assert result["segments"] == [segment for window in windows for segment in window]
+    assert all(segment["end"] <= 2.0 for segment in result["segments"])
+    assert pool.stats()["restarts"] == 0